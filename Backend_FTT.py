@@ -6,13 +6,13 @@ Script to run the FTT Standalone frontend in a web browser.
 """
 
 from collections import OrderedDict
-import configparser
 import csv
 import datetime
 import json
 import os
 from pathlib import Path
 import pickle
+import queue
 import sys
 import time
 from threading import Timer, Thread
@@ -22,7 +22,8 @@ from bottle import (route, run, request, response, static_file)
 import numpy as np
 import pandas as pd
 
-from SourceCode.model_class import ModelRun
+import SourceCode.support.titles_functions as titles_f
+import SourceCode.support.dimensions_functions as dims_f
 
 
 # Switch for build
@@ -39,10 +40,55 @@ except AttributeError:
 # cache for runs
 run_entries_cache = {}
 
+# settings overrides of the gamma tool run, see init_model
+gamma_settings = {}
+
 def console_message(error, message, elapsed):
     return str({'error': error, 'message': message,\
          'elapsed_time': elapsed, 'timestamp': str(datetime.datetime.now())})
 
+def output_dir():
+    """Folder of the model results, the output_dir of settings.ini"""
+    from SourceCode.model_class import read_settings
+
+    return Path(read_settings().get('settings', 'output_dir', fallback='Output'))
+
+def solve_with_progress(model, scenario, key=None):
+    """Solves a scenario on a thread, yielding each year once it is solved
+
+    With a result cache key (see ModelRun.result_keys), a stored result of
+    the scenario is used instead of solving it, and the result of a
+    solved scenario is stored.
+    """
+    import SourceCode.support.result_cache as results_f
+
+    result = model.cached_result(scenario, key) if key is not None else None
+    if result is not None:
+        model.output[scenario] = result
+        yield from model.timeline
+        return
+
+    # The model reports each year it solves through the queue
+    years = queue.Queue()
+    errors = []
+
+    def solve():
+        try:
+            model.solve_scenario(scenario, progress=years.put)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            years.put(None)
+
+    Thread(target=solve, daemon=True).start()
+    yield from iter(years.get, None)
+    if errors:
+        raise errors[0]
+
+    if key is not None:
+        results_f.store_result(key, model.output[scenario])
+        results_f.prune_results(int(model.result_cache_size * 1024**3))
+
 # the decorator to allow calling the API endpoint from the outside
 def enable_cors(fn):
     """Allows for data to be passed between the backend and frontend in a local application"""
@@ -112,18 +158,16 @@ def run_model():
 
     print(",".join(scenarios))
     print(",".join(models))
-    # Adjust settings file from frontend parameters
-    config = configparser.ConfigParser()
-    config.read('settings.ini')
-    config.set('settings', 'enable_modules',", ".join(models))
-    config.set('settings', 'simulation_end', endyear)
-    config.set('settings', 'model_end', endyear)
-    config.set('settings', "scenarios",", ".join(scenarios))
-    with open('settings.ini', 'w') as configfile:
-        config.write(configfile)
-
-    # Initalise the model
-    model = ModelRun()
+    # Initalise the model (the solver is only imported for model runs, so
+    # the backend starts without it)
+    from SourceCode.model_class import ModelRun, read_settings
+
+    # Settings from frontend parameters (settings.ini itself is not changed)
+    config = read_settings(overrides={'enable_modules': ", ".join(models),
+                                      'simulation_end': endyear,
+                                      'model_end': endyear,
+                                      'scenarios': ", ".join(scenarios)})
+    model = ModelRun(config)
     # Define the output based on the inputs
     # TODO: Ensure this matches any revision to model structure changes
     model.output = {scenario: {var: np.full_like(model.input[scenario][var], 0) for var in model.input[scenario]} for scenario in model.input}
@@ -131,6 +175,9 @@ def run_model():
     # Defines the number of items to run to track progress (scenarios x year to run)
     yield("data: items;{};\n".format(len(scenarios) * (int(endyear) - model.timeline[0] + 1)))
 
+    # Scenarios solved before with the same inputs are taken from the result cache
+    keys = model.result_keys() if model.result_cache else {}
+
     scenarios_log = {}
     for scenario in scenarios:
 
@@ -140,16 +187,7 @@ def run_model():
 
         try:
             #Solve the model for each year
-            for year_index, year in enumerate(model.timeline):
-                model.variables, model.lags = model.solve_year(year,year_index,scenario)
-
-                # Populate output container
-                for var in model.variables:
-                    if 'TIME' in model.dims[var]:
-                        model.output[scenario][var][:, :, :, year_index] = model.variables[var]
-                    else:
-                        model.output[scenario][var][:, :, :, 0] = model.variables[var]
-
+            for year in solve_with_progress(model, scenario, keys.get(scenario)):
                 elapsed_time = time.time() - start_time
                 yield("event: processing\n")
                 yield("data: progress;{}; \n".format(year))
@@ -177,13 +215,13 @@ def run_model():
     results =  model.output
 
     # Create Output folder if it doesn't exist
-    (Path('.') / 'Output').mkdir(parents=True, exist_ok=True)
+    Path(model.output_dir).mkdir(parents=True, exist_ok=True)
 
-    with open(Path('.') / 'Output' / 'Results.pickle', 'wb') as f:
+    with open(Path(model.output_dir) / 'Results.pickle', 'wb') as f:
         pickle.dump(results, f)
 
     # Save metadata on current model run
-    with open(Path('.') / 'Output' / 'Scenarios.json', 'w') as f:
+    with open(Path(model.output_dir) / 'Scenarios.json', 'w') as f:
         json.dump(scenarios_log, f)
 
     if(error):
@@ -224,10 +262,7 @@ def available_scenarios():
         scenids.append(scenid)
 
     # Read the list of available FTT models
-    models_list = pd.read_excel(
-        Path('.') / 'Utilities' / 'titles' / 'classification_titles.xlsx',
-        sheet_name="Models", index_col=0
-    )
+    models_list = titles_f.load_title_sheets(index_col=0)["Models"]
 
     modids = []
     models = models_list["Short name"]
@@ -245,7 +280,7 @@ def scenarios_ran():
 
     exist = []
     # Get model run metadata for scenarios
-    scenario = Path('.') / 'Output' / 'Scenarios.json'
+    scenario = output_dir() / 'Scenarios.json'
     with open(scenario, 'r+') as f:
         meta = json.load(f)
         for scen,value in meta.items():
@@ -304,10 +339,7 @@ def retrieve_titles(title):
 #
 #            data = json.dumps({"Sectors": data[title]})
     if title != "None":
-        df = pd.read_excel(
-            Path('.') / 'Utilities' / 'titles' / 'classification_titles.xlsx',
-            sheet_name=title
-        )
+        df = titles_f.load_title_sheets()[title]
         df = df.reset_index()
         title_data = list(df['Full name'].unique())
 
@@ -327,10 +359,7 @@ def retrieve_titles(title):
 @enable_cors
 def retrieve_all_titles():
 
-    title_dict = pd.read_excel(
-        Path('.') / 'Utilities' / 'titles' / 'classification_titles.xlsx',
-        sheet_name=None
-    )
+    title_dict = titles_f.load_title_sheets()
     titles = []
     for t,title in title_dict.items():
         if t=="Cover":
@@ -414,14 +443,11 @@ def retrieve_chart_data(type_):
     full_df = None
 
     # Load latest model run results
-    with open(Path('.') / 'Output' / 'Results.pickle', 'rb') as f:
+    with open(output_dir() / 'Results.pickle', 'rb') as f:
         output = pickle.load(f)
 
     #Get titles
-    title_list = pd.read_excel(
-        Path('.') / 'Utilities' / 'titles' / 'classification_titles.xlsx',
-        sheet_name=None
-    )
+    title_list = titles_f.load_title_sheets()
     # agg_all = pd.read_excel("{}\\Utilities\\Titles\\Grouping.xlsx".format(rootdir),sheet_name=None,index_col=0)
 
 
@@ -471,7 +497,7 @@ def retrieve_chart_data(type_):
         dims3_pos = get_dim_pos(title3_code,dims3,title3)
 
         # retrieve years of data available from model run metadata
-        scen_meta = Path('.') / 'Output' / 'Scenarios.json'
+        scen_meta = output_dir() / 'Scenarios.json'
         with open(scen_meta, 'r+') as f:
             meta = json.load(f)
             for scen,value in meta.items():
@@ -673,14 +699,10 @@ def construct_graphic_data(graphic,type_):
     dims3 = [settings.loc["Dim3"]]
 
     # Get titles from var listing
-
-    vars_meta = pd.read_csv(f'{rootdir}\\Utilities\\Titles\\VariableListing.csv', index_col=0)
     # Assume all variables needed have same dimension as first for processing
-    vars_meta = vars_meta.fillna("None")
-
-    title_code = vars_meta.loc[vars[0],"Dim1"]
-    title2_code = vars_meta.loc[vars[0],"Dim2"]
-    title3_code = vars_meta.loc[vars[0],"Dim3"]
+    title_code, title2_code, title3_code = [
+        "None" if dim == "NA" else dim for dim in dims_f.load_variable_index()[vars[0]][:3]
+    ]
 
 
     scenarios = ["Baseline"]
@@ -689,9 +711,9 @@ def construct_graphic_data(graphic,type_):
 
     full_df = None
 
-    with open('Output\\Results.pickle', 'rb') as f:
+    with open(output_dir() / 'Results.pickle', 'rb') as f:
         output = pickle.load(f)
-    title_list = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name=None)
+    title_list = titles_f.load_title_sheets()
     # agg_all = pd.read_excel("{}\\Utilities\\Titles\\Grouping.xlsx".format(rootdir),sheet_name=None,index_col=0)
     if title_code == "None":
         title = ["None"]
@@ -711,7 +733,7 @@ def construct_graphic_data(graphic,type_):
     dims2_pos = get_dim_pos(title2_code,dims2,title2)
     dims3_pos = get_dim_pos(title3_code,dims3,title3)
 
-    scen_meta = "{}\\Output\\Scenarios.json".format(rootdir)
+    scen_meta = output_dir() / 'Scenarios.json'
     with open(scen_meta, 'r+') as f:
         meta = json.load(f)
         for scen,value in meta.items():
@@ -915,8 +937,8 @@ def exit_():
 @enable_cors
 def load_gamma_values(model, region):
     # TODO: Still to review for cross-platform compatibility
-    region_map = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name="RTI",index_col=0)
-    title_list = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name="Models",index_col=0)
+    region_map = titles_f.load_title_sheets(index_col=0)["RTI"]
+    title_list = titles_f.load_title_sheets(index_col=0)["Models"]
 
     gamma_code = title_list.loc[model,"Gamma_Value"]
     model_folder = title_list.loc[model,"Short name"]
@@ -933,7 +955,7 @@ def load_gamma_values(model, region):
 @enable_cors
 def retrieve_ftt_options():
     # TODO: Still to review for cross-platform compatibility
-    title_list = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name=None,index_col=0)
+    title_list = titles_f.load_title_sheets(index_col=0)
     ftt_options = list(title_list["Models"].index)
     return json.dumps(ftt_options)
 
@@ -941,7 +963,7 @@ def retrieve_ftt_options():
 @enable_cors
 def retrieve_region_titles():
     # TODO: Still to review for cross-platform compatibility
-    df = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name="RTI")
+    df = titles_f.load_title_sheets()["RTI"]
     df = df.reset_index()
     data = json.dumps(list(df['Full name'].unique()))
     return data
@@ -965,13 +987,10 @@ def construct_gamma_graphic_data(model, region, start_year, type_):
 
 
     # Get titles from var listing
-    vars_meta = pd.read_csv(f'{rootdir}\\Utilities\\Titles\\VariableListing.csv', index_col=0)
-    # Assume al variables needed have same dimension as first for processing
-    vars_meta = vars_meta.fillna("None")
-
-    title_code = vars_meta.loc[vars[0],"Dim1"]
-    title2_code = vars_meta.loc[vars[0],"Dim2"]
-    title3_code = vars_meta.loc[vars[0],"Dim3"]
+    # Assume all variables needed have same dimension as first for processing
+    title_code, title2_code, title3_code = [
+        "None" if dim == "NA" else dim for dim in dims_f.load_variable_index()[vars[0]][:3]
+    ]
 
 
     scenarios = ["Gamma"]
@@ -980,10 +999,10 @@ def construct_gamma_graphic_data(model, region, start_year, type_):
 
     full_df = None
 
-    with open('Output\\Gamma.pickle', 'rb') as f:
+    with open(output_dir() / 'Gamma.pickle', 'rb') as f:
         output = pickle.load(f)
 
-    title_list = pd.read_excel(f'{rootdir}\\Utilities\\Titles\\classification_titles.xlsx', sheet_name=None)
+    title_list = titles_f.load_title_sheets()
     # agg_all = pd.read_excel("{}\\Utilities\\Titles\\Grouping.xlsx".format(rootdir),sheet_name=None,index_col=0)
     if title_code == "None":
         title = ["None"]
@@ -1005,7 +1024,7 @@ def construct_gamma_graphic_data(model, region, start_year, type_):
     dims2_pos = get_dim_pos(title2_code,dims2,title2)
     dims3_pos = get_dim_pos(title3_code,dims3,title3)
 
-    scen_meta = "{}\\Output\\Gamma.json".format(rootdir)
+    scen_meta = output_dir() / 'Gamma.json'
     with open(scen_meta, 'r+') as f:
         meta = json.load(f)
         for scen,value in meta.items():
@@ -1160,17 +1179,17 @@ def init_model(end_year):
     endyear = str(end_year)
 
 
-    config = configparser.ConfigParser()
-    config.read('settings.ini')
-    config.set('settings', 'simulation_end', endyear)
-    config.set('settings', 'model_end', endyear)
-    config.set('settings', 'scenarios', "S0, Gamma")
-    with open('settings.ini', 'w') as configfile:
-        config.write(configfile)
+    from SourceCode.model_class import ModelRun, read_settings
+    # Kept for load_gamma, which reloads the run for the module of the gamma values
+    global gamma_settings
+    gamma_settings = {'simulation_end': endyear,
+                      'model_end': endyear,
+                      'scenarios': "S0, Gamma"}
+    config = read_settings(overrides=gamma_settings)
     print (entries_to_run)
 
     global model
-    model = ModelRun()
+    model = ModelRun(config)
     years = list(model.timeline)
     years = [int(x) for x in years]
 
@@ -1191,20 +1210,21 @@ def load_gamma():
 
     gamma_values = list(gamma.values())
 
-    config = configparser.ConfigParser()
-    config.read('settings.ini')
-
-    title_list = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name=None,index_col=0)
+    title_list = titles_f.load_title_sheets(index_col=0)
     models = title_list["Models"]
     gamma_code = models.loc[ftt,"Gamma_Value"]
     model_folder = models.loc[ftt,"Short name"]
 
+    # Only the variables of the enabled modules are loaded, so the run is
+    # reloaded with the module of the gamma values enabled
+    global model
+    if model.ftt_modules != model_folder:
+        from SourceCode.model_class import ModelRun, read_settings
+        config = read_settings(overrides=dict(gamma_settings, enable_modules=model_folder))
+        model = ModelRun(config)
 
-    model.input["Gamma"][gamma_code][reg_pos,:,0,:] = np.array(gamma_values).reshape(-1,1)
-    config.set('settings', 'enable_modules', model_folder)
-
-    with open('settings.ini', 'w') as configfile:
-        config.write(configfile)
+    # The Gamma scenario shares S0 inputs until it owns a copy of the variable
+    model.input["Gamma"].own(gamma_code)[reg_pos,:,0,:] = np.array(gamma_values).reshape(-1,1)
 
     return {'status':'true'}
 
@@ -1221,7 +1241,7 @@ def save_gamma():
     gamma_values = list(gamma.values())
 
     #Copy gamma file from baseline to gamma
-    title_list = pd.read_excel('{}\\Utilities\\Titles\\classification_titles.xlsx'.format(rootdir),sheet_name=None,index_col=0)
+    title_list = titles_f.load_title_sheets(index_col=0)
     reg = title_list["RTI"].loc[region,"Short name"]
     models = title_list["Models"]
     gamma_code = models.loc[ftt,"Gamma_Value"]
@@ -1257,16 +1277,11 @@ def run_model():
 
     yield("data: message:Processing started...;\n\n")
 
-    # Adjust settings file from frontend parameters
-    config = configparser.ConfigParser()
-    config.read('settings.ini')
-    with open('settings.ini', 'w') as configfile:
-        config.write(configfile)
     print (entries_to_run)
     scenarios =  entries_to_run
 
+    # The module of the gamma values is set on the model by load_gamma
     model.timeline = np.arange(model.simulation_start, model.model_end+1)
-    model.ftt_modules = config.get('settings', 'enable_modules')
     print(model.ftt_modules )
     print(model.timeline)
 
@@ -1284,16 +1299,7 @@ def run_model():
 
         try:
             # Solve the model for each year
-            for year_index, year in enumerate(model.timeline):
-                model.variables, model.lags = model.solve_year(year,year_index,scenario)
-
-                # Populate output container
-                for var in model.variables:
-                    if 'TIME' in model.dims[var]:
-                        model.output[scenario][var][:, :, :, year_index] = model.variables[var]
-                    else:
-                        model.output[scenario][var][:, :, :, 0] = model.variables[var]
-
+            for year in solve_with_progress(model, scenario):
                 elapsed_time = time.time() - start_time
                 yield("event: processing\n")
                 yield(f"data: progress;{year}; \n")
@@ -1317,9 +1323,10 @@ def run_model():
 
     run_entries_cache = {}
     results =  model.output
-    with open('Output\\Gamma.pickle', 'wb') as f:
+    Path(model.output_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(model.output_dir) / 'Gamma.pickle', 'wb') as f:
         pickle.dump(results,f)
-    with open("{}\\Output\\Gamma.json".format(rootdir), 'w') as f:
+    with open(Path(model.output_dir) / 'Gamma.json', 'w') as f:
         json.dump(scenarios_log, f)
     if(error):
         yield("event: processing\n")
@@ -26,8 +26,11 @@ import numpy as np
 
 # Local library imports
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
+from SourceCode.support.profiling import timed
 
 
+@timed()
 def get_lcof(data, titles):
     """
     Calculate levelized costs.
@@ -59,7 +62,7 @@ def get_lcof(data, titles):
     Additional notes if required.
     """
     # Categories for the cost matrix (ZCET)
-    c6ti = {category: index for index, category in enumerate(titles['C6TI'])}
+    c6ti = title_index(titles, 'C6TI')
 
     NTT=20 # number of technologies
 
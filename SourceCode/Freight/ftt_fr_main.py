@@ -42,7 +42,9 @@ import numpy as np
 
 # Local library imports
 from SourceCode.Freight.ftt_fr_lcof import get_lcof
+from SourceCode.support.cross_section import snapshot
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
 
 # Main function
 
@@ -82,7 +84,7 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
     no_it = int(data['noit'][0, 0, 0])
     dt = 1 / float(no_it)
 
-    c6ti = {category: index for index, category in enumerate(titles['C6TI'])}
+    c6ti = title_index(titles, 'C6TI')
 
     sector = 'freight'
     # Creating variables
@@ -141,15 +143,15 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
 
         for var in time_lag.keys():
 
-            if var.startswith("R"):
+            if var.startswith("R") and domain[var] == 'FTT-Fr':
 
-                data_dt[var] = copy.deepcopy(time_lag[var])
+                data_dt[var] = snapshot(time_lag[var])
 
         for var in time_lag.keys():
 
-            if var.startswith("Z"):
+            if var.startswith("Z") and domain[var] == 'FTT-Fr':
 
-                data_dt[var] = copy.deepcopy(time_lag[var])
+                data_dt[var] = snapshot(time_lag[var])
 
         # Find if there is a regulation and if it is exceeded
 
@@ -402,15 +404,15 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
             # Update time loop variables:
             for var in time_lag.keys():
 
-                if var.startswith("R"):
+                if var.startswith("R") and domain[var] == 'FTT-Fr':
 
-                    data_dt[var] = copy.deepcopy(data[var])
+                    data_dt[var] = snapshot(data[var])
 
             for var in time_lag.keys():
 
-                if var.startswith("Z"):
+                if var.startswith("Z") and domain[var] == 'FTT-Fr':
 
-                    data_dt[var] = copy.deepcopy(data[var])
+                    data_dt[var] = snapshot(data[var])
 
 
     return data
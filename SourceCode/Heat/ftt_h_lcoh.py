@@ -41,12 +41,15 @@ import numpy as np
 
 # Local library imports
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
+from SourceCode.support.profiling import timed
 
 # %% LCOH
 # --------------------------------------------------------------------------
 # -------------------------- LCOH function ---------------------------------
 # --------------------------------------------------------------------------
 
+@timed()
 def get_lcoh(data, titles):
     """
     Calculate levelized costs.
@@ -56,7 +59,7 @@ def get_lcoh(data, titles):
     determines the investor preferences.
     """
     # Categories for the cost matrix (BHTC)
-    c4ti = {category: index for index, category in enumerate(titles['C4TI'])}
+    c4ti = title_index(titles, 'C4TI')
 
     for r in range(len(titles['RTI'])):
 
@@ -41,14 +41,16 @@ import warnings
 import numpy as np
 
 # Local library imports
+from SourceCode.support.cross_section import snapshot
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
 from SourceCode.Heat.ftt_h_sales import get_sales
 from SourceCode.Heat.ftt_h_lcoh import get_lcoh
 
 # -----------------------------------------------------------------------------
 # ----------------------------- Main ------------------------------------------
 # -----------------------------------------------------------------------------
-def solve(data, time_lag, iter_lag, titles, histend, year, specs):
+def solve(data, time_lag, iter_lag, titles, histend, year, domain):
     """
     Main solution function for the module.
 
@@ -68,8 +70,8 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
         Final year of histrorical data by variable
     year: int
         Curernt/active year of solution
-    specs: dictionary of NumPy arrays
-        Function specifications for each region and module
+    domain: dictionary of lists
+        Pairs variables to domains
 
     Returns
     ----------
@@ -82,8 +84,8 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
     """
 
      # Categories for the cost matrix (BHTC)
-    c4ti = {category: index for index, category in enumerate(titles['C4TI'])}
-    jti = {category: index for index, category in enumerate(titles['JTI'])}
+    c4ti = title_index(titles, 'C4TI')
+    jti = title_index(titles, 'JTI')
 
     fuelvars = ['FR_1', 'FR_2', 'FR_3', 'FR_4', 'FR_5', 'FR_6',
                 'FR_7', 'FR_8', 'FR_9', 'FR_10', 'FR_11', 'FR_12']
@@ -212,7 +214,10 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
 
         # First, fill the time loop variables with the their lagged equivalents
         for var in time_lag.keys():
-            data_dt[var] = np.copy(time_lag[var])
+
+            if domain[var] == 'FTT-H':
+
+                data_dt[var] = snapshot(time_lag[var])
 
         
         # Create the regulation variable
@@ -540,7 +545,9 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
             #Update time loop variables:
             for var in data_dt.keys():
 
-                data_dt[var] = np.copy(data[var])
+                if domain[var] == 'FTT-H':
+
+                    data_dt[var] = snapshot(data[var])
 
 
     return data
@@ -43,7 +43,9 @@ import pandas as pd
 import numpy as np
 
 # Local library imports
+from SourceCode.support.cross_section import snapshot
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
 
 # %% lcoh
 # -----------------------------------------------------------------------------
@@ -80,7 +82,7 @@ def get_lcoih(data, titles, year):
     """
     sector = 'OIS'
     # Categories for the cost matrix (BIC5)
-    ctti = {category: index for index, category in enumerate(titles['CTTI'])}
+    ctti = title_index(titles, 'CTTI')
 
     for r in range(len(titles['RTI'])):
         if data['IUD5'][r, :, 0].sum(axis=0)==0:
@@ -245,7 +247,7 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):#, #specs, co
     """
 
     # Categories for the cost matrix (BIC5)
-    ctti = {category: index for index, category in enumerate(titles['CTTI'])}
+    ctti = title_index(titles, 'CTTI')
 
     sector = 'OIS'
 
@@ -264,7 +266,9 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):#, #specs, co
         # First, fill the time loop variables with the their lagged equivalents
         for var in time_lag.keys():
 
-            data_dt[var] = copy.deepcopy(time_lag[var])
+            if domain[var] == 'FTT-IH-OIS':
+
+                data_dt[var] = snapshot(time_lag[var])
 
         # Create the regulation variable #Regulate capacity #no regulations yet, isReg full of zeros
         division = divide((data_dt['IWK5'][:, :, 0] - data['IRG5'][:, :, 0]), data_dt['IRG5'][:, :, 0]) # 0 when dividing by 0
@@ -536,7 +540,9 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):#, #specs, co
             #Update time loop variables:
             for var in data_dt.keys():
 
-                data_dt[var] = copy.deepcopy(data[var])
+                if domain[var] == 'FTT-IH-OIS':
+
+                    data_dt[var] = snapshot(data[var])
 
 
     return data
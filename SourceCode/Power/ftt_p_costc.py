@@ -37,6 +37,7 @@ from numba import njit
 
 # Local library imports
 from SourceCode.support.divide import divide
+from SourceCode.support.profiling import timed
 
 # %% interpolation function
 # -----------------------------------------------------------------------------
@@ -162,8 +163,8 @@ def marginal_function(MEPD, RERY, MPTR, BCSC, HistC, MRCL, MERC, MRED, MRES, dt)
 
     '''
     L = 990
-    MRED = np.zeros([71, 14, 1])
-    MRES = np.zeros([71, 14, 1])
+    MRED = np.zeros(MRED.shape)
+    MRES = np.zeros(MRES.shape)
     P = np.zeros([4])
     #dQdt = np.zeros([990])
     #dFdthold = np.zeros([990])
@@ -205,7 +206,7 @@ def marginal_function(MEPD, RERY, MPTR, BCSC, HistC, MRCL, MERC, MRED, MRES, dt)
             # the regional production-to-reserve ratio MPTR,
             # the BCSC contains (sparse) regional matrix of reserves at cost level
             # and where_costs_below_price selects costs hist under the currrent cost guess P, with smoothing
-            dFdt = np.sum(MPTR[:, j, 0].reshape((71, 1)) \
+            dFdt = np.sum(MPTR[:, j, 0].reshape((-1, 1)) \
                          * BCSC[: , j, 4:] \
                          * costs_below_price.reshape((1, L)) * dC)
 
@@ -224,8 +225,8 @@ def marginal_function(MEPD, RERY, MPTR, BCSC, HistC, MRCL, MERC, MRED, MRES, dt)
         
         # Remove used resources from the regional histograms (uranium, oil, coal and gas only)
         # Have removed loop, loop was over regions
-        BCSC[:, j, 4:] = BCSC[:, j, 4:] - (MPTR[:, j, 0].reshape((71, 1)) * BCSC[:, j, 4:] * (0.5 - 0.5 * np.tanh(1.25 * 2 * sig[j] * divide(HistC[j, :] - P[j], P[j])))) * dt
-        RERY[:, j, 0] = np.sum((MPTR[:, j, 0].reshape((71, 1)) * BCSC[:, j, 4:] \
+        BCSC[:, j, 4:] = BCSC[:, j, 4:] - (MPTR[:, j, 0].reshape((-1, 1)) * BCSC[:, j, 4:] * (0.5 - 0.5 * np.tanh(1.25 * 2 * sig[j] * divide(HistC[j, :] - P[j], P[j])))) * dt
+        RERY[:, j, 0] = np.sum((MPTR[:, j, 0].reshape((-1, 1)) * BCSC[:, j, 4:] \
                                 * (0.5 - 0.5 * np.tanh(1.25 * 2 * sig[j] * divide(HistC[j, :] - P[j], P[j])))) * dC)
 
         # Write back new marginal cost values (same value for all regions)
@@ -248,6 +249,7 @@ def marginal_function(MEPD, RERY, MPTR, BCSC, HistC, MRCL, MERC, MRED, MRES, dt)
 # -----------------------------------------------------------------------------
 
 #@njit(fastmath=True) ## Doesn't work!
+@timed()
 def cost_curves(BCET, BCSC, MEWD, MEWG, MEWL, MEPD, MERC, MRCL, RERY, MPTR, MRED, MRES, rti, t2ti, erti, year, dt):
     '''
     FTT: Power cost-supply curves routine.
@@ -256,8 +258,8 @@ def cost_curves(BCET, BCSC, MEWD, MEWG, MEWL, MEPD, MERC, MRCL, RERY, MPTR, MRED
 
     L = 990
     lmo = np.arange(L)          # This will have length 990, from 0 to 989
-    CSC_Q = np.zeros([71, 14, L])
-    HistC = np.zeros([14, L])
+    CSC_Q = np.zeros([len(rti), len(erti), L])
+    HistC = np.zeros([len(erti), L])
     #HistQ = np.zeros([14, 990])
     X = np.zeros([990])
     Y = np.zeros([990])
@@ -267,6 +269,8 @@ def cost_curves(BCET, BCSC, MEWD, MEWG, MEWL, MEPD, MERC, MRCL, RERY, MPTR, MRED
     # Resources classification:
     # Correspondence vector between NT2 and NER (Technologies and resources: if I = Tech, II(I) = resource)
     tech_to_resource = [0, 1, 2, 2, 2, 2, 3, 3, 4, 4, 4, 4, 5, 6, 7, 8, 9, 10, 11, 11, 12, 13, 3, 3]
+    # Further technologies (e.g. resized synthetic inputs) repeat the 24 technologies
+    tech_to_resource = np.resize(tech_to_resource, len(t2ti))
 
     # BCSC is natural resource data with dimensions NER NR and length of cost axis k
 
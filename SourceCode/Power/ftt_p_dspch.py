@@ -16,6 +16,9 @@ Functions included:
 import numpy as np
 from numba import njit
 
+# Local library imports
+from SourceCode.support.profiling import timed
+
 
 
 
@@ -23,7 +26,8 @@ from numba import njit
 # -----------------------------------------------------------------------------
 # -------------------------- DSPTCH of capacity ------------------------------
 # -----------------------------------------------------------------------------
-@njit(fastmath=True)
+@timed()
+@njit(fastmath=True, cache=True)
 def dspch(MWDD, MEWS, MKLB, MCRT, MEWL, MWMC_lag, MMCD_lag, rti, t2ti, lbti):
     """
     Calculates dispatch of capacity.
@@ -15,6 +15,9 @@ Functions included:
 # Third party imports
 import numpy as np
 
+from SourceCode.support.titles_functions import title_index
+from SourceCode.support.profiling import timed
+
 
 
 # %% lcoe
@@ -54,6 +57,7 @@ def set_carbon_tax(data, c2ti, year):
     return carbon_costs
     
 
+@timed()
 def get_lcoe(data, titles):
     """
     Calculate levelized costs.
@@ -61,11 +65,17 @@ def get_lcoe(data, titles):
     The function calculates the levelised cost of electricity in $2013/MWh. It includes
     intangible costs (gamma values) and determines the investor preferences.
 
+    All regions are calculated at once. The arrays may also be stacked
+    along a leading scenario axis (scenario x region x tech x dim3), in
+    which case the levelised costs of all scenarios are calculated in the
+    same pass.
+
     Parameters
     -----------
     data: dictionary of NumPy arrays
         Model variables for the current year.
-        Variable names are keys and the values are 3D NumPy arrays.
+        Variable names are keys and the values are 3D NumPy arrays
+        (4D when stacked by scenario).
     titles: dictionary
         Titles is a container of all permissible dimension titles of the model.
 
@@ -83,203 +93,200 @@ def get_lcoe(data, titles):
     MEWL = Average capacity factor
     MEWT = Subsidies
     MTFT = Fuel tax
-    
+
+    Regions are grouped by the length of their cost horizon (the longest
+    lead time plus lifetime), so each region is discounted over the same
+    years as when it is calculated on its own.
     """
 
     # Categories for the cost matrix (BCET)
-    c2ti = {category: index for index, category in enumerate(titles['C2TI'])}
-
-    for r in range(len(titles['RTI'])):
+    c2ti = title_index(titles, 'C2TI')
+
+    # Regions (of all scenarios) along the first axis
+    bcet_all = data['BCET'].reshape((-1,) + data['BCET'].shape[-2:])
+
+    # Plant lifetime
+    lt_all = bcet_all[:, :, c2ti['9 Lifetime (years)']]
+    bt_all = bcet_all[:, :, c2ti['10 Lead Time (years)']]
+    horizons = np.max(bt_all + lt_all, axis=1).astype(int)
+
+    # Average capacity factor, trapped for very low CF (also in MEWL itself)
+    cf_av_all = data['MEWL'][..., 0]
+    cf_av_all[cf_av_all<0.000001] = 0.000001
+    cf_av_all = cf_av_all.reshape(bcet_all.shape[:2])
+
+    mewt_all = data['MEWT'][..., 0].reshape(bcet_all.shape[:2])
+    mtft_all = data['MTFT'][..., 0].reshape(bcet_all.shape[:2])
+    mssp_all = data['MSSP'][..., 0].reshape(bcet_all.shape[:2])
+    mlsp_all = data['MLSP'][..., 0].reshape(bcet_all.shape[:2])
+    mssm_all = data['MSSM'][..., 0].reshape(bcet_all.shape[:2])
+    mlsm_all = data['MLSM'][..., 0].reshape(bcet_all.shape[:2])
+    msal_all = np.rint(data['MSAL'][..., 0, 0].reshape(-1))
+    mefi_all = data['MEFI'][..., 0].reshape(bcet_all.shape[:2])
+    mgam_all = data['MGAM'][..., 0].reshape(bcet_all.shape[:2])
+
+    # Levelised costs of the regions of all scenarios
+    mewc = np.zeros(bcet_all.shape[:2])
+    mecw = np.zeros(bcet_all.shape[:2])
+    mecc = np.zeros(bcet_all.shape[:2])
+    metc = np.zeros(bcet_all.shape[:2])
+    mtcd = np.zeros(bcet_all.shape[:2])
+
+    for max_lt in np.unique(horizons):
+
+        group = np.flatnonzero(horizons == max_lt)
 
         # Cost matrix
-        bcet = data['BCET'][r, :, :]
+        bcet = bcet_all[group]
+        lt = lt_all[group]
+        bt = bt_all[group]
 
-        # Plant lifetime
-        lt = bcet[:, c2ti['9 Lifetime (years)']]
-        bt = bcet[:, c2ti['10 Lead Time (years)']]
-        max_lt = int(np.max(bt+lt))
-        
         # Define (matrix) masks to turn off cost components before or after contruction 
-        full_lt_mat = np.linspace(np.zeros(len(titles['T2TI'])), max_lt-1,
-                                  num=max_lt, axis=1, endpoint=True)
-        lt_max_mat = np.concatenate(int(max_lt) * [(lt+bt-1)[:, np.newaxis]], axis=1)
-        bt_max_mat = np.concatenate(int(max_lt) * [(bt-1)[:, np.newaxis]], axis=1)
-        
+        full_lt_mat = np.arange(max_lt, dtype=float)
+        lt_max_mat = (lt+bt-1)[:, :, np.newaxis]
+        bt_max_mat = (bt-1)[:, :, np.newaxis]
+
         bt_mask = full_lt_mat <= bt_max_mat
         bt_mask_out = full_lt_mat > bt_max_mat
         lt_mask_in = full_lt_mat <= lt_max_mat
         lt_mask = np.where(lt_mask_in == bt_mask_out, True, False)
-        
+
         # Capacity factor of marginal unit (for decision-making)
-        cf_mu = bcet[:, c2ti['11 Decision Load Factor']].copy()
+        cf_mu = bcet[:, :, c2ti['11 Decision Load Factor']].copy()
         # Trap for very low CF
         cf_mu[cf_mu<0.000001] = 0.000001
         # Factor to transfer cost components in terms of capacity to generation
         conv_mu = 1/bt / cf_mu/8766*1000
-        
+
         # Average capacity factor (for electricity price)
-        cf_av = data['MEWL'][r, :, 0]
-        # Trap for very low CF
-        cf_av[cf_av<0.000001] = 0.000001
+        cf_av = cf_av_all[group]
         # Factor to transfer cost components in terms of capacity to generation
-        conv_av = 1/bt / cf_av/8766*1000        
+        conv_av = 1/bt / cf_av/8766*1000
 
         # Discount rate
-        dr = bcet[:, c2ti['17 Discount Rate (%)'], np.newaxis]
+        dr = bcet[:, :, c2ti['17 Discount Rate (%)'], np.newaxis]
 
         # Initialse the levelised cost components
         # Average investment cost of marginal unit (new investments)
-        it_mu = np.ones([len(titles['T2TI']), int(max_lt)])
-        it_mu = it_mu * bcet[:, c2ti['3 Investment ($/kW)'], np.newaxis] * conv_mu[:, np.newaxis]
-        it_mu = np.where(bt_mask, it_mu, 0)
-        
+        it_mu = np.where(bt_mask, (bcet[:, :, c2ti['3 Investment ($/kW)']] * conv_mu)[:, :, np.newaxis], 0)
+
         # Average investment costs of across all units (electricity price)
-        it_av = np.ones([len(titles['T2TI']), int(max_lt)])
-        it_av = it_av * bcet[:, c2ti['3 Investment ($/kW)'], np.newaxis] * conv_av[:, np.newaxis]
-        it_av = np.where(bt_mask, it_av, 0)       
+        it_av = np.where(bt_mask, (bcet[:, :, c2ti['3 Investment ($/kW)']] * conv_av)[:, :, np.newaxis], 0)
 
         # Standard deviation of investment cost - marginal unit
-        dit_mu = np.ones([len(titles['T2TI']), int(max_lt)])
-        dit_mu = dit_mu * bcet[:, c2ti['4 std ($/MWh)'], np.newaxis] * conv_mu[:, np.newaxis]
-        dit_mu = np.where(bt_mask, dit_mu, 0)
+        dit_mu = np.where(bt_mask, (bcet[:, :, c2ti['4 std ($/MWh)']] * conv_mu)[:, :, np.newaxis], 0)
 
         # Standard deviation of investment cost - average of all units
-        dit_av = np.ones([len(titles['T2TI']), int(max_lt)])
-        dit_av = dit_av * bcet[:, c2ti['4 std ($/MWh)'], np.newaxis] * conv_av[:, np.newaxis]
-        dit_av = np.where(bt_mask, dit_av, 0)
+        dit_av = np.where(bt_mask, (bcet[:, :, c2ti['4 std ($/MWh)']] * conv_av)[:, :, np.newaxis], 0)
 
         # Subsidies - only valid for marginal unit
-        st = np.ones([len(titles['T2TI']), int(max_lt)])
-        st = (st * bcet[:, c2ti['3 Investment ($/kW)'], np.newaxis]
-              * data['MEWT'][r, :, :] * conv_mu[:, np.newaxis])
-        st = np.where(bt_mask, st, 0)
+        st = bcet[:, :, c2ti['3 Investment ($/kW)']] * mewt_all[group] * conv_mu
+        st = np.where(bt_mask, st[:, :, np.newaxis], 0)
 
         # Average fuel costs
-        ft = np.ones([len(titles['T2TI']), int(max_lt)])
-        ft = ft * bcet[:, c2ti['5 Fuel ($/MWh)'], np.newaxis]
-        ft = np.where(lt_mask, ft, 0)
+        ft = np.where(lt_mask, bcet[:, :, c2ti['5 Fuel ($/MWh)'], np.newaxis], 0)
 
         # Standard deviation of fuel costs
-        dft = np.ones([len(titles['T2TI']), int(max_lt)])
-        dft = dft * bcet[:, c2ti['6 std ($/MWh)'], np.newaxis]
-        dft = np.where(lt_mask, dft, 0)
+        dft = np.where(lt_mask, bcet[:, :, c2ti['6 std ($/MWh)'], np.newaxis], 0)
 
         # fuel tax/subsidies
-        fft = np.ones([len(titles['T2TI']), int(max_lt)])
-        fft = fft * data['MTFT'][r, :, 0, np.newaxis]
-        fft = np.where(lt_mask, fft, 0)
+        fft = np.where(lt_mask, mtft_all[group][:, :, np.newaxis], 0)
 
         # Average operation & maintenance cost
-        omt = np.ones([len(titles['T2TI']), int(max_lt)])
-        omt = omt * bcet[:, c2ti['7 O&M ($/MWh)'], np.newaxis]
-        omt = np.where(lt_mask, omt, 0)
+        omt = np.where(lt_mask, bcet[:, :, c2ti['7 O&M ($/MWh)'], np.newaxis], 0)
 
         # Standard deviation of operation & maintenance cost
-        domt = np.ones([len(titles['T2TI']), int(max_lt)])
-        domt = domt * bcet[:, c2ti['8 std ($/MWh)'], np.newaxis]
-        domt = np.where(lt_mask, domt, 0)
+        domt = np.where(lt_mask, bcet[:, :, c2ti['8 std ($/MWh)'], np.newaxis], 0)
 
         # Carbon costs
-        ct = np.ones([len(titles['T2TI']), int(max_lt)])
-        ct = ct * bcet[:, c2ti['1 Carbon Costs ($/MWh)'], np.newaxis]
-        ct = np.where(lt_mask, ct, 0)
-        
+        ct = np.where(lt_mask, bcet[:, :, c2ti['1 Carbon Costs ($/MWh)'], np.newaxis], 0)
+
         # Standard deviation carbon costs (set to zero for now)
-        dct = np.ones([len(titles['T2TI']), int(max_lt)])
-        dct = dct * bcet[:, c2ti['2 std ($/MWh)'], np.newaxis]
-        dct = np.where(lt_mask, dct, 0)
-        
+        dct = np.where(lt_mask, bcet[:, :, c2ti['2 std ($/MWh)'], np.newaxis], 0)
 
         # Energy production over the lifetime (incl. buildtime)
         # No generation during the buildtime, so no benefits
-        energy_prod = np.ones([len(titles['T2TI']), int(max_lt)])
-        energy_prod = np.where(lt_mask, energy_prod, 0)
+        energy_prod = np.where(lt_mask, 1.0, 0.0)
 
         # Storage costs and marginal costs (lifetime only)
-        stor_cost = np.ones([len(titles['T2TI']), int(max_lt)])
-        marg_stor_cost = np.ones([len(titles['T2TI']), int(max_lt)])
-
-        if np.rint(data['MSAL'][r, 0, 0]) in [2]:
-            stor_cost = stor_cost * (data['MSSP'][r, :, 0, np.newaxis] +
-                                     data['MLSP'][r, :, 0, np.newaxis]) / 1000
-            marg_stor_cost = marg_stor_cost * 0
-        elif np.rint(data['MSAL'][r, 0, 0]) in [3, 4, 5]:
-            stor_cost = stor_cost * (data['MSSP'][r, :, 0, np.newaxis] +
-                                     data['MLSP'][r, :, 0, np.newaxis]) / 1000
-            marg_stor_cost = marg_stor_cost * (data['MSSM'][r, :, 0, np.newaxis] +
-                                          data['MLSM'][r, :, 0, np.newaxis]) / 1000
-        else:
-            stor_cost = stor_cost * 0
-            marg_stor_cost = marg_stor_cost * 0
-
-        stor_cost = np.where(lt_mask, stor_cost, 0)
-        marg_stor_cost = np.where(lt_mask, marg_stor_cost, 0)
-        
+        msal = msal_all[group, np.newaxis]
+        stor_cost = np.where(np.isin(msal, [2, 3, 4, 5]),
+                             (mssp_all[group] + mlsp_all[group]) / 1000, 0.0)
+        marg_stor_cost = np.where(np.isin(msal, [3, 4, 5]),
+                                  (mssm_all[group] + mlsm_all[group]) / 1000, 0.0)
+
+        stor_cost = np.where(lt_mask, stor_cost[:, :, np.newaxis], 0)
+        marg_stor_cost = np.where(lt_mask, marg_stor_cost[:, :, np.newaxis], 0)
+
         dstor_cost = 0.2 * stor_cost         # Assume a standard deviation of 20%
 
         # Net present value calculations
-        
+
         # Discount rate
         denominator = (1+dr)**full_lt_mat
-        
-       
+
+
         # 1a – Expenses – marginal units
         npv_expenses_mu_no_policy      = (it_mu + ft + omt + stor_cost) / denominator 
         npv_expenses_mu_only_co2       = npv_expenses_mu_no_policy + ct / denominator
         npv_expenses_mu_all_policies   = npv_expenses_mu_no_policy + (ct + fft + st + marg_stor_cost) / denominator 
-        
+
         # 1b – Expenses – average LCOEs
         npv_expenses_no_policy        = (it_av + ft + omt + stor_cost) / denominator  
         npv_expenses_all_but_co2      = npv_expenses_no_policy + (fft + st) / denominator
-        
+
         # 2 – Utility
         npv_utility = energy_prod / denominator
-        utility_tot = np.sum(npv_utility, axis=1) 
-        
+        utility_tot = np.sum(npv_utility, axis=2) 
+
         # 3 – Standard deviation (propagation of error)
         npv_std = np.sqrt(dit_mu**2 + dft**2 + domt**2 + dct**2 + dstor_cost**2) / denominator  
-        
+
         # 4a – levelised cost – marginal units 
-        lcoe_mu_no_policy       = np.sum(npv_expenses_mu_no_policy, axis=1) / utility_tot        
-        lcoe_mu_only_co2        = np.sum(npv_expenses_mu_only_co2, axis=1) / utility_tot 
-        lcoe_mu_all_policies    = np.sum(npv_expenses_mu_all_policies, axis=1) / utility_tot - data['MEFI'][r, :, 0]
-        lcoe_mu_gamma           = lcoe_mu_all_policies + data['MGAM'][r, :, 0]
+        lcoe_mu_no_policy       = np.sum(npv_expenses_mu_no_policy, axis=2) / utility_tot        
+        lcoe_mu_only_co2        = np.sum(npv_expenses_mu_only_co2, axis=2) / utility_tot 
+        lcoe_mu_all_policies    = np.sum(npv_expenses_mu_all_policies, axis=2) / utility_tot - mefi_all[group]
+        lcoe_mu_gamma           = lcoe_mu_all_policies + mgam_all[group]
 
         # 4b levelised cost – average units 
-        lcoe_all_but_co2        = np.sum(npv_expenses_all_but_co2, axis=1) / utility_tot - data['MEFI'][r, :, 0]    
-        
-        # Standard deviation of LCOE
-        dlcoe                   = np.sum(npv_std, axis=1) / utility_tot
-
-
-        # Pass to variables that are stored outside.
-        data['MEWC'][r, :, 0] = lcoe_mu_no_policy       # The real bare LCOE without taxes
-        data['MECW'][r, :, 0] = lcoe_mu_only_co2        # Bare LCOE with CO2 costs
-        data["MECC"][r, :, 0] = lcoe_all_but_co2        # LCOE with policy, without CO2 costs
-        data['METC'][r, :, 0] = lcoe_mu_gamma           # As seen by consumer (generalised cost)
-        data['MTCD'][r, :, 0] = dlcoe                   # Standard deviation LCOE 
-
+        lcoe_all_but_co2        = np.sum(npv_expenses_all_but_co2, axis=2) / utility_tot - mefi_all[group]
 
-        # Output variables
-        data['MWIC'][r, :, 0] = bcet[:, 2].copy()    # Investment cost component LCOE ($/kW)
-        data['MWFC'][r, :, 0] = bcet[:, 4].copy()    # Fuel cost component of the LCOE ($/MWh)
-        data['MCOC'][r, :, 0] = bcet[:, 0].copy()    # Carbon cost component of the LCOE ($/MWh)
-        data['MCFC'][r, :, 0] = bcet[:, c2ti['11 Decision Load Factor']].copy() # The (marginal) capacity factor 
-
-        # MWMC: FTT Marginal costs power generation ($/MWh)
-        if np.rint(data['MSAL'][r, 0, 0]) > 1: # rint rounds to nearest int
-            data['MWMC'][r, :, 0] = bcet[:, 0] + bcet[:, 4] + bcet[:, 6] + (data['MSSP'][r, :, 0] + data['MLSP'][r, :, 0])/1000
-        else:
-            data['MWMC'][r, :, 0] = bcet[:, 0] + bcet[:, 4] + bcet[:, 6]
-
-
-        data['MMCD'][r, :, 0] = np.sqrt(bcet[:, 1] * bcet[:, 1] +
-                                        bcet[:, 5] * bcet[:, 5] +
-                                        bcet[:, 7] * bcet[:, 7])
-        
-        # Check if METC is nan
-        if np.isnan(data['METC']).any():
-            nan_indices_metc = np.where(np.isnan(data['METC']))
-            raise ValueError(f"NaN values detected in lcoe ('metc') at indices: {nan_indices_metc}")
+        # Standard deviation of LCOE
+        dlcoe                   = np.sum(npv_std, axis=2) / utility_tot
+
+        mewc[group] = lcoe_mu_no_policy
+        mecw[group] = lcoe_mu_only_co2
+        mecc[group] = lcoe_all_but_co2
+        metc[group] = lcoe_mu_gamma
+        mtcd[group] = dlcoe
+
+    # Pass to variables that are stored outside.
+    data['MEWC'][..., 0] = mewc.reshape(data['MEWC'].shape[:-1])   # The real bare LCOE without taxes
+    data['MECW'][..., 0] = mecw.reshape(data['MECW'].shape[:-1])   # Bare LCOE with CO2 costs
+    data['MECC'][..., 0] = mecc.reshape(data['MECC'].shape[:-1])   # LCOE with policy, without CO2 costs
+    data['METC'][..., 0] = metc.reshape(data['METC'].shape[:-1])   # As seen by consumer (generalised cost)
+    data['MTCD'][..., 0] = mtcd.reshape(data['MTCD'].shape[:-1])   # Standard deviation LCOE 
+
+    # Output variables
+    bcet = data['BCET']
+    data['MWIC'][..., 0] = bcet[..., 2]     # Investment cost component LCOE ($/kW)
+    data['MWFC'][..., 0] = bcet[..., 4]     # Fuel cost component of the LCOE ($/MWh)
+    data['MCOC'][..., 0] = bcet[..., 0]     # Carbon cost component of the LCOE ($/MWh)
+    data['MCFC'][..., 0] = bcet[..., c2ti['11 Decision Load Factor']]   # The (marginal) capacity factor 
+
+    # MWMC: FTT Marginal costs power generation ($/MWh)
+    marginal_cost = bcet[..., 0] + bcet[..., 4] + bcet[..., 6]
+    data['MWMC'][..., 0] = np.where(np.rint(data['MSAL'][..., 0:1, 0]) > 1,  # rint rounds to nearest int
+                                    marginal_cost + (data['MSSP'][..., 0] + data['MLSP'][..., 0])/1000,
+                                    marginal_cost)
+
+    data['MMCD'][..., 0] = np.sqrt(bcet[..., 1] * bcet[..., 1] +
+                                   bcet[..., 5] * bcet[..., 5] +
+                                   bcet[..., 7] * bcet[..., 7])
+
+    # Check if METC is nan
+    if np.isnan(data['METC']).any():
+        nan_indices_metc = np.where(np.isnan(data['METC']))
+        raise ValueError(f"NaN values detected in lcoe ('metc') at indices: {nan_indices_metc}")
 
     return data
@@ -60,7 +60,9 @@ Functions included:
 import numpy as np
 
 # Local library imports
+from SourceCode.support.cross_section import snapshot
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
 from SourceCode.ftt_core.ftt_sales_or_investments import get_sales, get_sales_yearly
 from SourceCode.Power.ftt_p_rldc import rldc
 from SourceCode.Power.ftt_p_dspch import dspch
@@ -108,7 +110,7 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
     survival_function is currently unused.
     """
     # Categories for the cost matrix (BCET)
-    c2ti = {category: index for index, category in enumerate(titles['C2TI'])}
+    c2ti = title_index(titles, 'C2TI')
 
 
     # Conditional vector concerning technology properties
@@ -506,7 +508,7 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
 
             if domain[var] == 'FTT-P':
 
-                data_dt[var] = np.copy(time_lag[var])
+                data_dt[var] = snapshot(time_lag[var])
 
         data_dt['MWIY'] = np.zeros([len(titles['RTI']), len(titles['T2TI']), 1])
 
@@ -821,6 +823,6 @@ def solve(data, time_lag, iter_lag, titles, histend, year, domain):
 
                 if domain[var] == 'FTT-P':
 
-                    data_dt[var] = np.copy(data[var])
+                    data_dt[var] = snapshot(data[var])
         
     return data
@@ -24,6 +24,7 @@ import numpy as np
 
 # Local library imports
 from SourceCode.support.divide import divide
+from SourceCode.support.profiling import timed
 
 #%% FEQS
 def feqs(a):
@@ -33,6 +34,7 @@ def feqs(a):
 # -----------------------------------------------------------------------------
 # -------------------------- RLDC calcultion ------------------------------
 # -----------------------------------------------------------------------------
+@timed()
 def rldc(data, time_lag, data_dt, year, titles):
     """
     Calculate RLDCs.
@@ -71,13 +73,15 @@ def rldc(data, time_lag, data_dt, year, titles):
                            14.3, 24.5, 32.3, 49.1, 24.0, 9.5,  28.8, 27.4, 3.8,  3.7,
                            47.9, 24.8, 9.1,  11.2, 9.0, 20.6, 26.4, 2.8 , 0.6, 23.9,
                            29.8])
+    # Further regions (e.g. resized synthetic inputs) repeat the 71 regions
+    latitude = np.resize(latitude, len(titles['RTI']))
     seasonality_index = latitude/60 # Used to divide the capacity constraint between long and short-term storage needs
     seasonality_index[seasonality_index > 1.0] = 1.0
 
     # Mapping of NWR = 53 world regions to 8 available RLDC regions:
     # 0 = Europe, 1 = Latin America, 2 = India, 3 = USA, 4 = Japan, 5 = Middle
     # East and North Africa, 6 = Sub-Saharan Africa, 7 = China
-    rldc_regmap = np.zeros(len(titles['RTI']), dtype=int)
+    rldc_regmap = np.zeros(71, dtype=int)
     rldc_regmap[0:33] = 0 # Europe
     rldc_regmap[33] = 3 # USA
     rldc_regmap[34] = 4 # Japan
@@ -98,6 +102,7 @@ def rldc(data, time_lag, data_dt, year, titles):
     rldc_regmap[61:69] = 6  # Rest of African regions (Africa as proxy)
     rldc_regmap[69] = 5  # UAE (MENA as proxy)
     rldc_regmap[70] = 5  # Pakistan (MENA as proxy)
+    rldc_regmap = np.resize(rldc_regmap, len(titles['RTI']))
 
     # Define matrices with polynomial coefficients for 8 RLDC regions
     # 10 input parameters (shares of generation of wind and solar in a
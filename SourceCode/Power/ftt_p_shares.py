@@ -15,21 +15,39 @@ Functions included:
 import numpy as np
 from numba import njit
 
+# Local library imports
+from SourceCode.support.profiling import timed
+
 
 
 # %% JIT-compiled shares equation
 # -----------------------------------------------------------------------------
 
+@timed()
 def shares(dt, t, T_Scal, mewdt, mews_dt, metc_dt, mtcd_dt,
            mwka, mes1_dt, mes2_dt, mewa, isReg, mewk_dt, mewk_lag, mewr,
            mewl_dt, mews_lag, mwlo, rti, t2ti, no_it):
-    '''Calculate the shares with compiled function, then check if values are real'''
-    
+    '''
+    Calculate the shares with compiled function, then check if values are real.
+
+    The arrays may be stacked along a leading scenario axis (scenario x
+    region x ...). The regions of all scenarios are then solved in a single
+    call of the compiled function, and the results are stacked the same way.
+    '''
+
+    # Regions of all scenarios along the first axis
+    stacked = mewdt.shape[:-1]
+    arrays = [np.reshape(array, (-1,) + np.shape(array)[len(stacked) + 1:])
+              for array in (mewdt, mews_dt, metc_dt, mtcd_dt, mwka, mes1_dt, mes2_dt, mewa,
+                            isReg, mewk_dt, mewk_lag, mewr, mewl_dt, mews_lag, mwlo)]
+    scenarios = int(np.prod(stacked))
+
     # First calculate the shares using njit
-    mews, mewl, mewg, mewk = shares_calc(dt, t, T_Scal, mewdt, mews_dt, metc_dt, mtcd_dt,
-               mwka, mes1_dt, mes2_dt, mewa, isReg, mewk_dt, mewk_lag, mewr,
-               mewl_dt, mews_lag, mwlo, rti, t2ti, no_it)
-    
+    mews, mewl, mewg, mewk = shares_calc(dt, t, T_Scal, *arrays,
+                                         scenarios * rti, t2ti, no_it)
+    mews, mewl, mewg, mewk = (array.reshape(stacked + (rti,) + array.shape[1:])
+                              for array in (mews, mewl, mewg, mewk))
+
     # Then check the results
     check_shares_output(mews, mewl, mewg, mewk)
     
@@ -37,7 +55,7 @@ def shares(dt, t, T_Scal, mewdt, mews_dt, metc_dt, mtcd_dt,
 
 
 
-@njit(fastmath=True)
+@njit(fastmath=True, cache=True)
 def shares_calc(dt, t, T_Scal, mewdt, mews_dt, metc_dt, mtcd_dt,
            mwka, mes1_dt, mes2_dt, mewa, isReg, mewk_dt, mewk_lag, mewr,
            mewl_dt, mews_lag, mwlo, rti, t2ti, no_it):
@@ -72,7 +90,8 @@ def shares_calc(dt, t, T_Scal, mewdt, mews_dt, metc_dt, mtcd_dt,
 
     Notes
     -----
-    This function is decorated with `@njit(fastmath=True)` for performance optimization.
+    This function is decorated with `@njit(fastmath=True, cache=True)` for performance
+    optimization; the compiled code is cached on disk (see SourceCode/warmup.py).
     """
 
     # Values to return
@@ -30,10 +30,14 @@ ns = number of seats
 """
 import numpy as np
 
+from SourceCode.support.titles_functions import title_index
+from SourceCode.support.profiling import timed
+
 # %% lcot
 # -----------------------------------------------------------------------------
 # --------------------------- LCOT function -----------------------------------
 # -----------------------------------------------------------------------------
+@timed()
 def get_lcot(data, titles, year):
     """
     Calculate levelized costs.
@@ -44,7 +48,7 @@ def get_lcot(data, titles, year):
     """
 
     # Categories for the cost matrix (BTTC)
-    c3ti = {category: index for index, category in enumerate(titles['C3TI'])}
+    c3ti = title_index(titles, 'C3TI')
 
     # Taxable categories for fuel - not all fuels subject to fuel tax
     tf = np.ones([len(titles['VTTI']), 1])
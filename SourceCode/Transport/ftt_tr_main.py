@@ -39,7 +39,9 @@ import warnings
 import numpy as np
 
 # Local library imports
+from SourceCode.support.cross_section import snapshot
 from SourceCode.support.divide import divide
+from SourceCode.support.titles_functions import title_index
 from SourceCode.Transport.ftt_tr_lcot import get_lcot
 from SourceCode.ftt_core.ftt_sales_or_investments import get_sales
 from SourceCode.Transport.ftt_tr_survival import survival_function, add_new_cars_age_matrix
@@ -58,7 +60,7 @@ from SourceCode.Transport.ftt_tr_survival import survival_function, add_new_cars
 # -----------------------------------------------------------------------------
 # ----------------------------- Main ------------------------------------------
 # -----------------------------------------------------------------------------
-def solve(data, time_lag, iter_lag, titles, histend, year, specs):
+def solve(data, time_lag, iter_lag, titles, histend, year, domain):
     """
     Main solution function for the module.
 
@@ -78,8 +80,8 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
         Final year of histrorical data by variable
     year: int
         Curernt/active year of solution
-    specs: dictionary of NumPy arrays
-        Function specifications for each region and module
+    domain: dictionary of lists
+        Pairs variables to domains
 
     Returns
     ----------
@@ -91,8 +93,8 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
     This function should be broken up into more elements in development.
     """
     # Categories for the cost matrix (BTTC)
-    c3ti = {category: index for index, category in enumerate(titles['C3TI'])}
-    jti = {category: index for index, category in enumerate(titles['JTI'])}
+    c3ti = title_index(titles, 'C3TI')
+    jti = title_index(titles, 'JTI')
 
     fuelvars = ['FR_1', 'FR_2', 'FR_3', 'FR_4', 'FR_5', 'FR_6',
                 'FR_7', 'FR_8', 'FR_9', 'FR_10', 'FR_11', 'FR_12']
@@ -245,7 +247,9 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
         # First, fill the time loop variables with the their lagged equivalents
         for var in time_lag.keys():
 
-            data_dt[var] = np.copy(time_lag[var])
+            if domain[var] == 'FTT-Tr':
+
+                data_dt[var] = snapshot(time_lag[var])
 
         data_dt['TWIY'] = np.zeros(
             [len(titles['RTI']), len(titles['VTTI']), 1])
@@ -581,7 +585,9 @@ def solve(data, time_lag, iter_lag, titles, histend, year, specs):
             # Update time loop variables:
             for var in data_dt.keys():
 
-                data_dt[var] = np.copy(data[var])
+                if domain[var] == 'FTT-Tr':
+
+                    data_dt[var] = snapshot(data[var])
 
         # Call the survival function routine
         data = survival_function(data, time_lag, histend, year, titles)
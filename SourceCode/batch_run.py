@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+batch_run.py
+=========================================
+Headless model run from the command line.
+
+The run takes settings.ini with the modules, scenarios, simulation window
+and output folder given as arguments (and any other setting with --set).
+The settings are only changed in memory, see read_settings, so several
+runs with different settings can execute at the same time from the same
+folder, e.g. on a server, as long as each has its own output folder. The
+results are written to the output folder as Results.pickle and
+Scenarios.json, as the frontend writes them, next to the checkpoints and
+profile of the run. Run as
+    python -m SourceCode.batch_run --modules FTT-P FTT-H --scenarios S0 S1
+        --end 2040 --output Output/run_1
+
+Functions included:
+    - settings_overrides
+        Settings given by the command line arguments
+    - save_results
+        Save the outputs and the scenario metadata of a run
+
+"""
+
+# Standard library imports
+import argparse
+import datetime
+import json
+import os
+import pickle
+
+# Local library imports
+from SourceCode.model_class import ModelRun, read_settings
+
+
+def settings_overrides(args):
+    """
+    Settings given by the command line arguments.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments of the command line
+
+    Returns
+    ----------
+    overrides: dict of str
+        Values of the [settings] section of settings.ini
+    """
+
+    overrides = {}
+    for item in args.set:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f'Setting {item} is not of the form KEY=VALUE')
+        overrides[key.strip()] = value.strip()
+
+    if args.modules:
+        overrides['enable_modules'] = ', '.join(args.modules)
+    if args.scenarios:
+        overrides['scenarios'] = ', '.join(args.scenarios)
+    if args.start is not None:
+        overrides['simulation_start'] = str(args.start)
+    if args.end is not None:
+        overrides['simulation_end'] = str(args.end)
+        overrides['model_end'] = str(args.end)
+    if args.output:
+        overrides['output_dir'] = args.output
+    if args.name:
+        overrides['name'] = args.name
+
+    return overrides
+
+
+def save_results(model, folder=None):
+    """
+    Save the outputs and the scenario metadata of a run.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Solved model run
+    folder: str, optional
+        Output folder; by default the output_dir of the run
+    """
+
+    folder = folder or model.output_dir
+    os.makedirs(folder, exist_ok=True)
+
+    with open(os.path.join(folder, 'Results.pickle'), 'wb') as f:
+        pickle.dump(model.output, f)
+
+    # Scenario metadata read by the frontend
+    timestamp = datetime.datetime.timestamp(datetime.datetime.now())
+    scenarios_log = {scen: {'run': timestamp,
+                            'description': model.name,
+                            'years': [str(year) for year in model.timeline]}
+                     for scen in model.output}
+    with open(os.path.join(folder, 'Scenarios.json'), 'w') as f:
+        json.dump(scenarios_log, f)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run the model without the frontend')
+    parser.add_argument('--settings', default='settings.ini', help='settings file (only read)')
+    parser.add_argument('--modules', nargs='+', help='enabled modules, e.g. FTT-P FTT-H')
+    parser.add_argument('--scenarios', nargs='+', help='scenarios, e.g. S0 S1')
+    parser.add_argument('--start', type=int, help='first year of the simulation')
+    parser.add_argument('--end', type=int, help='last year of the simulation')
+    parser.add_argument('--output', help='output folder (default Output)')
+    parser.add_argument('--name', help='name of the run')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='any other setting, e.g. --set parallel_scenarios=True')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume each scenario after its last checkpoint')
+    args = parser.parse_args()
+
+    model = ModelRun(read_settings(args.settings, settings_overrides(args)))
+    if args.resume:
+        model.resume()
+    else:
+        model.run()
+
+    save_results(model)
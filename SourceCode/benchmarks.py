@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+benchmarks.py
+=========================================
+Benchmarks of the module solves and of the support layer.
+
+The modules are solved on synthetic inputs with the dimensions of
+VariableListing (see synthetic_inputs), so that they can be timed without
+the masterfiles and at any size. Each module is solved year by year, the
+output of a year being the time lags of the next, and its solve is timed
+in a historical year (the last year of historical shares), the transition
+year after it and a simulation year. The support layer is timed on the
+same variables: load_data on the csv files in Inputs (with and without
+the input cache), cross_section, and the chart queries of the backend on
+a results file of synthetic outputs.
+
+Classifications can be resized (e.g. --size RTI=142 --size T2TI=48) to
+measure how the solves scale in regions and technologies. Results are
+written as json, with the machine and versions they were run on, and can
+be compared to an earlier file. Run from the command line as
+    python -m SourceCode.benchmarks [--compare Output/Benchmarks_<label>.json]
+
+Functions included:
+    - time_function
+        Timings of repeated calls of a function
+    - benchmark_modules
+        Time the solve of each module in its historical, transition and
+        simulation years
+    - benchmark_support
+        Time load_data and cross_section
+    - benchmark_chart_queries
+        Time the chart data queries of the backend
+    - run_benchmarks
+        Run all benchmarks and collect the results with their environment
+    - compare_results
+        Ratios of the median timings of two benchmark results
+
+"""
+
+# Standard library imports
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+# Third party imports
+import numpy as np
+
+# Local library imports
+from SourceCode.model_class import FTT_MODULES
+from SourceCode.gamma_calibration import SHARE_VARIABLES
+import SourceCode.support.dimensions_functions as dims_f
+import SourceCode.support.titles_functions as titles_f
+from SourceCode.support.cross_section import cross_section
+from SourceCode.support.input_functions import load_data
+from SourceCode.support.synthetic_inputs import resize_titles, synthetic_inputs
+
+
+# Years solved after the historical year before the simulation year is timed
+SIMULATION_OFFSET = 5
+
+# Outputs written to the results file of the chart query benchmark
+CHART_VARIABLES = ('MEWS', 'MEWG', 'TEWS', 'HEWS')
+
+
+def time_function(function, repeat, setup=None, warmup=1):
+    """
+    Timings of repeated calls of a function.
+
+    Parameters
+    ----------
+    function: callable
+        Function timed
+    repeat: int
+        Number of calls
+    setup: callable, optional
+        Function returning the arguments of each call (not timed)
+    warmup: int
+        Number of calls before the timed calls (e.g. to compile the
+        numba functions)
+
+    Returns
+    ----------
+    timings: dict
+        Minimum, median and mean time of a call in seconds, and the number
+        of calls
+    """
+
+    times = []
+    for call in range(warmup + repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        if call >= warmup:
+            times.append(time.perf_counter() - start)
+
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.fmean(times), 'repeat': repeat}
+
+
+def benchmark_modules(titles, dims, histend, domain, inputs, timeline, repeat=5, modules=None):
+    """
+    Time the solve of each module in its historical, transition and simulation years.
+
+    Parameters
+    ----------
+    titles: dictionary of lists
+        Classification titles
+    dims: dict of VariableMeta
+        Variable classifications
+    histend: dict of int
+        Last year of historical data of each variable
+    domain: dict of str
+        Domain of each variable
+    inputs: dictionary of numpy arrays
+        Inputs of the baseline (e.g. synthetic_inputs)
+    timeline: list of int
+        Years of the inputs
+    repeat: int
+        Number of timed solves in each year
+    modules: list of str, optional
+        Modules timed (by default all)
+
+    Returns
+    ----------
+    results: dict
+        Timings by '<module>/<phase>' (historical, transition, simulation),
+        with the year timed
+    """
+
+    timeline = list(timeline)
+    results = {}
+    for name in FTT_MODULES:
+        if modules is not None and name not in modules:
+            continue
+        module = FTT_MODULES[name]
+
+        hist = histend[SHARE_VARIABLES[name][1]]
+        phases = {hist: 'historical', hist + 1: 'transition',
+                  hist + 1 + SIMULATION_OFFSET: 'simulation'}
+        last = max(phases)
+        if hist not in timeline or last not in timeline:
+            warnings.warn(f'{name} not timed: the timeline does not cover {hist}-{last}')
+            continue
+
+        # Solve year by year; the output of a year is the lag of the next
+        time_lag = None
+        for y, year in enumerate(timeline[:timeline.index(last) + 1]):
+            def setup():
+                return (cross_section({'S0': inputs}, dims, year, y, 'S0', copy_on_write=True),)
+
+            def solve(data):
+                with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+                    warnings.simplefilter('ignore')
+                    return module.solve(data, lags, lags, titles, histend, year, domain)
+
+            lags = setup()[0] if time_lag is None else time_lag
+            if year in phases:
+                results[f'{name}/{phases[year]}'] = dict(time_function(solve, repeat, setup),
+                                                         year=year)
+            time_lag = solve(*setup())
+
+    return results
+
+
+def benchmark_support(titles, dims, forstart, domain, inputs, timeline, repeat=5,
+                      inputs_folder=True):
+    """
+    Time load_data and cross_section.
+
+    load_data reads the csv files of all modules in Inputs for the
+    baseline, without and with the input cache (the cache is built before
+    it is timed). cross_section takes the synthetic inputs of a year.
+
+    Parameters
+    ----------
+    titles: dictionary of lists
+        Classification titles
+    dims: dict of VariableMeta
+        Variable classifications
+    forstart: dict of int
+        First forecast year of each variable
+    domain: dict of str
+        Domain of each variable
+    inputs: dictionary of numpy arrays
+        Inputs of the baseline (e.g. synthetic_inputs)
+    timeline: list of int
+        Years of the inputs
+    repeat: int
+        Number of timed calls
+    inputs_folder: bool
+        Whether to time load_data (the csv files in Inputs must have the
+        sizes of titles)
+
+    Returns
+    ----------
+    results: dict
+        Timings by benchmark name
+    """
+
+    ftt_modules = ', '.join(FTT_MODULES)
+    results = {}
+
+    def load(cache):
+        with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+            warnings.simplefilter('ignore')
+            return load_data(titles, dims, timeline, 'S0', ftt_modules, forstart,
+                             domain, cache=cache)
+
+    # Reading the csv files is slow enough not to need a warm-up call;
+    # the warm-up call of the cached read builds the cache
+    if inputs_folder:
+        results['load_data/uncached'] = time_function(lambda: load(False), repeat, warmup=0)
+        results['load_data/cached'] = time_function(lambda: load(True), repeat)
+
+    y = len(timeline) // 2
+    year = timeline[y]
+    results['cross_section/copy'] = time_function(
+        lambda: cross_section({'S0': inputs}, dims, year, y, 'S0'), repeat)
+    results['cross_section/copy_on_write'] = time_function(
+        lambda: cross_section({'S0': inputs}, dims, year, y, 'S0', copy_on_write=True), repeat)
+
+    return results
+
+
+def benchmark_chart_queries(titles, dims, inputs, timeline, repeat=5):
+    """
+    Time the chart data queries of the backend.
+
+    The queries read the results file of a model run, so they are run in a
+    temporary directory holding a results file with synthetic outputs. The
+    queries need bottle (the backend's web framework); without it nothing
+    is timed.
+
+    Parameters
+    ----------
+    titles: dictionary of lists
+        Classification titles
+    dims: dict of VariableMeta
+        Variable classifications
+    inputs: dictionary of numpy arrays
+        Synthetic outputs (e.g. synthetic_inputs)
+    timeline: list of int
+        Years of the outputs
+    repeat: int
+        Number of timed queries
+
+    Returns
+    ----------
+    results: dict
+        Timings by query (empty without bottle)
+    """
+
+    try:
+        import bottle
+        import Backend_FTT
+    except ImportError as error:
+        warnings.warn(f'Chart queries not timed: {error}')
+        return {}
+
+    variables = [var for var in CHART_VARIABLES if var in inputs and dims[var][3] == 'TIME']
+    sheets = titles_f.load_title_sheets()
+    output = {scen: {var: inputs[var] for var in variables} for scen in ('S0', 'S1')}
+
+    def query(var, calculation):
+        meta = dims[var]
+        params = [('variable[]', var), ('variable_label[]', json.dumps({'label': var, 'unit': ''})),
+                  ('scenarios[]', 'S1'), ('baseline', 'S0'), ('calculation', calculation),
+                  ('time', 'Yes'), ('aggregate', 'false'), ('aggregate2', 'false'),
+                  ('aggregate3', 'false')]
+        for key, code in zip(('title[]', 'title2[]', 'title3[]'), meta[:3]):
+            params.append((key, code if code in sheets else 'None'))
+        names = [list(sheets[code]['Full name'].astype(str).unique()) if code in sheets else ['None']
+                 for code in meta[:3]]
+        params += [('dimensions[]', name) for name in names[0]]
+        params += [('dimensions2[]', 'All'), ('dimensions3[]', 'All')]
+        bottle.request.bind({'REQUEST_METHOD': 'GET', 'QUERY_STRING': bottle.urlencode(params)})
+        bottle.response.bind()
+        with contextlib.redirect_stdout(io.StringIO()):
+            return Backend_FTT.retrieve_chart_data('json')
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.mkdir('Output')
+            with open(os.path.join('Output', 'Results.pickle'), 'wb') as f:
+                pickle.dump(output, f)
+            with open(os.path.join('Output', 'Scenarios.json'), 'w') as f:
+                json.dump({scen: {'years': [int(year) for year in timeline]}
+                           for scen in output}, f)
+            for var in variables:
+                for calculation in ('Levels', 'absolute_diff'):
+                    results[f'chart/{var}/{calculation}'] = time_function(
+                        lambda: query(var, calculation), repeat)
+        finally:
+            os.chdir(cwd)
+
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(start=2010, end=2030, repeat=5, modules=None, seed=0, support=True,
+                   sizes=None):
+    """
+    Run all benchmarks and collect the results with their environment.
+
+    Parameters
+    ----------
+    start, end: int
+        First and last year of the timeline
+    repeat: int
+        Number of timed calls of each benchmark
+    modules: list of str, optional
+        Modules timed (by default all)
+    seed: int
+        Seed of the synthetic inputs
+    support: bool
+        Whether to time the support layer and the chart queries
+    sizes: dict of int, optional
+        Number of entries of resized classifications (see resize_titles),
+        e.g. to measure the scaling in regions or technologies. load_data
+        is not timed on resized classifications, as the csv files in
+        Inputs have the original sizes (write_run_folder writes inputs of
+        any size)
+
+    Returns
+    ----------
+    results: dict
+        'environment' (machine, versions, git revision and settings) and
+        'benchmarks' (timings by name, in seconds)
+    """
+
+    timeline = list(range(start, end + 1))
+    titles = resize_titles(titles_f.load_titles(), sizes or {})
+    dims, histend, domain, forstart = dims_f.load_dims(titles, timeline)
+    inputs = synthetic_inputs(titles, dims, timeline, histend, seed=seed)
+
+    benchmarks = benchmark_modules(titles, dims, histend, domain, inputs, timeline,
+                                   repeat, modules)
+    if support:
+        benchmarks.update(benchmark_support(titles, dims, forstart, domain, inputs,
+                                            timeline, repeat, not sizes))
+        benchmarks.update(benchmark_chart_queries(titles, dims, inputs, timeline, repeat))
+
+    environment = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'platform': platform.platform(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'timeline': [start, end],
+        'repeat': repeat,
+        'seed': seed,
+        'sizes': {code: len(titles[code]) for code in sizes or {}},
+    }
+
+    return {'environment': environment, 'benchmarks': benchmarks}
+
+
+def compare_results(results, baseline):
+    """
+    Ratios of the median timings of two benchmark results.
+
+    Parameters
+    ----------
+    results, baseline: dict
+        Results of run_benchmarks
+
+    Returns
+    ----------
+    ratios: dict of float
+        Median time in results over the median time in baseline, for the
+        benchmarks in both (above one is slower)
+    """
+
+    return {name: timing['median'] / baseline['benchmarks'][name]['median']
+            for name, timing in results['benchmarks'].items()
+            if name in baseline['benchmarks'] and baseline['benchmarks'][name]['median'] > 0}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the module solves and support layer')
+    parser.add_argument('modules', nargs='*', default=None, help='modules timed (default all)')
+    parser.add_argument('--start', type=int, default=2010)
+    parser.add_argument('--end', type=int, default=2030)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', action='append', default=[],
+                        help='classification and number of entries, e.g. RTI=142')
+    parser.add_argument('--modules-only', action='store_true', help='skip the support layer')
+    parser.add_argument('--label', default=None, help='name of the results file')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare to')
+    args = parser.parse_args()
+
+    sizes = {code: int(size) for code, size in (item.split('=') for item in args.size)}
+    results = run_benchmarks(args.start, args.end, args.repeat, args.modules or None,
+                             args.seed, not args.modules_only, sizes)
+
+    label = args.label or datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join('Output', f'Benchmarks_{label}.json')
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            ratios = compare_results(results, json.load(f))
+    else:
+        ratios = {}
+
+    for name, timing in results['benchmarks'].items():
+        ratio = f'  x{ratios[name]:.2f}' if name in ratios else ''
+        print(f'{name:40s} {timing["median"] * 1000:10.3f} ms{ratio}')
+    print(f'Results written to {path}')
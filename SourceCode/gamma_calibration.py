@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+gamma_calibration.py
+=========================================
+Automatic calibration of the gamma values of an FTT module.
+
+The gamma values of each region are chosen so that the shares simulated
+after the end of the historical data continue the historical trend. The
+historical years of the scenario are solved once: the shares are
+computed in the model (e.g. MEWS from the capacities MEWK), so the
+target is a linear fit of the last historical years of the solved
+shares, extended over the calibration horizon. The gamma values only
+act after the historical years, so every candidate starts from the
+solved state of the last historical year. The search is a cross-entropy
+method: each iteration samples a number of candidate gamma vectors
+around the current mean of each region, solves all candidates over the
+horizon as one batch (see ModelRun.solve_batch), and moves the mean and
+spread of each region to its best candidates. Regions only interact
+through learning, so one batch of candidates serves all regions at once.
+
+Run from the command line as
+    python -m SourceCode.gamma_calibration <module>
+to calibrate a module and write the gamma values to the csv files in
+Inputs/S0/<module>.
+
+Functions included:
+    - solve_history
+        Shares and state of a scenario solved over the historical years
+    - trend_targets
+        Shares continuing the historical trend
+    - calibrate_gamma
+        Search for the gamma values that fit the historical trend
+    - write_gamma
+        Write calibrated gamma values to the baseline input csv files
+
+"""
+
+# Standard library imports
+import argparse
+import os
+
+# Third party imports
+import numpy as np
+import pandas as pd
+
+# Local library imports
+from SourceCode.model_class import ModelRun
+from SourceCode.support.convergence import copy_into
+from SourceCode.support.input_functions import overlay_inputs
+from SourceCode.support.titles_functions import gamma_codes, title_index
+
+
+# Shares of each module, and the variable whose last historical year ends
+# the history of the shares
+SHARE_VARIABLES = {
+    'FTT-P': ('MEWS', 'MEWG'),
+    'FTT-H': ('HEWS', 'HEWF'),
+    'FTT-Tr': ('TEWS', 'TEWS'),
+    'FTT-Fr': ('ZEWS', 'ZEWS'),
+    'FTT-IH-CHI': ('IWS1', 'IWS1'),
+    'FTT-IH-FBT': ('IWS2', 'IWS2'),
+    'FTT-IH-MTM': ('IWS3', 'IWS3'),
+    'FTT-IH-NMM': ('IWS4', 'IWS4'),
+    'FTT-IH-OIS': ('IWS5', 'IWS5'),
+}
+
+
+def solve_history(model, scenario, n_years, share_var):
+    """
+    Shares and state of a scenario solved over the historical years.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the inputs and settings
+    scenario: str
+        Scenario solved
+    n_years: int
+        Number of years solved, from the start of the timeline
+    share_var: str
+        Shares kept
+
+    Returns
+    ----------
+    shares: numpy array
+        Solved shares (RTI x tech x 1 x TIME), zero after the years solved
+    state: dictionary of numpy arrays
+        Variables of the last year solved
+    """
+
+    run = model.scenario_run(scenario)
+    run.timeline = model.timeline[:n_years]
+    run.checkpoints = False
+    run.fork_years = {}
+    run.solve_scenario(scenario, progress=False, outputs=[share_var])
+
+    return run.output[scenario][share_var], copy_into(None, run.variables)
+
+
+def trend_targets(shares, timeline, histend, trend_years=5, horizon=5):
+    """
+    Shares continuing the historical trend.
+
+    Parameters
+    ----------
+    shares: numpy array
+        Shares by region, technology and year (RTI x tech x 1 x TIME)
+    timeline: list of int
+        Years of the TIME dimension
+    histend: int
+        Last year of historical data
+    trend_years: int
+        Number of historical years the trend is fitted on
+    horizon: int
+        Number of years after histend the trend is extended over
+
+    Returns
+    ----------
+    targets: numpy array
+        Target shares by region, technology and year of the horizon
+        (RTI x tech x horizon)
+    """
+
+    end = list(timeline).index(histend) + 1
+    history = shares[:, :, 0, end - trend_years:end]
+
+    # Least squares line through the last historical years
+    x = np.arange(trend_years) - (trend_years - 1) / 2
+    slope = history @ x / (x @ x)
+    level = history.mean(axis=-1)
+    future = np.arange(trend_years, trend_years + horizon) - (trend_years - 1) / 2
+
+    return np.maximum(level[..., np.newaxis] + slope[..., np.newaxis] * future, 0)
+
+
+def calibrate_gamma(model, module, regions=None, candidates=16, iterations=10,
+                    elite=4, spread=10.0, trend_years=5, horizon=5, seed=0,
+                    scenario='S0'):
+    """
+    Search for the gamma values that fit the historical trend of the shares.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the inputs and settings; the module has to be enabled
+    module: str
+        FTT module (e.g. FTT-P)
+    regions: list of str, optional
+        Regions to calibrate (by default all regions)
+    candidates: int
+        Number of candidate gamma vectors solved in each iteration
+    iterations: int
+        Number of iterations
+    elite: int
+        Number of best candidates the next iteration is sampled around
+    spread: float
+        Initial standard deviation of the candidates, in the units of the
+        gamma values
+    trend_years: int
+        Number of historical years the trend is fitted on
+    horizon: int
+        Number of simulated years compared to the trend
+    seed: int
+        Seed of the random candidates
+    scenario: str
+        Scenario with the historical shares and starting gamma values
+
+    Returns
+    ----------
+    gamma: numpy array
+        Calibrated gamma values by region and technology
+    errors: numpy array
+        Sum of squared differences from the trend by region
+    """
+
+    gamma_code = gamma_codes()[module]
+    share_var, histend_var = SHARE_VARIABLES[module]
+    histend = model.histend[histend_var]
+    if histend is None:
+        raise ValueError(f'{histend_var} has no historical end year to calibrate {module} on')
+    if histend not in list(model.timeline):
+        raise ValueError(f'The last historical year of {histend_var} ({histend}) is outside '
+                         f'the timeline {model.timeline[0]}-{model.timeline[-1]}')
+    y_hist = list(model.timeline).index(histend)
+    if y_hist + horizon >= len(model.timeline):
+        raise ValueError(f'A horizon of {horizon} years after {histend} ends after the last '
+                         f'year of the timeline ({model.timeline[-1]})')
+    if not 2 <= trend_years <= y_hist + 1:
+        raise ValueError(f'The trend is fitted on 2 to {y_hist + 1} historical years, '
+                         f'not {trend_years}')
+    base = model.input[scenario]
+
+    # Years solved, up to the end of the horizon. The candidates start from
+    # the state of the last historical year, solved once
+    timeline = model.timeline[:y_hist + horizon + 1]
+    shares, state = solve_history(model, scenario, y_hist + 1, share_var)
+    targets = trend_targets(shares, model.timeline, histend, trend_years, horizon)
+
+    # Regions calibrated (the others keep their gamma values)
+    mask = np.zeros(base[gamma_code].shape[0], dtype=bool)
+    if regions is None:
+        mask[:] = True
+    else:
+        region_index = title_index(model.titles, 'RTI')
+        mask[[region_index[region] for region in regions]] = True
+
+    mean = np.array(base[gamma_code][:, :, 0, y_hist + 1])
+    sd = np.where(mask[:, np.newaxis], spread, 0.0) * np.ones_like(mean)
+    best = mean.copy()
+    best_errors = np.full(mean.shape[0], np.inf)
+
+    rng = np.random.default_rng(seed)
+    for iteration in range(iterations):
+
+        # Candidate gamma vectors of each region (the first is the mean),
+        # set after the historical years
+        trials = mean + sd * rng.standard_normal((candidates,) + mean.shape)
+        trials[0] = mean
+        variants = {}
+        for k, trial in enumerate(trials):
+            inputs = overlay_inputs(base)
+            inputs.own(gamma_code)[:, :, 0, y_hist + 1:] = trial[:, :, np.newaxis]
+            variants[f'{gamma_code} {k}'] = inputs
+
+        output = model.solve_batch(variants, timeline, outputs=[share_var],
+                                   start=(y_hist + 1, state))
+        simulated = np.stack([output[name][share_var][:, :, 0, y_hist + 1:y_hist + horizon + 1]
+                              for name in variants])
+        errors = np.sum((simulated - targets) ** 2, axis=(2, 3))
+        # Candidates that did not solve (NaN shares) are the worst
+        errors[np.isnan(errors)] = np.inf
+
+        # Keep the best candidate of each region so far
+        k_best = np.argmin(errors, axis=0)
+        regions_all = np.arange(mean.shape[0])
+        improved = errors[k_best, regions_all] < best_errors
+        best[improved] = trials[k_best, regions_all][improved]
+        best_errors[improved] = errors[k_best, regions_all][improved]
+
+        # Sample the next candidates around the best of this iteration. The
+        # spread includes the step of the mean, so it does not collapse
+        # while the mean is still moving
+        order = np.argsort(errors, axis=0)[:min(elite, candidates)]
+        elites = trials[order, regions_all]
+        step = elites.mean(axis=0) - mean
+        mean = np.where(mask[:, np.newaxis], mean + step, mean)
+        sd = np.where(mask[:, np.newaxis], np.sqrt(elites.var(axis=0) + step ** 2), 0.0)
+
+        print(f'Iteration {iteration + 1}: mean squared error '
+              f'{np.mean(best_errors[mask]):.4g}')
+
+    return best, best_errors
+
+
+def write_gamma(model, module, gamma, regions=None):
+    """
+    Write calibrated gamma values to the baseline input csv files.
+
+    Each region's gamma values are written to all years of
+    Inputs/S0/<module>/<gamma code>_<region>.csv, as the frontend gamma
+    tool saves them.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the titles and dimensions
+    module: str
+        FTT module (e.g. FTT-P)
+    gamma: numpy array
+        Gamma values by region and technology
+    regions: list of str, optional
+        Regions to write (by default all regions)
+    """
+
+    gamma_code = gamma_codes()[module]
+    techs = model.titles[model.dims[gamma_code][1]]
+    region_index = title_index(model.titles, 'RTI')
+    directory = os.path.join('Inputs', 'S0', module)
+
+    for region in regions or model.titles['RTI']:
+        r = region_index[region]
+        path = os.path.join(directory, f"{gamma_code}_{model.titles['RTI_short'][r]}.csv")
+
+        # Keep the rows and years of an existing file
+        if os.path.isfile(path):
+            gamma_df = pd.read_csv(path, index_col=0)
+            index, columns = gamma_df.index, gamma_df.columns
+        else:
+            index, columns = techs, model.timeline
+        values = np.broadcast_to(np.reshape(gamma[r], (-1, 1)), (len(index), len(columns)))
+
+        pd.DataFrame(values, index=index, columns=columns).to_csv(path)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Calibrate the gamma values of a module')
+    parser.add_argument('module', help='FTT module, e.g. FTT-P')
+    parser.add_argument('--regions', nargs='*', default=None, help='regions to calibrate')
+    parser.add_argument('--candidates', type=int, default=16)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--spread', type=float, default=10.0)
+    parser.add_argument('--horizon', type=int, default=5)
+    parser.add_argument('--dry-run', action='store_true', help='do not write the csv files')
+    args = parser.parse_args()
+
+    model = ModelRun()
+    gamma, errors = calibrate_gamma(model, args.module, args.regions, args.candidates,
+                                    args.iterations, spread=args.spread,
+                                    horizon=args.horizon)
+    if not args.dry_run:
+        write_gamma(model, args.module, gamma, args.regions)
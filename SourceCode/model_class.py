@@ -12,37 +12,111 @@ ModelRun class: main class for operation of model.
 """
 
 # Standard library imports
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import configparser
 import copy
+import importlib
+import os
+import warnings
 
 # Third party imports
 import numpy as np
 from tqdm import tqdm
 
 # Local library imports
-# Separate FTT modules
-import SourceCode.Power.ftt_p_main as ftt_p
-import SourceCode.Transport.ftt_tr_main as ftt_tr
-import SourceCode.Heat.ftt_h_main as ftt_h
-#import SourceCode.Steel.ftt_s_main as ftt_s
-#import SourceCode.Agri.ftt_agri_main as ftt_agri
-import SourceCode.Freight.ftt_fr_main as ftt_fr
-#import SourceCode.Flex.ftt_flex_main as ftt_flex
-#import SourceCode.Hydrogen.ftt_h2_main as ftt_h2
-import SourceCode.Industrial_Heat.ftt_chi_main as ftt_indhe_chi
-import SourceCode.Industrial_Heat.ftt_fbt_main as ftt_indhe_fbt
-import SourceCode.Industrial_Heat.ftt_mtm_main as ftt_indhe_mtm
-import SourceCode.Industrial_Heat.ftt_nmm_main as ftt_indhe_nmm
-import SourceCode.Industrial_Heat.ftt_ois_main as ftt_indhe_ois
-
-
-# Support modules
+# Support modules (the FTT modules are imported when first used, see FTT_MODULES)
 import SourceCode.support.input_functions as in_f
+from SourceCode.support.input_functions import ScenarioOverlay
 import SourceCode.support.titles_functions as titles_f
 import SourceCode.support.dimensions_functions as dims_f
 from SourceCode.support.cross_section import cross_section as cs
+from SourceCode.support.convergence import residual_norms, copy_into
+from SourceCode.support.module_scheduler import dependency_graph, module_mutations, run_modules
+import SourceCode.support.checkpoints as ckpt_f
+import SourceCode.support.result_cache as results_f
+import SourceCode.support.profiling as profiling
+import SourceCode.support.memory_report as memory_f
+from SourceCode.support.input_cache import layout_key
 from SourceCode.initialise_csv_files import initialise_csv_files
 
+class ModuleRegistry(Mapping):
+    """
+    FTT modules by domain, each imported when it is first used.
+
+    Importing a module main file imports its kernels and numba, so only
+    the modules that are solved (enable_modules in settings.ini) are
+    imported.
+
+    Attributes
+    -----------
+    paths: dict of str
+        Import path of the main file of each module, in solve order
+    """
+
+    def __init__(self, paths):
+        """ Instantiate ModuleRegistry with the import paths of the modules. """
+
+        self.paths = paths
+
+    def __getitem__(self, name):
+        return importlib.import_module(self.paths[name])
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+# FTT modules by domain, in solve order
+FTT_MODULES = ModuleRegistry({
+    "FTT-P": "SourceCode.Power.ftt_p_main",
+    "FTT-Tr": "SourceCode.Transport.ftt_tr_main",
+    "FTT-Fr": "SourceCode.Freight.ftt_fr_main",
+    "FTT-H": "SourceCode.Heat.ftt_h_main",
+    #"FTT-S": "SourceCode.Steel.ftt_s_main",
+    #"FTT-Agri": "SourceCode.Agri.ftt_agri_main",
+    #"FTT-Flex": "SourceCode.Flex.ftt_flex_main",
+    #"FTT-H2": "SourceCode.Hydrogen.ftt_h2_main",
+    "FTT-IH-CHI": "SourceCode.Industrial_Heat.ftt_chi_main",
+    "FTT-IH-FBT": "SourceCode.Industrial_Heat.ftt_fbt_main",
+    "FTT-IH-MTM": "SourceCode.Industrial_Heat.ftt_mtm_main",
+    "FTT-IH-NMM": "SourceCode.Industrial_Heat.ftt_nmm_main",
+    "FTT-IH-OIS": "SourceCode.Industrial_Heat.ftt_ois_main",
+})
+
+
+def read_settings(path='settings.ini', overrides=None):
+    """
+    Settings of a model run, read from settings.ini.
+
+    The file is only read: overrides (e.g. from the command line or the
+    frontend) are set on the returned config, so runs with different
+    settings can start at the same time from the same folder.
+
+    Parameters
+    ----------
+    path: str
+        Settings file
+    overrides: dict, optional
+        Values of the [settings] section replacing those of the file
+
+    Returns
+    ----------
+    config: configparser.ConfigParser
+        Settings, the model run ones in the [settings] section
+    """
+
+    config = configparser.ConfigParser()
+    config.read(path)
+    if not config.has_section('settings'):
+        config.add_section('settings')
+    for key, value in (overrides or {}).items():
+        config.set('settings', key, str(value))
+
+    return config
+
 
 class ModelRun:
     """
@@ -99,8 +173,9 @@ class ModelRun:
         Years of the model timeline
     titles: dictionary of lists
         Dictionary containing all title classifications
-    dims: dict of tuples (str, str, str, str)
-        Variable classifications by dimension
+    dims: dict of VariableMeta
+        Variable classifications by dimension, with the domain, history end,
+        forecast start and array shape of each variable
     histend: dict of integers
         Final year of histrorical data by variable
     specs: dictionary of NumPy arrays
@@ -113,47 +188,145 @@ class ModelRun:
         Dictionary containing lag variables
     output: dictionary of NumPy arrays
         Dictionary containing all model variables for output
+    parallel_scenarios: bool
+        Solve scenarios on separate worker processes
+    max_workers: int or None
+        Maximum number of worker processes (None uses all cores)
+    input_cache: bool
+        Read inputs from the binary input cache in Cache/Inputs
+    read_workers: int or None
+        Number of threads reading input csv files (None lets the pool decide)
+    max_iter: int
+        Maximum number of iterations of the modules within a year
+    tolerance: float
+        Largest residual norm at which the iterations have converged
+    residuals: dict of floats
+        Residual norm of each variable in the last iteration of the last
+        year solved (empty after a single iteration)
+    iterations: int
+        Number of iterations done in the last year solved
+    parallel_modules: bool
+        Solve modules that do not share variables concurrently
+    module_workers: int or None
+        Number of threads solving modules (None lets the pool decide)
+    checkpoints: bool
+        Save the variables of every solved year, so the run can resume
+    checkpoint_dir: str
+        Folder with a checkpoint folder for each scenario (by default
+        Checkpoints in output_dir, so runs writing to other output folders
+        never share checkpoints)
+    fork_scenarios: bool
+        Start other scenarios from the solved baseline in the first year
+        their inputs differ from S0
+    fork_years: dict of int
+        Index of the year each scenario forks off the baseline
+    baseline_states: dict of dicts
+        Baseline variables of the year before each fork, by fork year index
+    result_cache: bool
+        Reuse stored results of scenarios with the same inputs, settings
+        and source code
+    result_cache_size: float
+        Largest total size of the stored results in GB; the least recently
+        used are removed above it
+    profile: bool
+        Record the wall time and calls of each module and kernel by
+        scenario and year, see profiling.py
+    profile_records: dict of lists
+        Calls and seconds of each stack of timers in the last run
+    peak_memory: dict of int
+        Peak resident memory (bytes) of the run and of its largest worker
+        process, at the end of the last solve_all
+    output_dir: str
+        Folder of the files written by the run (e.g. the results, profile
+        and checkpoints)
 
 
 
     """
 
-    def __init__(self):
-        """ Instantiate model run object """
+    def __init__(self, config=None):
+        """
+        Instantiate model run object
 
-        # Attributes given in settings.ini file
-        config = configparser.ConfigParser()
-        config.read('settings.ini')
-        self.name = config.get('settings', 'name')
-        self.model_start = int(config.get('settings', 'model_start'))
-        self.model_end = int(config.get('settings', 'model_end'))
-        self.simulation_start = int(config.get('settings', 'simulation_start'))
-        self.simulation_end = int(config.get('settings', 'simulation_end'))
-        self.current = self.model_start
-        self.years = np.arange(self.model_start, self.model_end+1)
-        self.timeline = np.arange(self.simulation_start, self.simulation_end+1)
-        self.ftt_modules = config.get('settings', 'enable_modules')
-        self.scenarios = config.get('settings', 'scenarios')
+        Parameters
+        ----------
+        config: configparser.ConfigParser, optional
+            Settings of the run, see read_settings; by default those of
+            settings.ini
+        """
+
+        # Attributes given in settings.ini file (or the config passed)
+        if config is None:
+            config = read_settings()
+        self.configure(config)
 
         # Load classification titles
         self.titles = titles_f.load_titles()
 
-        # Load variable dimensions
-        self.dims, self.histend, self.domain, self.forstart = dims_f.load_dims()
+        # Load variable dimensions (VariableMeta records with the array shapes)
+        self.dims, self.histend, self.domain, self.forstart = \
+            dims_f.load_dims(self.titles, self.timeline)
         
         # Set up csv files if they do not exist yet
         initialise_csv_files(self.ftt_modules, self.scenarios)
         
-        # Retrieve inputs
+        # Retrieve inputs (only variables of the enabled modules are loaded)
         self.input = in_f.load_data(self.titles, self.dims, self.timeline,
                                     self.scenarios, self.ftt_modules,
-                                    self.forstart)
+                                    self.forstart, self.domain,
+                                    cache=self.input_cache,
+                                    read_workers=self.read_workers)
 
 
         # Initialize remaining attributes
         self.variables = {}
         self.lags = {}
         self.output = {}
+        self.residuals = {}
+        self.iterations = 0
+        self.profile_records = {}
+        self.peak_memory = {}
+        self.fork_years = {}
+        self.baseline_states = {}
+
+    def configure(self, config):
+        """
+        Set the attributes given in the settings of the run.
+
+        Parameters
+        ----------
+        config: configparser.ConfigParser
+            Settings of the run, see read_settings
+        """
+
+        self.name = config.get('settings', 'name')
+        self.model_start = int(config.get('settings', 'model_start'))
+        self.model_end = int(config.get('settings', 'model_end'))
+        self.simulation_start = int(config.get('settings', 'simulation_start'))
+        self.simulation_end = int(config.get('settings', 'simulation_end'))
+        self.current = self.model_start
+        self.years = np.arange(self.model_start, self.model_end+1)
+        self.timeline = np.arange(self.simulation_start, self.simulation_end+1)
+        self.ftt_modules = config.get('settings', 'enable_modules')
+        self.scenarios = config.get('settings', 'scenarios')
+        self.parallel_scenarios = config.getboolean('settings', 'parallel_scenarios',
+                                                    fallback=False)
+        self.max_workers = config.getint('settings', 'max_workers', fallback=0) or None
+        self.input_cache = config.getboolean('settings', 'input_cache', fallback=False)
+        self.read_workers = config.getint('settings', 'read_workers', fallback=0) or None
+        self.max_iter = config.getint('settings', 'max_iter', fallback=1)
+        self.tolerance = config.getfloat('settings', 'tolerance', fallback=1e-6)
+        self.parallel_modules = config.getboolean('settings', 'parallel_modules',
+                                                  fallback=False)
+        self.module_workers = config.getint('settings', 'module_workers', fallback=0) or None
+        self.checkpoints = config.getboolean('settings', 'checkpoints', fallback=False)
+        self.fork_scenarios = config.getboolean('settings', 'fork_scenarios', fallback=False)
+        self.result_cache = config.getboolean('settings', 'result_cache', fallback=False)
+        self.result_cache_size = config.getfloat('settings', 'result_cache_size', fallback=10)
+        self.profile = config.getboolean('settings', 'profile', fallback=False)
+        self.output_dir = config.get('settings', 'output_dir', fallback='Output')
+        self.checkpoint_dir = config.get('settings', 'checkpoint_dir',
+                                         fallback=os.path.join(self.output_dir, 'Checkpoints'))
 
 
     def run(self):
@@ -162,53 +335,444 @@ class ModelRun:
         # Run the solve all method (self.input contains all results)
         self.solve_all()
 
-    def solve_all(self):
+    def resume(self):
+        """ Solve model run, resuming each scenario after its last checkpoint """
+
+        self.solve_all(resume=True)
+
+    def solve_all(self, resume=False):
         """ Solve model for each year of the simulation period """
 
         # Define output container
-        self.output = {scen: {var: np.full_like(self.input[scen][var], 0) \
-                              for var in self.input[scen]} for scen in self.input}
-        # self.output = copy.deepcopy(self.input)
+        self.output = {}
+
+        if self.profile:
+            profiling.collect()
+            profiling.enable()
 
         # Clear any previous instances of the progress bar
         try:
             tqdm._instances.clear()
         except AttributeError:
             pass
-        for scen in self.input:
 
-            # Create progress bar:
-            with tqdm(self.timeline) as pbar:
+        # Solve the baseline first, keeping its state where the others fork off
+        scenarios = list(self.input)
+        self.fork_years = {}
+        self.baseline_states = {}
+        if self.fork_scenarios and 'S0' in self.input and len(scenarios) > 1:
+            self.fork_years = {scen: self.divergence_year(scen)
+                               for scen in scenarios if scen != 'S0'}
+
+        # Take the scenarios solved before with the same inputs from the cache
+        keys = self.result_keys() if self.result_cache else {}
+        for scen in keys:
+            result = self.cached_result(scen, keys[scen])
+            if result is not None:
+                self.output[scen] = result
+        cached = set(self.output)
+        self.fork_years = {scen: fork for scen, fork in self.fork_years.items()
+                           if scen not in cached}
+        scenarios = [scen for scen in scenarios if scen not in cached]
+
+        # The baseline is solved even if cached when a scenario forks from it
+        if self.fork_years and ('S0' in scenarios or any(self.fork_years.values())):
+            cached.discard('S0')
+            self.solve_scenario('S0', resume=resume)
+            if 'S0' in scenarios:
+                scenarios.remove('S0')
+
+        if self.parallel_scenarios and len(scenarios) > 1:
+            self.solve_parallel(resume, scenarios)
+        else:
+            for scen in scenarios:
+                self.solve_scenario(scen, resume=resume)
+
+        # Forked scenarios share the baseline output before the fork
+        for scen, fork in self.fork_years.items():
+            for var, value in self.output[scen].items():
+                if fork > 1 and self.dims[var].has_time:
+                    value[:, :, :, :fork - 1] = self.output['S0'][var][:, :, :, :fork - 1]
+
+        # Keep the scenario order of the inputs
+        self.output = {scen: self.output[scen] for scen in self.input}
+
+        # Store the results of the scenarios solved
+        for scen in keys:
+            if scen not in cached:
+                results_f.store_result(keys[scen], self.output[scen])
+        if keys:
+            results_f.prune_results(int(self.result_cache_size * 1024**3))
+
+        # Export where the time went
+        if self.profile:
+            profiling.disable()
+            self.profile_records = profiling.collect()
+            os.makedirs(self.output_dir, exist_ok=True)
+            profiling.records_to_json(self.profile_records,
+                                      os.path.join(self.output_dir, 'Profile.json'))
+            profiling.records_to_folded(self.profile_records,
+                                        os.path.join(self.output_dir, 'Profile.folded'))
+
+        self.peak_memory = {'peak_rss': memory_f.peak_rss(),
+                            'peak_rss_workers': memory_f.peak_rss_workers()}
+
+    def memory_report(self):
+        """
+        Memory used by the inputs, outputs, variables and lags of the run.
+
+        Arrays that share memory with an array counted before (in the order
+        inputs, outputs, variables, lags) count zero bytes, so the S0 arrays
+        a scenario overlay reads, or the inputs a cross section views, are
+        counted once. See memory_report.format_report for a text version.
+
+        Returns
+        ----------
+        report: dict
+            Bytes by variable, domain and in total ('variables', 'domains',
+            'total') of each scenario's inputs and outputs ('input',
+            'output'), of the variables and lags of the last year solved
+            ('variables', 'lags'), and the peak resident memory of the
+            last solve_all ('peak_rss', 'peak_rss_workers')
+        """
+
+        seen = set()
+        report = {}
+        for container in ('input', 'output'):
+            report[container] = {
+                scen: memory_f.summarise(memory_f.variable_bytes(data, seen), self.domain)
+                for scen, data in getattr(self, container).items()}
+        for container in ('variables', 'lags'):
+            report[container] = memory_f.summarise(
+                memory_f.variable_bytes(getattr(self, container), seen), self.domain)
+        report.update(self.peak_memory)
+
+        return report
+
+    def result_keys(self):
+        """ Key of the stored result of each scenario, see result_cache.py """
+
+        # Settings that change the solution
+        settings = {
+            'timeline': [int(year) for year in self.timeline],
+            'modules': self.ftt_modules,
+            'max_iter': self.max_iter,
+            'tolerance': self.tolerance,
+            'layout': layout_key(self.titles, self.dims, self.timeline, self.forstart),
+            'histend': {var: None if year is None else int(year)
+                        for var, year in self.histend.items()},
+            'titles': {name: [str(title) for title in values]
+                       for name, values in self.titles.items()}
+        }
+
+        base = self.input.get('S0')
+        base_hashes = results_f.input_hashes(base) if base is not None else None
+
+        keys = {}
+        for scen in self.input:
+            if scen == 'S0':
+                hashes = base_hashes
+            else:
+                hashes = results_f.input_hashes(self.input[scen], base, base_hashes)
+            keys[scen] = results_f.result_key(hashes, settings)
+
+        return keys
+
+    def cached_result(self, scen, key):
+        """ Stored result of a scenario with all its variables, or None, see result_keys """
+
+        result = results_f.load_result(key)
+        if result is not None and set(result) == set(self.input[scen]):
+            return result
+        return None
+
+    def divergence_year(self, scen):
+        """
+        Index of the first year in which the inputs of a scenario differ from S0.
+
+        Years are solved from their own input slice and the previous year,
+        so up to this year the scenario has the same solution as S0. Inputs
+        without a time dimension that differ make the scenario diverge from
+        the first year.
+        """
+
+        base = self.input['S0']
+        inputs = self.input[scen]
+
+        # Overlays only hold the variables they override
+        if isinstance(inputs, ScenarioOverlay):
+            variables = list(inputs.overrides)
+        else:
+            variables = list(inputs)
+
+        fork = len(self.timeline)
+        for var in variables:
+            value = inputs[var]
+            if var not in base or base[var].shape != value.shape:
+                return 0
+            if not self.dims[var].has_time:
+                if not np.array_equal(value, base[var]):
+                    return 0
+                continue
+
+            differs = np.any(value != base[var], axis=(0, 1, 2))
+            if differs.any():
+                fork = min(fork, int(np.argmax(differs)))
+
+        return fork
+
+    def solve_scenario(self, scen, progress=True, resume=False, outputs=None):
+        """
+        Solve model for each year of the simulation period for one scenario.
+
+        With resume, the years saved in the scenario's checkpoints are read
+        back instead of solved, and the run continues from the year after.
+        Only the variables in outputs are kept, if given. progress shows a
+        progress bar, or if it is a function, is called with each year
+        once it is solved.
+        """
+
+        # Define output container for the scenario
+        if outputs is None:
+            outputs = self.input[scen]
+        self.output[scen] = {var: np.full_like(self.input[scen][var], 0) \
+                             for var in outputs if var in self.input[scen]}
+        output = self.output[scen]
+
+        # Position of each variable's year in the output
+        has_time = {var: self.dims[var].has_time for var in self.output[scen]}
+
+        # Years after which other scenarios fork off this one
+        fork_states = set(self.fork_years.values()) if scen == 'S0' else set()
+
+        def populate(y):
+            # (dict.items reads a CrossSection without copying)
+            for var, value in dict.items(self.variables):
+                if var in output:
+                    output[var][:, :, :, y if has_time[var] else 0] = value
+
+            # Keep the state other scenarios start from
+            if y + 1 in fork_states:
+                self.baseline_states[y + 1] = copy_into(None, self.variables)
+
+        # Checkpoints hold the variables the modules write; the others are
+        # the inputs of the year
+        checkpoint_dir = os.path.join(self.checkpoint_dir, scen)
+        if resume or self.checkpoints:
+            info = ckpt_f.run_info(self.timeline, self.ftt_modules, self.max_iter,
+                                   self.tolerance, results_f.input_hashes(self.input[scen]))
+            written = set().union(*self.module_schedule()[1].values())
+
+        # Rebuild the output and lags of the years already solved
+        start = 0
+        self.variables = {}
+        if resume:
+            for y, year in enumerate(ckpt_f.completed_years(checkpoint_dir, info)):
+                self.lags = self.variables
+                self.variables = cs(self.input, self.dims, year, y, scen, copy_on_write=True,
+                                    writable=self.mutable_variables())
+                for var, value in ckpt_f.load_checkpoint(checkpoint_dir, year).items():
+                    self.variables[var] = value
+                populate(y)
+                start = y + 1
+        if self.checkpoints and start == 0:
+            ckpt_f.start_checkpoints(checkpoint_dir, info)
+
+        # Continue from the baseline's state in the year before the fork
+        fork = self.fork_years.get(scen, 0)
+        if start == 0 and fork > 0:
+            self.variables = copy_into(None, self.baseline_states[fork])
+            populate(fork - 1)
+            start = fork
+
+        # Create progress bar:
+        report = progress if callable(progress) else None
+        with tqdm(self.timeline, disable=not progress or report is not None,
+                  initial=start) as pbar:
 
             # Call solve_year method for each year of the simulation period
-#                for year_index, year in enumerate(self.timeline):
-                for y, year in enumerate(self.timeline):
-                    # Set the description to be the current year
-                    pbar.set_description(f'Running Scenario: {scen} - Solving year: {year}')
+            for y, year in enumerate(self.timeline):
+                if y < start:
+                    continue
 
+                # Set the description to be the current year
+                pbar.set_description(f'Running Scenario: {scen} - Solving year: {year}')
+
+                with profiling.timer(scen), profiling.timer(year):
                     self.variables, self.lags = self.solve_year(year, y, scen)
 
-                    # Increment the progress bar by one step
-                    pbar.update(1)
+                # Increment the progress bar by one step
+                pbar.update(1)
+                if report is not None:
+                    report(year)
+
+                # Populate output container
+                populate(y)
 
-                    # Populate output container
-                    for var in self.variables:
-                        if 'TIME' in self.dims[var]:
-                            self.output[scen][var][:, :, :, y] = self.variables[var]
-                        else:
-                            self.output[scen][var][:, :, :, 0] = self.variables[var]
+                # Save the year, so a failure later on can resume from here
+                if self.checkpoints:
+                    saved = written | {var for var in self.variables if var not in self.input[scen]}
+                    ckpt_f.save_checkpoint(checkpoint_dir, year, self.variables, saved)
 
             # Set the progress bar to say it's complete
             pbar.set_description(f"Model run {self.name} finished")
 
-    def solve_year(self, year, y, scenario, max_iter=1):
-        """ Solve model for a specific year """
+        return self.output[scen]
+
+    def solve_parallel(self, resume=False, scenarios=None, outputs=None):
+        """ Solve each scenario on a separate worker process, see solve_scenario """
+
+        if scenarios is None:
+            scenarios = list(self.input)
+
+        max_workers = min(self.max_workers or os.cpu_count(), len(scenarios))
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_solve_scenario_worker,
+                                       self.scenario_run(scen), scen, resume, outputs): scen
+                       for scen in scenarios}
+
+            # Collect the output of each worker as it finishes
+            results = {}
+            with tqdm(total=len(futures)) as pbar:
+                for future in as_completed(futures):
+                    scen = futures[future]
+                    results[scen], records = future.result()
+                    profiling.merge(records)
+                    pbar.set_description(f'Finished Scenario: {scen}')
+                    pbar.update(1)
+
+            pbar.set_description(f"Model run {self.name} finished")
+
+        # Merge back into the output container in scenario order
+        self.output.update({scen: results[scen] for scen in scenarios})
+
+    def solve_batch(self, inputs, timeline=None, outputs=None, start=None):
+        """
+        Solve a batch of input variants, e.g. with perturbed parameters.
+
+        The variants are solved one after another, or on worker processes
+        with parallel_scenarios. They are not checkpointed or stored in the
+        result cache. Variants that only differ from a solved scenario from
+        some year on can start from its state in the year before.
+
+        Parameters
+        ----------
+        inputs: dictionary of dicts
+            Inputs of each variant (e.g. ScenarioOverlays on a scenario)
+        timeline: list of int, optional
+            Years to solve, from the start of the timeline
+        outputs: list of str, optional
+            Variables kept of each variant (by default all, which for a
+            large batch takes the size of the inputs for every variant)
+        start: tuple (int, dict), optional
+            Index of the first year solved, and the variables of the year
+            before it all variants start from (the output of the earlier
+            years is left at zero, but for the year before)
+
+        Returns
+        ----------
+        output: dictionary of dicts
+            Output of each variant
+        """
+
+        run = copy.copy(self)
+        run.input = inputs
+        run.variables = {}
+        run.lags = {}
+        run.output = {}
+        run.checkpoints = False
+        run.fork_years = {}
+        run.baseline_states = {}
+        if timeline is not None:
+            run.timeline = timeline
+        if start is not None:
+            run.fork_years = {scen: start[0] for scen in inputs}
+            run.baseline_states = {start[0]: start[1]}
+
+        if self.parallel_scenarios and len(inputs) > 1:
+            run.solve_parallel(outputs=outputs)
+        else:
+            for scen in inputs:
+                run.solve_scenario(scen, progress=False, outputs=outputs)
+
+        return run.output
+
+    def scenario_run(self, scen):
+        """ Shallow copy of the run holding only the inputs of one scenario """
+
+        run = copy.copy(self)
+        run.input = {scen: self.input[scen]}
+        run.variables = {}
+        run.lags = {}
+        run.output = {}
+
+        # Only the baseline state the scenario forks from
+        fork = getattr(self, 'fork_years', {}).get(scen, 0)
+        run.baseline_states = {fork: self.baseline_states[fork]} if fork > 0 else {}
+
+        return run
+
+    def enabled_modules(self):
+        """ FTT modules enabled in settings.ini, in solve order """
+
+        return {name: FTT_MODULES[name] for name in FTT_MODULES if name in self.ftt_modules}
+
+    def module_schedule(self):
+        """ Dependency graph and written variables of the enabled modules """
 
-        # Need to add a convergence check here in the future
+        modules = [(name, FTT_MODULES.paths[name]) for name in self.enabled_modules()]
+        if getattr(self, '_schedule', (None,))[0] != modules:
+            self._schedule = (modules, dependency_graph(modules, self.domain))
+
+        return self._schedule[1]
+
+    def mutable_variables(self):
+        """ Variables the enabled modules may change in place """
+
+        modules = [FTT_MODULES.paths[name] for name in self.enabled_modules()]
+        if getattr(self, '_mutable', (None,))[0] != modules:
+            mutable = set()
+            for module in modules:
+                mutable |= module_mutations(module, self.domain)
+            self._mutable = (modules, frozenset(mutable))
+
+        return self._mutable[1]
+
+    def module_solver(self, name, module, time_lags, iter_lags, year):
+        """ Function solving a module for a year, taking the variables """
+
+        # Modules solved on other threads are timed under this thread's timers
+        stack = profiling.current_stack()
+
+        def solve(variables):
+            with profiling.timer(name, stack):
+                return module.solve(variables, time_lags, iter_lags,
+                                    self.titles, self.histend, year, self.domain)
+
+        return solve
+
+    def solve_year(self, year, y, scenario, max_iter=None):
+        """
+        Solve model for a specific year.
+
+        The modules are solved up to max_iter times. From the second
+        iteration on, each iteration lags on the variables of the previous
+        one, and the loop stops once the residual norm of every variable is
+        within the tolerance.
+        """
+
+        if max_iter is None:
+            max_iter = self.max_iter
 
         # Run update
         variables, time_lags = self.update(year, y, scenario)
-        iter_lags = copy.deepcopy(time_lags)
+
+        # The first iteration lags on the previous year, later iterations on
+        # a buffer holding the previous iteration (reused between iterations)
+        iter_lags = time_lags
+        iter_buffer = None
+        self.residuals = {}
 
         # Define whole period
         tl = self.timeline
@@ -219,57 +783,44 @@ class ModelRun:
         # Iteration loop here
         for itereration in range(max_iter):
 
-            if "FTT-P" in self.ftt_modules:
-                variables = ftt_p.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-            if "FTT-Tr" in self.ftt_modules:
-                variables = ftt_tr.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-            if "FTT-Fr" in self.ftt_modules:
-                variables = ftt_fr.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-            if "FTT-H" in self.ftt_modules:
-                variables = ftt_h.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
+            self.iterations = itereration + 1
+
             if "FTT-S" in self.ftt_modules:
                 print("Module needs to be created")
-            if "FTT-IH-CHI" in self.ftt_modules:
-                variables = ftt_indhe_chi.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-                
-            if "FTT-IH-FBT" in self.ftt_modules:
-                variables = ftt_indhe_fbt.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-                
-            if "FTT-IH-MTM" in self.ftt_modules:
-                variables = ftt_indhe_mtm.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-                
-            if "FTT-IH-NMM" in self.ftt_modules:
-                variables = ftt_indhe_nmm.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-                
-            if "FTT-IH-OIS" in self.ftt_modules:
-                variables = ftt_indhe_ois.solve(variables, time_lags, iter_lags,
-                                        self.titles, self.histend, tl[y],
-                                        self.domain)
-                
+
+            # Solve the enabled modules, independent ones concurrently
+            solvers = {name: self.module_solver(name, module, time_lags, iter_lags, tl[y])
+                       for name, module in self.enabled_modules().items()}
+            if self.parallel_modules and len(solvers) > 1:
+                graph, writes = self.module_schedule()
+                variables = run_modules(solvers, graph, writes, variables,
+                                        self.module_workers)
+            else:
+                for solve in solvers.values():
+                    variables = solve(variables)
+
             if not any(True for x in modules_list if x in self.ftt_modules):
                 print("Incorrect selection of modules. Check settings.ini")
 
             # Third, solve energy supply
+            # Check convergence against the previous iteration
+            if itereration > 0:
+                self.residuals = residual_norms(variables, iter_lags)
+                if all(res <= self.tolerance for res in self.residuals.values()):
+                    break
+
             # Overwrite iter_lags to be used in the next iteration round
-            iter_lags = copy.deepcopy(variables)
-#        # Print any diagnstics
-#
+            if itereration < max_iter - 1:
+                iter_buffer = copy_into(iter_buffer, variables)
+                iter_lags = iter_buffer
+
+        else:
+            # Print any diagnostics
+            if max_iter > 1:
+                worst = max(self.residuals, key=lambda var: np.nan_to_num(self.residuals[var], nan=np.inf))
+                warnings.warn(f'{scenario} {year}: not converged after {max_iter} iterations '
+                              f'(largest residual {self.residuals[worst]:.3g} for {worst})')
+
         return variables, time_lags
 
     def update(self, year, y, scenario):
@@ -283,13 +834,31 @@ class ModelRun:
 
         # Read required variables from the cross section
         # This is how E3ME solves a number of variables, return to this
-        data_to_model = cs(self.input, self.dims, year, y, scenario)
+        # Variables are views of the inputs, copied when a module first uses
+        # one it may change in place
+        writable = self.mutable_variables()
+        data_to_model = cs(self.input, self.dims, year, y, scenario,
+                           copy_on_write=True, writable=writable)
 
         # LB TODO: to improve the treatment of lags to include also historical data
         if y == 0: # If year is the first year, lags equal variables in starting year
-            lags = cs(self.input, self.dims, year, y, scenario)
+            lags = cs(self.input, self.dims, year, y, scenario,
+                      copy_on_write=True, writable=writable)
         else:
             #lags = cs(self.variables, self.dims, year-1)
             lags = self.variables
 
         return data_to_model, lags
+
+
+def _solve_scenario_worker(run, scen, resume=False, outputs=None):
+    """ Solve a single scenario on a worker process, returning its output and timers """
+
+    # Drop timers inherited from the parent process
+    profiling.collect()
+    if run.profile:
+        profiling.enable()
+
+    output = run.solve_scenario(scen, progress=False, resume=resume, outputs=outputs)
+
+    return output, profiling.collect()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+monte_carlo.py
+=========================================
+Monte Carlo uncertainty analysis over the technology cost distributions.
+
+The cost inputs of the FTT modules (BCET, BTTC, BHTC, ZCET and the BIC
+variables of industrial heat) give a mean and standard deviation for each
+cost component of each technology. Each draw samples the mean columns
+from these normal distributions, and the draws are solved on a process
+pool. Only summary statistics (mean, standard deviation and percentiles
+per variable, region, technology and year) of the requested outputs are
+kept; the output of a draw is discarded once it is added to the summary.
+
+Run from the command line as
+    python -m SourceCode.monte_carlo <draws> <output variables>
+
+Functions included:
+    - sample_costs
+        Sample the cost inputs of one draw
+    - run_monte_carlo
+        Solve a number of draws and summarise their outputs
+
+"""
+
+# Standard library imports
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import pickle
+
+# Third party imports
+import numpy as np
+from tqdm import tqdm
+
+# Local library imports
+from SourceCode.model_class import ModelRun
+from SourceCode.support.input_functions import overlay_inputs
+from SourceCode.support.titles_functions import title_index
+from SourceCode.support.streaming_stats import RunningSummary
+
+
+# Cost variables of each module: classification of the cost components, and
+# the (mean, standard deviation) columns of each component
+_INDUSTRIAL_HEAT = ('CTTI', [('1 Investment cost mean (MEuro per MW)', '2 Investment cost SD'),
+                             ('3 O&M cost mean (Euros/MJ/s/year)', '4 O&M cost SD'),
+                             ('10 Fuel cost mean', '11 Fuel cost SD')])
+COST_DISTRIBUTIONS = {
+    'FTT-P': {'BCET': ('C2TI', [('3 Investment ($/kW)', '4 std ($/MWh)'),
+                                ('5 Fuel ($/MWh)', '6 std ($/MWh)'),
+                                ('7 O&M ($/MWh)', '8 std ($/MWh)')])},
+    'FTT-Tr': {'BTTC': ('C3TI', [('1 Prices cars (USD/veh)', '2 Std of price'),
+                                 ('3 fuel cost (USD/km)', '4 std fuel cost'),
+                                 ('5 O&M costs (USD/km)', '6 std O&M')])},
+    'FTT-Fr': {'ZCET': ('C6TI', [('1 Price of vehicles (USD/vehicle)', '2 Std of price  (USD/vehicle)'),
+                                 ('3 fuel cost (USD/km)', '4 std fuel cost (USD/km)'),
+                                 ('5 O&M costs (USD/km)', '6 std O&M  (USD/km)')])},
+    'FTT-H': {'BHTC': ('C4TI', [('1 Inv cost mean (EUR/Kw)', '2 Inv Cost SD'),
+                                ('3 O&M mean (EUR/kW)', '4 O&M SD'),
+                                ('10 Fuel cost  (EUR/kWh)', '11 Fuel cost SD')])},
+    'FTT-IH-CHI': {'BIC1': _INDUSTRIAL_HEAT},
+    'FTT-IH-FBT': {'BIC2': _INDUSTRIAL_HEAT},
+    'FTT-IH-MTM': {'BIC3': _INDUSTRIAL_HEAT},
+    'FTT-IH-NMM': {'BIC4': _INDUSTRIAL_HEAT},
+    'FTT-IH-OIS': {'BIC5': _INDUSTRIAL_HEAT},
+}
+
+
+def sample_costs(inputs, titles, ftt_modules, rng):
+    """
+    Sample the cost inputs of one draw.
+
+    Each cost component of each technology gets one standard normal draw,
+    shared by all regions, so a technology is cheaper or dearer everywhere
+    at once. The mean column is set to mean + z * sd, floored at zero.
+
+    Parameters
+    ----------
+    inputs: ScenarioOverlay
+        Inputs of the draw; the cost variables are overridden in place
+    titles: dictionary of lists
+        Dictionary containing all title classifications
+    ftt_modules: str
+        Enabled modules (as in settings.ini)
+    rng: numpy.random.Generator
+        Random number generator of the draw
+
+    Returns
+    ----------
+    z: dictionary of numpy arrays
+        Standard normal draw of each cost variable (technology x component)
+    """
+
+    z = {}
+    for module, variables in COST_DISTRIBUTIONS.items():
+        if module not in ftt_modules:
+            continue
+        for var, (classification, columns) in variables.items():
+            if var not in inputs:
+                continue
+            index = title_index(titles, classification)
+            costs = inputs.own(var)
+            z[var] = rng.standard_normal((costs.shape[1], len(columns)))
+            for c, (mean, sd) in enumerate(columns):
+                sampled = (costs[:, :, index[mean]]
+                           + z[var][np.newaxis, :, c, np.newaxis] * costs[:, :, index[sd]])
+                costs[:, :, index[mean]] = np.maximum(sampled, 0)
+
+    return z
+
+
+# Model run of the worker process, set once by _init_worker
+_worker_run = None
+
+
+def _init_worker(run):
+    global _worker_run
+    _worker_run = run
+
+
+def _solve_draw(draw, seed, scenario, outputs):
+    """ Solve one draw on a worker process and return the requested outputs """
+
+    run = _worker_run.scenario_run(scenario)
+    run.checkpoints = False
+    run.fork_years = {}
+    run.baseline_states = {}
+
+    # Override only the cost variables, the other inputs stay shared
+    inputs = overlay_inputs(_worker_run.input[scenario])
+    run.input = {scenario: inputs}
+
+    sample_costs(inputs, run.titles, run.ftt_modules, np.random.default_rng([seed, draw]))
+    output = run.solve_scenario(scenario, progress=False, outputs=outputs)
+
+    return {var: output[var] for var in outputs}
+
+
+def run_monte_carlo(model, n_draws, outputs=('MEWS',), percentiles=(5, 50, 95),
+                    seed=0, scenario='S0', max_workers=None):
+    """
+    Solve a number of draws and summarise their outputs.
+
+    Draws are solved on a process pool, and each output is added to the
+    summary as soon as its draw finishes. Draw i is seeded with (seed, i),
+    so the result does not depend on the number of workers (up to the
+    order the percentile estimates see the draws in).
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the inputs and settings of the draws
+    n_draws: int
+        Number of draws
+    outputs: tuple of str
+        Variables to summarise
+    percentiles: tuple of float
+        Percentiles to estimate (between 0 and 100)
+    seed: int
+        Seed of the random draws
+    scenario: str
+        Scenario the costs are sampled around
+    max_workers: int, optional
+        Number of worker processes (None uses the model's max_workers)
+
+    Returns
+    ----------
+    summary: dictionary of dicts
+        'mean', 'std' and 'p<percentile>' arrays of each output variable,
+        with the shape of the variable
+    """
+
+    max_workers = min(max_workers or model.max_workers or os.cpu_count(), n_draws)
+
+    # Only the inputs of the scenario are sent to the workers
+    base_run = model.scenario_run(scenario)
+    summaries = {var: RunningSummary(model.input[scenario][var].shape, percentiles)
+                 for var in outputs}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(base_run,)) as executor:
+
+        # Keep a few draws queued per worker, so finished outputs do not pile up
+        draws = iter(range(n_draws))
+        running = set()
+        with tqdm(total=n_draws) as pbar:
+            pbar.set_description(f'Monte Carlo run {model.name}')
+            while True:
+                for draw in draws:
+                    running.add(executor.submit(_solve_draw, draw, seed, scenario, outputs))
+                    if len(running) >= 2 * max_workers:
+                        break
+                if not running:
+                    break
+
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    for var in outputs:
+                        summaries[var].add(result[var])
+                    pbar.update(1)
+
+    return {var: summaries[var].result() for var in outputs}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Monte Carlo run over the technology costs')
+    parser.add_argument('draws', type=int, help='number of draws')
+    parser.add_argument('outputs', nargs='*', default=['MEWS'], help='variables to summarise')
+    parser.add_argument('--percentiles', type=float, nargs='*', default=[5, 50, 95])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', default='S0')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    model = ModelRun()
+    summary = run_monte_carlo(model, args.draws, tuple(args.outputs), args.percentiles,
+                              args.seed, args.scenario, args.workers)
+
+    # Save the summary next to the model results
+    os.makedirs(model.output_dir, exist_ok=True)
+    with open(os.path.join(model.output_dir, f'MonteCarlo_{args.scenario}.pickle'), 'wb') as f:
+        pickle.dump(summary, f)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+sensitivity.py
+=========================================
+One-at-a-time local sensitivity analysis of the model inputs.
+
+Each parameter (e.g. the gamma value of one technology, or a cost column
+of BCET) is perturbed by +delta and -delta from a start year on, and the
+sensitivity of the chosen outputs is the central difference
+    (output(+delta) - output(-delta)) / (2 * step)
+per region, technology and year. The years before the start year are the
+same in all perturbations, so they are solved once and every perturbation
+starts from the solved state of the year before (as in the gamma
+calibration). By default the start year is the first year an enabled
+module simulates: before it the shares of all modules are historical, so
+perturbing the gamma values there changes nothing. The
+perturbations are solved in batches of scenarios (see
+ModelRun.solve_batch) on a process pool, or one after another. Only the
+outputs asked for are kept from each batch.
+
+Run from the command line as
+    python -m SourceCode.sensitivity <module> <output variables>
+to get the sensitivity to the gamma values of a module.
+
+Functions included:
+    - gamma_parameters
+        Gamma value of each technology of a module
+    - cost_parameters
+        Cost columns of each technology
+    - simulation_start
+        First year an enabled module simulates
+    - run_sensitivity
+        Sensitivity of the outputs to each parameter
+
+"""
+
+# Standard library imports
+import argparse
+import copy
+import os
+import pickle
+
+# Third party imports
+import numpy as np
+
+# Local library imports
+from SourceCode.gamma_calibration import SHARE_VARIABLES, solve_history
+from SourceCode.model_class import ModelRun
+from SourceCode.support.input_functions import overlay_inputs
+from SourceCode.support.titles_functions import gamma_codes, title_index
+
+
+def gamma_parameters(model, module, regions=None):
+    """
+    Gamma value of each technology of a module, in all years.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the titles and dimensions
+    module: str
+        FTT module (e.g. FTT-P)
+    regions: list of str, optional
+        Regions with a parameter of their own. By default each technology
+        is perturbed in all regions at once; as regions only interact
+        through learning, the sensitivity of a region's outputs is then
+        close to the sensitivity to its own gamma value.
+
+    Returns
+    ----------
+    parameters: list of tuples (str, str, tuple)
+        Label, variable and index of each parameter
+    """
+
+    gamma_code = gamma_codes()[module]
+    techs = model.titles[model.dims[gamma_code][1]]
+
+    if regions is None:
+        return [(f'{gamma_code} {tech}', gamma_code, (slice(None), t))
+                for t, tech in enumerate(techs)]
+
+    region_index = title_index(model.titles, 'RTI')
+    return [(f'{gamma_code} {region} {tech}', gamma_code, (region_index[region], t))
+            for region in regions for t, tech in enumerate(techs)]
+
+
+def cost_parameters(model, var, columns):
+    """
+    Cost columns of each technology (in all regions), e.g. of BCET.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the titles and dimensions
+    var: str
+        Cost variable
+    columns: list of str
+        Titles of the cost columns (e.g. '3 Investment ($/kW)')
+
+    Returns
+    ----------
+    parameters: list of tuples (str, str, tuple)
+        Label, variable and index of each parameter
+    """
+
+    techs = model.titles[model.dims[var][1]]
+    column_index = title_index(model.titles, model.dims[var][2])
+
+    return [(f'{var} {tech} {column}', var, (slice(None), t, column_index[column]))
+            for column in columns for t, tech in enumerate(techs)]
+
+
+def simulation_start(model):
+    """ First year an enabled module simulates (after its historical shares) """
+
+    years = [model.histend[SHARE_VARIABLES[name][1]] for name in model.enabled_modules()]
+    years = [year for year in years if year is not None]
+
+    return min(years) + 1 if years else model.timeline[0]
+
+
+def run_sensitivity(model, parameters, outputs=('MEWS',), delta=0.01, relative=False,
+                    scenario='S0', batch_size=16, start_year=None, parallel=True):
+    """
+    Sensitivity of the outputs to each parameter.
+
+    Parameters
+    ----------
+    model: ModelRun
+        Model run with the inputs and settings
+    parameters: list of tuples (str, str, tuple)
+        Label, variable and index of each parameter, see gamma_parameters
+        and cost_parameters
+    outputs: tuple of str
+        Variables of which the sensitivity is reported
+    delta: float
+        Perturbation of the parameters
+    relative: bool
+        Perturb by delta times the largest absolute value of the parameter,
+        instead of by delta
+    scenario: str
+        Scenario the parameters are perturbed around
+    batch_size: int
+        Number of parameters solved together (each gives two scenarios)
+    start_year: int, optional
+        First year the parameters are perturbed in (for parameters without
+        a time dimension, the first year solved with the perturbation); by
+        default the first year an enabled module simulates
+    parallel: bool
+        Solve each batch on a process pool (see ModelRun.solve_parallel)
+
+    Returns
+    ----------
+    sensitivity: dictionary of numpy arrays
+        Derivative of each output variable with respect to each parameter,
+        with the parameters along the first axis (in the order given); zero
+        before start_year
+    """
+
+    base = model.input[scenario]
+    sensitivity = {var: np.zeros((len(parameters),) + base[var].shape) for var in outputs}
+
+    run = copy.copy(model)
+    run.parallel_scenarios = parallel
+
+    # Solve the years before the perturbations once
+    if start_year is None:
+        start_year = simulation_start(model)
+    if start_year not in list(model.timeline):
+        raise ValueError(f'The start year {start_year} is outside the timeline '
+                         f'{model.timeline[0]}-{model.timeline[-1]}')
+    y_start = list(model.timeline).index(start_year)
+    start = None
+    if y_start > 0:
+        start = (y_start, solve_history(model, scenario, y_start, outputs[0])[1])
+
+    for first in range(0, len(parameters), batch_size):
+        batch = parameters[first:first + batch_size]
+
+        # A variant of the scenario for each perturbation
+        variants = {}
+        steps = []
+        for i, (label, var, index) in enumerate(batch):
+            step = delta * np.max(np.abs(base[var][index])) if relative else delta
+            steps.append(step or delta)
+            for sign in (1, -1):
+                inputs = overlay_inputs(base)
+                perturbed = inputs.own(var)
+                if model.dims[var].has_time:
+                    perturbed = perturbed[..., y_start:]
+                perturbed[index] += sign * steps[-1]
+                variants[f'{first + i}{sign:+d}'] = inputs
+
+        output = run.solve_batch(variants, outputs=outputs, start=start)
+
+        for i, step in enumerate(steps):
+            up, down = output[f'{first + i}+1'], output[f'{first + i}-1']
+            for var in outputs:
+                sensitivity[var][first + i] = (up[var] - down[var]) / (2 * step)
+
+    return sensitivity
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Sensitivity of the outputs to the gamma values')
+    parser.add_argument('module', help='FTT module, e.g. FTT-P')
+    parser.add_argument('outputs', nargs='*', default=['MEWS'], help='variables to report')
+    parser.add_argument('--regions', nargs='*', default=None,
+                        help='regions with their own gamma parameters')
+    parser.add_argument('--delta', type=float, default=0.01)
+    parser.add_argument('--relative', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--start-year', type=int, default=None,
+                        help='first year perturbed (default: first simulated year)')
+    parser.add_argument('--serial', action='store_true', help='do not use a process pool')
+    args = parser.parse_args()
+
+    model = ModelRun()
+    parameters = gamma_parameters(model, args.module, args.regions)
+    sensitivity = run_sensitivity(model, parameters, tuple(args.outputs), args.delta,
+                                  args.relative, batch_size=args.batch_size,
+                                  start_year=args.start_year, parallel=not args.serial)
+
+    # Save the sensitivities next to the model results
+    os.makedirs(model.output_dir, exist_ok=True)
+    with open(os.path.join(model.output_dir, f'Sensitivity_{args.module}.pickle'), 'wb') as f:
+        pickle.dump({'parameters': [label for label, _, _ in parameters],
+                     'sensitivity': sensitivity}, f)
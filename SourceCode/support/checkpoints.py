@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+checkpoints.py
+=========================================
+Year-level checkpoints of a model run.
+
+Each solved year of a scenario is saved as a compressed .npz file with
+the variables the modules write in that year; the other variables are
+the inputs of the year. The output of a scenario and the lags of the next
+year can be rebuilt from these files and the inputs, so an interrupted
+run can resume after the last year that was saved. A checkpoint.json file
+records the run the checkpoints belong to (timeline, modules, iteration
+settings and a hash of the inputs); the checkpoints of another run are
+not resumed from.
+
+Functions included:
+    - run_info
+        Record of the run the checkpoints of a scenario belong to
+    - start_checkpoints
+        Prepare the checkpoint folder of a scenario for a new run
+    - save_checkpoint
+        Save the variables of a solved year
+    - completed_years
+        Years with a checkpoint, from the start of the timeline
+    - load_checkpoint
+        Load the variables of a solved year
+
+"""
+
+# Standard library imports
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+# Third party imports
+import numpy as np
+
+
+def _year_path(directory, year):
+    return os.path.join(directory, f'{year}.npz')
+
+
+def run_info(timeline, ftt_modules, max_iter, tolerance, input_hashes):
+    """
+    Record of the run the checkpoints of a scenario belong to.
+
+    Parameters
+    ----------
+    timeline: list of int
+        Years of the run
+    ftt_modules: str
+        Enabled modules
+    max_iter: int
+        Largest number of iterations within a year
+    tolerance: float
+        Residual norm at which the iterations stop
+    input_hashes: dictionary of str
+        Hash of each input array of the scenario, see
+        result_cache.input_hashes
+
+    Returns
+    ----------
+    info: dict
+        Settings of the run, written to checkpoint.json
+    """
+
+    inputs = json.dumps(input_hashes, sort_keys=True).encode()
+
+    return {'timeline': [int(year) for year in timeline],
+            'modules': ftt_modules,
+            'max_iter': int(max_iter),
+            'tolerance': float(tolerance),
+            'inputs': hashlib.sha1(inputs).hexdigest()}
+
+
+def start_checkpoints(directory, info):
+    """ Prepare the checkpoint folder of a scenario for a new run, see run_info. """
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Remove the checkpoints of any previous run
+    for file in os.listdir(directory):
+        if file.endswith('.npz'):
+            os.remove(os.path.join(directory, file))
+
+    with open(os.path.join(directory, 'checkpoint.json'), 'w') as f:
+        json.dump(info, f)
+
+
+def save_checkpoint(directory, year, variables, saved=None):
+    """
+    Save the variables of a solved year.
+
+    Only the variables in saved are written, if given (e.g. those the
+    modules write). The file is written under a temporary name and renamed
+    once complete, so a crash while saving never leaves a partial
+    checkpoint.
+    """
+
+    # dict.items reads a CrossSection without copying
+    arrays = {var: np.asarray(value) for var, value in dict.items(variables)
+              if saved is None or var in saved}
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'{year}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, _year_path(directory, year))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def completed_years(directory, info):
+    """
+    Years with a checkpoint, from the start of the timeline.
+
+    Returns an empty list, with a warning, if the checkpoints belong to a
+    run with other settings or inputs (see run_info).
+    """
+
+    info_path = os.path.join(directory, 'checkpoint.json')
+    if not os.path.isfile(info_path):
+        return []
+    with open(info_path) as f:
+        saved = json.load(f)
+    if saved != info:
+        changed = sorted(key for key in set(saved) | set(info) if saved.get(key) != info.get(key))
+        warnings.warn(f'Checkpoints in {directory} belong to a run with another '
+                      f'{", ".join(changed)}; solving from the start')
+        return []
+
+    years = []
+    for year in info['timeline']:
+        if not os.path.isfile(_year_path(directory, year)):
+            break
+        years.append(year)
+
+    return years
+
+
+def load_checkpoint(directory, year):
+    """ Load the variables of a solved year. """
+
+    with np.load(_year_path(directory, year)) as checkpoint:
+        return {var: checkpoint[var] for var in checkpoint.files}
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+convergence.py
+=========================================
+Functions for the iterations of the model within a year.
+
+Functions included:
+    - residual_norms
+        Relative change of each variable between two iterations
+    - copy_into
+        Copy the variables into a reusable buffer
+
+"""
+
+# Standard library imports
+import copy
+
+# Third party imports
+import numpy as np
+
+
+def residual_norms(variables, previous):
+    """
+    Relative change of each variable between two iterations.
+
+    The residual of a variable is the largest absolute change of any
+    element, divided by the largest absolute value in the previous
+    iteration. Variables that are zero in both iterations have a residual
+    of zero; NaNs give a NaN residual.
+
+    Parameters
+    ----------
+    variables: dictionary of numpy arrays
+        Variables after the current iteration
+    previous: dictionary of numpy arrays
+        Variables after the previous iteration
+
+    Returns
+    ----------
+    residuals: dictionary of floats
+        Residual norm of each numeric variable in both iterations
+    """
+
+    residuals = {}
+
+    # dict.items reads a CrossSection without copying untouched variables
+    for var, value in dict.items(variables):
+        old = dict.get(previous, var)
+        if not isinstance(value, np.ndarray) or not isinstance(old, np.ndarray):
+            continue
+        if value.shape != old.shape or value.size == 0 or value.dtype.kind not in 'fiu':
+            continue
+
+        change = np.max(np.abs(value - old))
+        scale = np.max(np.abs(old))
+        residuals[var] = change / scale if scale > 0 else (0.0 if change == 0 else np.inf)
+
+    return residuals
+
+
+def copy_into(buffer, variables):
+    """
+    Copy the variables into a reusable buffer.
+
+    Arrays already in the buffer with the same shape and type are
+    overwritten in place, so repeated iterations do not allocate new
+    arrays.
+
+    Parameters
+    ----------
+    buffer: dictionary of numpy arrays or None
+        Buffer from the previous iteration (None on the first copy)
+    variables: dictionary of numpy arrays
+        Variables to copy
+
+    Returns
+    ----------
+    buffer: dictionary of numpy arrays
+        Copy of the variables
+    """
+
+    if buffer is None:
+        buffer = {}
+
+    for var, value in dict.items(variables):
+        target = buffer.get(var)
+        if (isinstance(value, np.ndarray) and isinstance(target, np.ndarray)
+                and target.shape == value.shape and target.dtype == value.dtype):
+            np.copyto(target, value)
+        elif isinstance(value, np.ndarray):
+            buffer[var] = value.copy()
+        else:
+            buffer[var] = copy.deepcopy(value)
+
+    return buffer
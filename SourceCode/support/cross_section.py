@@ -5,21 +5,136 @@ cross_section.py
 =========================================
 Function to construct cross section of data for given year.
 
-Functions included in the file:
+Functions and classes included in the file:
     - cross_section
         Cross-sectional data slicer, selects a single year of the data dictionary.
+    - CrossSection
+        Dictionary of read-only views that copies a variable on first use
+    - read_only_view
+        Read-only view of an array
+    - snapshot
+        Value of a variable that later changes in place do not reach
 """
 
 # Standard library imports
 import os
 import copy
+import threading
 
 # Third party imports
 import pandas as pd
 import numpy as np
 
 
-def cross_section(data_in, dimensions, year, y, scenario, econometrics=None, lag = None, lag_sales=None):
+class CrossSection(dict):
+    """
+    Cross section of the data that copies variables on first use.
+
+    Variables are stored as read-only views into the input data. The first
+    time a writable variable is fetched by key it is replaced by a writable
+    copy, so module code can modify it in place. Other variables are handed
+    out as the read-only views, and variables assigned by key are owned by
+    the cross section. Variables that no module changes are never copied.
+
+    Attributes
+    -----------
+    writable: set of str or None
+        Variables that may be changed in place, see
+        module_scheduler.module_mutations (None for all variables)
+
+    Methods
+    -----------
+    view
+        Read-only access to a variable without copying it
+
+    Notes
+    ---------
+    NumPy cannot tell a read from a write, so a writable variable is copied
+    on its first item access rather than on its first write. A change in
+    place to any other variable raises a ValueError (assignment destination
+    is read-only) instead of changing the inputs. Engine code that only
+    reads the arrays should use `view` or `dict.items`.
+    """
+
+    def __init__(self, views=None, writable=None):
+        """ Instantiate CrossSection from a dictionary of views. """
+
+        super().__init__()
+        self.writable = writable
+        self._owned = set()
+        self._lock = threading.Lock()
+        for var, view in (views or {}).items():
+            self.add_view(var, view)
+
+    def add_view(self, var, view):
+        """ Store a read-only view of a variable without copying it. """
+
+        dict.__setitem__(self, var, read_only_view(view))
+        self._owned.discard(var)
+
+    def view(self, var):
+        """ Return a variable without copying it. """
+
+        return dict.__getitem__(self, var)
+
+    def __getitem__(self, var):
+        if var in self._owned or (self.writable is not None and var not in self.writable):
+            return dict.__getitem__(self, var)
+
+        # Modules solved on parallel threads must not copy a variable twice
+        with self._lock:
+            value = dict.__getitem__(self, var)
+            if var not in self._owned:
+                value = value.copy()
+                dict.__setitem__(self, var, value)
+                self._owned.add(var)
+        return value
+
+    def __setitem__(self, var, value):
+        dict.__setitem__(self, var, value)
+        self._owned.add(var)
+
+    def __delitem__(self, var):
+        dict.__delitem__(self, var)
+        self._owned.discard(var)
+
+    def get(self, var, default=None):
+        return self[var] if var in self else default
+
+    def items(self):
+        return ((var, self[var]) for var in self)
+
+    def values(self):
+        return (self[var] for var in self)
+
+    def __reduce__(self):
+        # Pickled and deep-copied arrays are independent copies already
+        return (dict, (dict(dict.items(self)),))
+
+
+def read_only_view(array):
+    """ Read-only view of an array. """
+
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def snapshot(value):
+    """
+    Value of a variable that later changes in place do not reach.
+
+    Read-only views are returned as they are: the inputs behind them do not
+    change while the model solves. Writable arrays are copied.
+    """
+
+    if isinstance(value, np.ndarray) and not value.flags.writeable:
+        return value
+    return copy.deepcopy(value)
+
+
+def cross_section(data_in, dimensions, year, y, scenario, econometrics=None, lag = None, lag_sales=None,
+                  copy_on_write=False, writable=None):
     """ Construct cross section of data for given year.
 
     Parameters
@@ -39,6 +154,12 @@ def cross_section(data_in, dimensions, year, y, scenario, econometrics=None, lag
     lag_sales: dictionary of dataframes
         Optional argument, target country and number of lags
         for the lagged sales specification.
+    copy_on_write: bool
+        Optional argument, return a CrossSection of read-only views that
+        copies a variable only when it is first used
+    writable: set of str
+        Optional argument, with copy_on_write the variables that may be
+        changed in place (None for all variables)
 
     Returns
     -----------
@@ -54,7 +175,18 @@ def cross_section(data_in, dimensions, year, y, scenario, econometrics=None, lag
     # Getting cross-section for all variable or only for the variables needed for the econometrics.
     if lag_sales is None:
 
-        if econometrics is None:
+        if econometrics is None and copy_on_write:
+
+            data_out = CrossSection(writable=writable)
+
+            # Hand out views of the year, copies are made on first use
+            for var in data_in[scenario]:
+                if dimensions[var][3] == 'TIME':
+                    data_out.add_view(var, data_in[scenario][var][:, :, :, y])
+                else:
+                    data_out.add_view(var, data_in[scenario][var][:, :, :, 0])
+
+        elif econometrics is None:
 
     # Loop through all variables
             for var in data_in[scenario]:
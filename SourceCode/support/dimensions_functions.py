@@ -4,42 +4,188 @@ dimensions_functions.py
 =========================================
 Functions to load dimensions names.
 
-Functions included:
-    - load_dim
+Functions and classes included:
+    - VariableMeta
+        Dimensions of a variable, with its other VariableListing metadata
+    - load_variable_index
+        Load the metadata of all variables from VariableListing
+    - load_dims
         Load model dimensions
+    - module_variables
+        Select the variables belonging to the enabled modules
 """
 
 # Standard library imports
 import os
 
 # Third party imports
+import numpy as np
 import pandas as pd
 
 
-def load_dims():
-    """ Load model dimensions """
+# Declare file name
+dims_path = os.path.join('Utilities', 'titles', 'VariableListing.csv')
 
-    # Declare file name
-    dims_file = 'VariableListing.csv'
 
-    # Check that classification titles file exists
-    dims_path = os.path.join('Utilities', 'titles', dims_file)
+class VariableMeta(tuple):
+    """
+    Dimensions of a variable, with its other VariableListing metadata.
+
+    Behaves as the tuple of the classifications of its four dimensions
+    (e.g. ('RTI', 'T2TI', 'NA', 'TIME')), so it can be used wherever the
+    dimensions of a variable are expected.
+
+    Attributes
+    -----------
+    name: str
+        Variable name
+    domain: str
+        Model (e.g. FTT-P) or General
+    histend: int or None
+        Last year of historical data
+    forstart: int or None
+        First year of the csv files of the variable
+    shape: tuple of int or None
+        Shape of the 4D array of the variable (None if titles are not given)
+    has_time: bool
+        True if the fourth dimension is TIME
+    """
+
+    def __new__(cls, dims, name=None, domain=None, histend=None, forstart=None,
+                shape=None):
+        meta = super().__new__(cls, dims)
+        meta.name = name
+        meta.domain = domain
+        meta.histend = histend
+        meta.forstart = forstart
+        meta.shape = shape
+        meta.has_time = meta[3] == 'TIME'
+        return meta
+
+
+_index_cache = {}
+
+
+def _read_variable_index():
+    """ Read VariableListing into metadata arrays, once per file version. """
+
+    stat = os.stat(dims_path)
+    state = (os.path.abspath(dims_path), stat.st_mtime_ns, stat.st_size)
+    if _index_cache.get('state') == state:
+        return _index_cache['index']
+
+    dims_data = pd.read_csv(dims_path, skiprows=0, na_filter=False, dtype=str)
+
+    # Missing years are given as '' or '-'
+    years = dims_data.iloc[:, 9:11].apply(pd.to_numeric, errors='coerce')
+
+    index = {
+        'names': dims_data.iloc[:, 0].to_numpy(),
+        'dims': dims_data.iloc[:, 3:7].to_numpy(),
+        'domain': dims_data.iloc[:, 7].to_numpy(),
+        'histend': years.iloc[:, 0].to_numpy(),
+        'forstart': years.iloc[:, 1].to_numpy()
+    }
+
+    _index_cache.clear()
+    _index_cache.update({'state': state, 'index': index})
+
+    return index
+
+
+def load_variable_index(titles=None, timeline=None):
+    """
+    Load the metadata of all variables from VariableListing.
+
+    The csv file is read once per process (and again if it changes).
+
+    Parameters
+    ----------
+    titles: dictionary of lists, optional
+        Classification titles, used for the array shapes
+    timeline: list of int, optional
+        Years of the model timeline (the TIME classification)
+
+    Returns
+    ----------
+    variable_index: dict of VariableMeta
+        Metadata of each variable
+    """
+
+    # Check that the variable listing exists
     if not os.path.isfile(dims_path):
         print('Dimensions name file not found.')
 
-    dims_data = pd.read_csv(dims_path, skiprows=0, na_filter = False)
-   
-    # Iterate through csv rows and add to titles dictionary
-    dims_dict = {}
-    histend = {}
-    forstart = {}
-    domain = {}
-    
-    for index, row in dims_data.iterrows():
-        dims_dict[row.iloc[0]] = row.iloc[3:7].tolist() if len(row) > 7 else []
-        domain[row.iloc[0]] = row.iloc[7] if len(row) > 7 else None
-        histend[row.iloc[0]] = int(row.iloc[9]) if row.iloc[9] not in ['-', ''] else ['']
-        forstart[row.iloc[0]] = row.iloc[10] if len(row) > 10 else None
-    
-    # Return titles dictionary
+    index = _read_variable_index()
+    dims = index['dims']
+
+    # Length of every dimension of every variable, looked up per classification
+    if titles is not None:
+        lengths = {cls: len(titles[cls]) for cls in np.unique(dims) if cls in titles}
+        if timeline is not None:
+            lengths['TIME'] = len(timeline)
+        codes, inverse = np.unique(dims, return_inverse=True)
+        shapes = np.array([lengths.get(cls, -1) for cls in codes])[inverse.reshape(dims.shape)]
+
+        # Unknown classifications (e.g. TIME without a timeline) give no shape
+        shapes = [tuple(int(x) for x in shape) if shape.min() >= 0 else None
+                  for shape in shapes]
+    else:
+        shapes = [None] * len(dims)
+
+    histend = [None if np.isnan(x) else int(x) for x in index['histend']]
+    forstart = [None if np.isnan(x) else int(x) for x in index['forstart']]
+
+    return {
+        name: VariableMeta(tuple(var_dims), name, var_domain, var_histend,
+                           var_forstart, shape)
+        for name, var_dims, var_domain, var_histend, var_forstart, shape
+        in zip(index['names'], dims, index['domain'], histend, forstart, shapes)
+    }
+
+
+def load_dims(titles=None, timeline=None):
+    """
+    Load model dimensions.
+
+    Returns
+    ----------
+    dims_dict: dict of VariableMeta
+        Dimensions (and metadata) of each variable
+    histend: dict of int or None
+        Last year of historical data of each variable
+    domain: dict of str
+        Domain of each variable
+    forstart: dict of int or None
+        First year of the csv files of each variable
+    """
+
+    dims_dict = load_variable_index(titles, timeline)
+    histend = {var: meta.histend for var, meta in dims_dict.items()}
+    domain = {var: meta.domain for var, meta in dims_dict.items()}
+    forstart = {var: meta.forstart for var, meta in dims_dict.items()}
+
     return dims_dict, histend, domain, forstart
+
+
+def module_variables(domain, ftt_modules):
+    """
+    Select the variables belonging to the enabled modules.
+
+    Parameters
+    ----------
+    domain: dict of str
+        Domain of each variable, as returned by load_dims
+    ftt_modules: str
+        Comma-separated list of enabled modules (from settings.ini)
+
+    Returns
+    ----------
+    variables: list of str
+        Variables in the domain of an enabled module or in the General domain
+    """
+
+    modules_enabled = [x.strip() for x in ftt_modules.split(',')]
+    modules_enabled += ['General']
+
+    return [var for var in domain if domain[var] in modules_enabled]
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+input_cache.py
+=========================================
+Binary cache of the assembled model inputs.
+
+Each input folder (Inputs/<scenario>/<module>) gets a cache folder
+(Cache/Inputs/<scenario>/<module>) holding one .npy file per variable with the
+fully assembled 4D array, one .npy file with the mask of elements set from
+csv files, and a manifest with the state of every csv file. Arrays are
+memory-mapped when read. A variable is rebuilt when one of its csv files is
+added, removed, or has a new modification time and content hash.
+
+Functions and classes included in the file:
+    - layout_key
+        Key of the variable layout the arrays are assembled for
+    - InputCache
+        Binary store of the assembled arrays of one input folder
+"""
+
+# Standard library imports
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+# Third party imports
+import numpy as np
+
+
+# Root folder of all caches
+CACHE_DIR = 'Cache'
+
+# Version of the stored format and of the way place_csv assembles the arrays.
+# Increase it when either changes, so arrays built before are rebuilt.
+CACHE_VERSION = 2
+
+
+def layout_key(titles, dims, timeline, forstart):
+    """
+    Key of the variable layout the arrays are assembled for.
+
+    The key changes when the cache version, the timeline, the region
+    order, or the dimensions or forecast start of any variable change.
+    Cached arrays built for another layout are rebuilt.
+    """
+
+    layout = {
+        'version': CACHE_VERSION,
+        'timeline': [int(year) for year in timeline],
+        'regions': list(titles['RTI_short']),
+        'variables': {var: [list(dims[var]),
+                            [len(titles[dims[var][x]]) for x in range(4)],
+                            str(forstart[var])]
+                      for var in dims}
+    }
+    layout = json.dumps(layout, sort_keys=True).encode()
+
+    return hashlib.sha1(layout).hexdigest()
+
+
+def _replace_atomically(path, write, mode='wb'):
+    """ Write a file through a temporary file unique to this writer. """
+
+    folder, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_hash(file_path):
+    """ SHA-1 hash of the contents of a file. """
+
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class InputCache:
+    """
+    Binary store of the assembled arrays of one input folder.
+
+    Attributes
+    -----------
+    directory: str
+        Input folder with the csv files
+    cache_dir: str
+        Folder with the cached arrays and manifest
+    layout: str
+        Key of the variable layout, see layout_key
+    files: dict of dicts
+        Modification time, size and hash of each csv file
+
+    Methods
+    -----------
+    stale_variables
+        Variables that need to be rebuilt from their csv files
+    store
+        Save the assembled array of a variable
+    load
+        Memory-map the assembled array of a variable
+    save_manifest
+        Save the state of the csv files the arrays were built from
+    """
+
+    def __init__(self, directory, layout):
+        """ Instantiate InputCache and read its manifest. """
+
+        self.directory = directory
+        self.cache_dir = os.path.join(CACHE_DIR, directory)
+        self.layout = layout
+        self.files = {}
+        self._manifest = {}
+        self._failed = set()
+
+        manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        if os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+
+            # Arrays built for another layout are all stale
+            if manifest.get('layout') == layout:
+                self._manifest = manifest
+
+    def _array_path(self, var, kind='data'):
+        return os.path.join(self.cache_dir, f'{var}.{kind}.npy')
+
+    def stale_variables(self, var_files):
+        """
+        Variables that need to be rebuilt from their csv files.
+
+        A variable is stale if it is not in the cache, if the set of its csv
+        files changed, or if one of its files changed. A file only counts as
+        changed if its modification time or size changed and its content hash
+        differs from the one in the manifest.
+
+        Parameters
+        ----------
+        var_files: dict of lists of str
+            csv files in the folder, by variable
+
+        Returns
+        ----------
+        stale: list of str
+            Variables to rebuild
+        """
+
+        old_files = self._manifest.get('files', {})
+        old_vars = self._manifest.get('variables', {})
+        stale = []
+
+        for var, files in var_files.items():
+            is_stale = (sorted(old_vars.get(var, [])) != sorted(files)
+                        or not os.path.isfile(self._array_path(var))
+                        or not os.path.isfile(self._array_path(var, 'mask')))
+
+            for file in files:
+                stat = os.stat(os.path.join(self.directory, file))
+                state = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+                old = old_files.get(file, {})
+
+                if old.get('mtime') == state['mtime'] and old.get('size') == state['size']:
+                    state['hash'] = old['hash']
+                else:
+                    state['hash'] = file_hash(os.path.join(self.directory, file))
+                    is_stale = is_stale or state['hash'] != old.get('hash')
+
+                self.files[file] = state
+
+            if is_stale:
+                stale.append(var)
+
+        return stale
+
+    def store(self, var, array, mask):
+        """ Save the assembled array of a variable and its mask. """
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for kind, values in (('data', array), ('mask', mask)):
+            path = self._array_path(var, kind)
+            try:
+                _replace_atomically(path, lambda f: np.save(f, values))
+            except OSError as e:
+                # For example when another run still has the file mapped
+                warnings.warn(f'Could not update the input cache for {var} in {self.directory}: {e}')
+                self._failed.add(var)
+
+    def load(self, var):
+        """ Memory-map the assembled array of a variable and its mask. """
+
+        # Copy-on-write mapping: changes stay in memory and never reach the file
+        array = np.load(self._array_path(var), mmap_mode='c').view(np.ndarray)
+        mask = np.load(self._array_path(var, 'mask'), mmap_mode='r').view(np.ndarray)
+
+        return array, mask
+
+    def save_manifest(self, var_files):
+        """ Save the state of the csv files the arrays were built from. """
+
+        # Variables that could not be stored are rebuilt next time
+        manifest = {'layout': self.layout,
+                    'files': self.files,
+                    'variables': {var: files for var, files in var_files.items()
+                                  if var not in self._failed}}
+        if manifest == self._manifest:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        try:
+            _replace_atomically(manifest_path, lambda f: json.dump(manifest, f), 'w')
+        except OSError as e:
+            warnings.warn(f'Could not update the input cache manifest of {self.directory}: {e}')
+        self._manifest = manifest
@@ -5,28 +5,126 @@ input_functions.py
 =========================================
 Collection of functions written for model inputs.
 
-Functions included:
+Functions and classes included:
     - load_data
         Load all model data for all variables and all years.
+    - read_csvs
+        Read input csv files on a thread pool
+    - place_csv
+        Place the values of an input csv file in the array of its variable
+    - load_directory_cached
+        Assembled arrays of an input folder, using the binary cache
+    - ScenarioOverlay
+        Scenario inputs stored as overrides on top of the baseline (S0)
+    - overlay_inputs
+        Overlay on top of the inputs of a scenario
     - results_instructions
         Read results instruction file.
 
 """
 
 # Standard library imports
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 import os
-import copy
 import warnings
 
 # Third party imports
 import numpy as np
 import pandas as pd
-from numba import njit
 
 from SourceCode.support.debug_messages import input_functions_message
+from SourceCode.support.dimensions_functions import module_variables
+from SourceCode.support.input_cache import InputCache, layout_key
+
+class ScenarioOverlay(MutableMapping):
+    """
+    Scenario inputs stored as overrides on top of the baseline.
+
+    A scenario only holds the variables it overrides. All other variables
+    are read from the shared baseline (S0) arrays, which are handed out as
+    read-only views.
+
+    Attributes
+    -----------
+    base: dictionary of NumPy arrays
+        Baseline inputs shared by all scenarios
+    overrides: dictionary of NumPy arrays
+        Variables that differ from the baseline in this scenario
+
+    Methods
+    -----------
+    own
+        Return a writable array of the variable owned by the scenario
+
+    Notes
+    ---------
+    Writing in place to a variable that is still shared raises a ValueError.
+    Use `own` first to give the scenario its own copy of the variable.
+    Deleting a variable reverts it to the baseline.
+    """
+
+    def __init__(self, base):
+        """ Instantiate ScenarioOverlay on top of the baseline inputs. """
+
+        self.base = base
+        self.overrides = {}
+
+    def own(self, var):
+        """ Return a writable array of the variable owned by the scenario. """
+
+        # Overrides shared with another overlay are read-only until copied
+        if var not in self.overrides or not self.overrides[var].flags.writeable:
+            self.overrides[var] = np.copy(self[var])
+        return self.overrides[var]
+
+    def __getitem__(self, var):
+        if var in self.overrides:
+            return self.overrides[var]
+        view = self.base[var].view()
+        view.flags.writeable = False
+        return view
+
+    def __setitem__(self, var, value):
+        self.overrides[var] = value
+
+    def __delitem__(self, var):
+        del self.overrides[var]
+
+    def __contains__(self, var):
+        return var in self.overrides or var in self.base
+
+    def __iter__(self):
+        yield from self.base
+        yield from (var for var in self.overrides if var not in self.base)
+
+    def __len__(self):
+        return len(self.base) + sum(var not in self.base for var in self.overrides)
+
+
+def overlay_inputs(inputs):
+    """
+    Overlay on top of the inputs of a scenario.
+
+    The overlay shares all arrays of the scenario, including the overrides
+    of a scenario that is itself an overlay (as read-only views), until it
+    owns a variable.
+    """
+
+    if isinstance(inputs, ScenarioOverlay):
+        overlay = ScenarioOverlay(inputs.base)
+        for var, value in inputs.overrides.items():
+            view = value.view()
+            view.flags.writeable = False
+            overlay.overrides[var] = view
+        return overlay
+
+    return ScenarioOverlay(inputs)
+
 
 #@njit(nopython=False)
-def load_data(titles, dimensions, timeline, scenarios, ftt_modules, forstart):
+def load_data(titles, dimensions, timeline, scenarios, ftt_modules, forstart,
+              domain=None, cache=False, read_workers=None):
     """
     Load all model data for all variables and all years.
 
@@ -39,6 +137,15 @@ def load_data(titles, dimensions, timeline, scenarios, ftt_modules, forstart):
     timeline: list of int
         Years of both historical data and forecast period
     scenarios:
+    domain: dict of str, optional
+        Domain of each variable. If given, only variables of the enabled
+        modules, the General domain, and variables with a csv file in an
+        enabled module folder are allocated.
+    cache: bool, optional
+        Read the assembled arrays from the binary input cache, rebuilding
+        only variables whose csv files changed
+    read_workers: int, optional
+        Number of threads reading csv files (None lets the pool decide)
 
     Returns
     ----------
@@ -59,182 +166,361 @@ def load_data(titles, dimensions, timeline, scenarios, ftt_modules, forstart):
     modules_enabled = [x.strip() for x in ftt_modules.split(',')]
     modules_enabled += ['General']
 
-    # Create container with the correct dimensions
+    # Only allocate the variables used by the enabled modules
+    if domain is None:
+        variables = list(dims)
+    else:
+        variables = module_variables(domain, ftt_modules)
+
+    # Create container with the correct dimensions for the baseline
     data = {
-        scen : {
-            var : np.zeros([
-                len(titles[dims[var][0]]),
-                len(titles[dims[var][1]]),
-                len(titles[dims[var][2]]),
-                len(titles[dims[var][3]])
-            ]) for var in dims
-        } for scen in scenario_list
+        'S0' : {
+            var : np.zeros(var_shape(var, titles, dims)) for var in variables
+        }
     }
 
+    # Other scenarios only store the variables they override
+    for scen in scenario_list[1:]:
+        data[scen] = ScenarioOverlay(data['S0'])
+
+    # Variables already filled from a csv file, by scenario
+    written = {scen: set() for scen in data}
 
-    for scen in data:
-        if scen != 'S0':
-            data[scen] = copy.deepcopy(data['S0'])
 
+    # Key of the variable layout the cached arrays were built for
+    if cache:
+        layout = layout_key(titles, dims, timeline, forstart)
+
+    for scen in data:
 
         for ftt in modules_enabled:
 
             # Start reading csv files
             directory = os.path.join('Inputs', scen, ftt)
 
-            # Check if the directory exists (skipping General for some scenarios)
-            if not os.path.isdir(directory):
-                csv_files = []
-            else:
-                # Get a list of all CSV files in the directory
-                csv_files = [f for f in os.listdir(directory) if f.endswith(".csv")]
+            # Get the csv files of variables listed in VariableListing
+            csv_files = list_csv_files(directory, dims)
 
-            # Get a set of variables in generated from VariableListing
-            valid_vars = set(var.split('_')[0] for var in data[scen].keys())
+            # Read the assembled arrays from the binary cache
+            if cache:
+                arrays = load_directory_cached(directory, csv_files, scen, titles,
+                                               dims, timeline, forstart, layout,
+                                               read_workers)
+                for var, (array, mask) in arrays.items():
+                    set_cached_array(data, scen, var, array, mask, written)
+                continue
+
+            # Read the csv files in parallel, then place them in file order
+            csvs = read_csvs([os.path.join(directory, file) for file in csv_files],
+                             read_workers)
+
+            # Loop through all the files in the directory
+            for file, csv in zip(csv_files, csvs):
 
-            # Warn for variables that are present in the folder but not used
-            for file in csv_files:
                 var = file[:-4].split('_')[0]
-                if var not in valid_vars:
-                    warnings.warn(f'Variable {var} is present in the folder as a csv but is not included \
-                                in VariableListing, so it will be ignored')
-            
-            # Filter the list to include only the files that correspond to variables in data[scen].keys()
-            csv_files = [f for f in csv_files if f[:-4].split('_')[0] in valid_vars]
+
+                # Variables from another domain stored in an enabled folder
+                if var not in data[scen]:
+                    data[scen][var] = np.zeros(var_shape(var, titles, dims))
+
+                # Array to place the values in (scenarios copy it from S0 first)
+                if isinstance(data[scen], ScenarioOverlay):
+                    array = data[scen].own(var)
+                else:
+                    array = data[scen][var]
+
+                place_csv(array, csv, file, scen, titles, dims, timeline, forstart)
+
+    return data
+
+
+def var_shape(var, titles, dims):
+    """ Shape of the 4D array of a variable. """
+
+    # Shape from the variable index, if dims holds VariableMeta records
+    shape = getattr(dims[var], 'shape', None)
+    if shape is not None:
+        return shape
+
+    return tuple(len(titles[dims[var][x]]) for x in range(4))
+
+
+def list_csv_files(directory, dims):
+    """
+    List the csv files in a folder that belong to variables in VariableListing.
+
+    Warns for csv files of variables that are not in VariableListing.
+    """
+
+    # Check if the directory exists (skipping General for some scenarios)
+    if not os.path.isdir(directory):
+        return []
+
+    # Get a list of all CSV files in the directory
+    csv_files = [f for f in os.listdir(directory) if f.endswith(".csv")]
+
+    # Get a set of variables in generated from VariableListing
+    valid_vars = set(var.split('_')[0] for var in dims)
+
+    # Warn for variables that are present in the folder but not used
+    for file in csv_files:
+        var = file[:-4].split('_')[0]
+        if var not in valid_vars:
+            warnings.warn(f'Variable {var} is present in the folder as a csv but is not included \
+                        in VariableListing, so it will be ignored')
+
+    # Filter the list to include only the files that correspond to variables in VariableListing
+    return [f for f in csv_files if f[:-4].split('_')[0] in valid_vars]
+
+
+def read_csv(file_path):
+    """ Read an input csv file. """
+
+    return pd.read_csv(file_path, header=0, index_col=0).fillna(0)
+
+
+def read_csvs(file_paths, workers=None):
+    """
+    Read input csv files on a thread pool.
+
+    Reading is mostly waiting on the disk (or network storage), so threads
+    overlap the reads. The frames are returned in the order of file_paths.
+    """
+
+    if len(file_paths) < 2 or workers == 1:
+        return [read_csv(path) for path in file_paths]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read_csv, file_paths))
+
+
+def place_csv(array, csv, file, scen, titles, dims, timeline, forstart):
+    """
+    Place the values of an input csv file in the array of its variable.
+
+    Parameters
+    ----------
+    array: numpy array
+        4D array of the variable, modified in place
+    csv: pandas DataFrame
+        Contents of the csv file
+    file: str
+        Name of the csv file, like MEWG_BE.csv
+    scen: str
+        Name of the scenario (for error messages)
+    titles: dictionary of lists
+        Dictionary containing all title classifications
+    dims: dict of tuples (str, str, str, str)
+        Variable classifications by dimension
+    timeline: list of int
+        Years of both historical data and forecast period
+    forstart: dict
+        First year of the forecast data by variable
+    """
+
+    # Split file name
+    file_split = file[:-4].split('_')
+    var = file_split[0]
+
+    if len(file_split) == 1:
+        key = None
+    else:
+        key = file_split[1]
+
+    # The length of the dimensions
+    dims_length = [len(titles[dims[var][x]]) for x in range(4)]
+
+    
+    # If the fourth dimension is time
+    if dims[var][3] == 'TIME':
+        try:
+            var_tl = list(range(int(forstart[var]), timeline[-1]+1))
+        except (TypeError, ValueError) as e:
+            print(f'var is {var}')
+            print(f'forstart[var] is {forstart[var]}')
+            print(f'timeline is {timeline}')
+            raise(e)
+        var_tl_fit = [year for year in var_tl if year in timeline]
+        var_tl_inds = [i for i, year in enumerate(timeline) if year in var_tl]
+        #print(csv.columns, var)
+        csv.columns = [int(year) for year in csv.columns]
+
+        #print(file)
+        read = csv.loc[:, var_tl]
+
+    else:
+        read = csv
+
+    # If the csv file has a region key indicator (like _BE)
+    if key in titles['RTI_short']:
+
+        # Take the index of the region
+        reg_index = titles['RTI_short'].index(key)
+
+        # Loop through the second dimension
+        for i in range(read.shape[0]):
+
+            # Distinction whether the last dimension is time or not
+            if dims_length[3] > 1:
+                try:
+                    array[reg_index, i, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[i][var_tl_fit]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read, var_tl_fit, reg_index)
+                    raise(e)
+            else:
+                try:
+                    array[reg_index, i, :, 0] = read.iloc[i, :]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read, reg_index = reg_index)
+                    raise(e)
+                
+
+    # If the file does not have a region key like _BE
+    else:
+
+        # If the first dimension is regions
+        # Quick fix for ZLER (first dim here is FTTI)
+        if (dims[var][0] == 'RTI') or (var == "ZLER"):
+            # If there are only regions
+            if all(dim_length == 1 for dim_length in dims_length[1:]):
+                try:
+                    array[:, 0, 0, 0] = read.iloc[:, 0]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read)
+                    raise(e)
+  
+            # If there is a second dimension # TODO: check if this is correct
+            if dims_length[1] > 1:
+                try: 
+                    array[:, :, 0, 0] = read
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read, reg_index = reg_index)
+                    raise(e)
             
+            # If there is a third dimension only
+            elif dims_length[2] > 1:
+            #elif len(titles[dims[var][2]]) > 1:
+                print("Test if this is ever used")
+                try:
+                    array[:, 0, :, 0] = read
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read)
+                    raise(e)    
             
-            # Loop through all the files in the directory
-            for file in csv_files:
+            # If there is a fourth dimension only (time)
+            elif dims_length[3] > 1:
+                try:
+                    array[:, 0, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[:][var_tl_fit]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read, timeline=var_tl_fit)
+                    raise(e)
+
+        # If the first dimension is not regions
+        else:
+            # If there is only one number
+            if all(dim_length == 1 for dim_length in dims_length):
+                try: 
+                    array[0, 0, 0, 0] = read.iloc[0,0]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read)
+                    raise(e)
+
+            # If there is no third dimension
+            elif dims_length[2] == 1:
+                try:
+                    array[0, :, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[:][var_tl_fit]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read, timeline=var_tl_fit)
+                    raise(e)
+
+            # If there is no time dimension (fourth dimension)
+            elif dims_length[3] == 1:
+                try:
+                    array[0, :, :, 0] = read.iloc[:,:len(titles[dims[var][2]])]
+                except (IndexError, ValueError) as e:
+                    input_functions_message(scen, var, dims, read)
+                    raise(e)
+
+
+def load_directory_cached(directory, csv_files, scen, titles, dims, timeline,
+                          forstart, layout, read_workers=None):
+    """
+    Assembled arrays of the variables in an input folder, using the binary cache.
 
-                # Construct the full file path
-                file_path = os.path.join(directory, file)
+    Variables with a new, changed or removed csv file are rebuilt from
+    their csv files and stored in the cache. All other variables are
+    memory-mapped from the cache.
 
-                # Read the csv
-                csv = pd.read_csv(file_path, header=0, index_col=0).fillna(0)
+    Returns
+    ----------
+    arrays: dict of tuples (numpy array, numpy array)
+        Assembled array and mask of the elements set from csv files,
+        by variable
+    """
 
-                # Split file name
-                file_split = file[:-4].split('_')
-                var = file_split[0]
+    store = InputCache(directory, layout)
+
+    # Group the files by variable
+    var_files = {}
+    for file in csv_files:
+        var_files.setdefault(file[:-4].split('_')[0], []).append(file)
+
+    # Rebuild each variable with a changed file from all its files
+    rebuild = store.stale_variables(var_files)
+    files = [file for var in rebuild for file in var_files[var]]
+    csvs = dict(zip(files, read_csvs([os.path.join(directory, file) for file in files],
+                                     read_workers)))
+    arrays = {}
+    for var in rebuild:
+        shape = var_shape(var, titles, dims)
+        array = np.zeros(shape)
+        mask = np.zeros(shape)
+        for file in var_files[var]:
+            csv = csvs.pop(file)
+            place_csv(array, csv, file, scen, titles, dims, timeline, forstart)
+            ones = pd.DataFrame(1.0, index=csv.index, columns=csv.columns)
+            place_csv(mask, ones, file, scen, titles, dims, timeline, forstart)
+        arrays[var] = (array, mask.astype(bool))
+        store.store(var, *arrays[var])
+
+    store.save_manifest(var_files)
+
+    for var in var_files:
+        if var not in arrays:
+            arrays[var] = store.load(var)
+
+    return {var: arrays[var] for var in var_files}
+
+
+def set_cached_array(data, scen, var, array, mask, written):
+    """
+    Set an assembled array from the cache in the scenario inputs.
 
-                if len(file_split) == 1:
-                    key = None
-                else:
-                    key = file_split[1]
-                
-                # The length of the dimensions
-                dims_length = [len(titles[dims[var][x]]) for x in range(4)]
+    The array is used as is if nothing else has been placed in the variable
+    yet and it covers everything the scenario would otherwise inherit.
+    Otherwise the elements set from csv files are copied in.
+    """
 
-                
-                # If the fourth dimension is time
-                if dims[var][3] == 'TIME':
-                    try:
-                        var_tl = list(range(int(forstart[var]), timeline[-1]+1))
-                    except ValueError as e:
-                        print(f'var is {var}')
-                        print(f'forstart[var] is {forstart[var]}')
-                        print(f'timeline is {timeline}')
-                        raise(e)
-                    var_tl_fit = [year for year in var_tl if year in timeline]
-                    var_tl_inds = [i for i, year in enumerate(timeline) if year in var_tl]
-                    #print(csv.columns, var)
-                    csv.columns = [int(year) for year in csv.columns]
-
-                    #print(file)
-                    read = csv.loc[:, var_tl]
+    # First values for a baseline variable (unset elements are zero)
+    if var not in written[scen] and not isinstance(data[scen], ScenarioOverlay):
+        data[scen][var] = array
 
-                else:
-                    read = csv
-
-                # If the csv file has a region key indicator (like _BE)
-                if key in titles['RTI_short']:
-
-                    # Take the index of the region
-                    reg_index = titles['RTI_short'].index(key)
-
-                    # Loop through the second dimension
-                    for i in range(read.shape[0]):
-
-                        # Distinction whether the last dimension is time or not
-                        if dims_length[3] > 1:
-                            try:
-                                data[scen][var][reg_index, i, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[i][var_tl_fit]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read, var_tl_fit, reg_index)
-                                raise(e)
-                        else:
-                            try:
-                                data[scen][var][reg_index, i, :, 0] = read.iloc[i, :]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read, reg_index = reg_index)
-                                raise(e)
-                            
-
-                # If the file does not have a region key like _BE
-                else:
+    # Scenario that overrides the whole variable
+    elif var not in written[scen] and mask.all():
+        data[scen][var] = array
 
-                    # If the first dimension is regions
-                    # Quick fix for ZLER (first dim here is FTTI)
-                    if (dims[var][0] == 'RTI') or (var == "ZLER"):
-                        # If there are only regions
-                        if all(dim_length == 1 for dim_length in dims_length[1:]):
-                            try:
-                                data[scen][var][:, 0, 0, 0] = read.iloc[:, 0]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read)
-                                raise(e)
-      
-                        # If there is a second dimension # TODO: check if this is correct
-                        if dims_length[1] > 1:
-                            try: 
-                                data[scen][var][:, :, 0, 0] = read
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read, reg_index = reg_index)
-                                raise(e)
-                        
-                        # If there is a third dimension only
-                        elif dims_length[2] > 1:
-                        #elif len(titles[dims[var][2]]) > 1:
-                            print("Test if this is ever used")
-                            try:
-                                data[scen][var][:, 0, :, 0] = read
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read)
-                                raise(e)    
-                        
-                        # If there is a fourth dimension only (time)
-                        elif dims_length[3] > 1:
-                            try:
-                                data[scen][var][:, 0, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[:][var_tl_fit]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read, timeline=var_tl_fit)
-                                raise(e)
-
-                    # If the first dimension is not regions
-                    else:
-                        # If there is only one number
-                        if all(dim_length == 1 for dim_length in dims_length):
-                            try: 
-                                data[scen][var][0, 0, 0, 0] = read.iloc[0,0]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read)
-                                raise(e)
-
-                        # If there is no third dimension
-                        elif dims_length[2] == 1:
-                            try:
-                                data[scen][var][0, :, 0, var_tl_inds[0]:var_tl_inds[-1]+1] = read.iloc[:][var_tl_fit]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read, timeline=var_tl_fit)
-                                raise(e)
-
-                        # If there is no time dimension (fourth dimension)
-                        elif dims_length[3] == 1:
-                            try:
-                                data[scen][var][0, :, :, 0] = read.iloc[:,:len(titles[dims[var][2]])]
-                            except (IndexError, ValueError) as e:
-                                input_functions_message(scen, var, dims, read)
-                                raise(e)
-    return data
+    else:
+        if var not in data[scen]:
+            data[scen][var] = np.zeros(array.shape)
+
+        if isinstance(data[scen], ScenarioOverlay):
+            target = data[scen].own(var)
+        else:
+            target = data[scen][var]
+
+        np.copyto(target, array, where=mask)
+
+    written[scen].add(var)
 
 
 def results_instructions():
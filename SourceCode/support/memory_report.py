@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+memory_report.py
+=========================================
+Memory used by the variables of a model run.
+
+Arrays are counted by the memory they hold: an array that is a view of
+an array counted before (e.g. a scenario overlay's view of the S0 inputs,
+or a cross section's view of the inputs) counts zero bytes. Variables
+are then summed by domain and by scenario.
+
+Functions included:
+    - variable_bytes
+        Bytes held by each variable of a dictionary of arrays
+    - summarise
+        Bytes by variable and domain, and in total
+    - peak_rss
+        Peak resident memory of this process
+    - peak_rss_workers
+        Peak resident memory of the largest finished worker process
+    - format_report
+        Report as text, largest items first
+
+"""
+
+# Standard library imports
+import ctypes
+import sys
+
+# Third party imports
+import numpy as np
+
+
+def _root(array):
+    """ Array owning the memory of a (possibly nested) view. """
+
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def variable_bytes(data, seen):
+    """
+    Bytes held by each variable of a dictionary of arrays.
+
+    Parameters
+    ----------
+    data: dictionary of numpy arrays
+        Variables (a dict, CrossSection or ScenarioOverlay)
+    seen: set of int
+        Ids of the memory already counted, updated in place
+
+    Returns
+    ----------
+    nbytes: dict of int
+        Bytes of each variable not counted before
+    """
+
+    # Overlays only hold their overrides, the rest is the baseline's
+    arrays = getattr(data, 'overrides', None)
+    if arrays is None:
+        # dict.items reads a CrossSection without copying
+        arrays = dict(dict.items(data)) if isinstance(data, dict) else dict(data)
+
+    nbytes = {}
+    for var, value in arrays.items():
+        if not isinstance(value, np.ndarray):
+            nbytes[var] = sys.getsizeof(value)
+            continue
+        root = _root(value)
+        nbytes[var] = 0 if id(root) in seen else root.nbytes
+        seen.add(id(root))
+
+    return nbytes
+
+
+def summarise(nbytes, domain):
+    """
+    Bytes by variable and domain, and in total.
+
+    Parameters
+    ----------
+    nbytes: dict of int
+        Bytes of each variable, see variable_bytes
+    domain: dict of str
+        Domain of each variable
+
+    Returns
+    ----------
+    summary: dict
+        'variables' and 'domains' (bytes of each) and 'total'
+    """
+
+    domains = {}
+    for var, size in nbytes.items():
+        name = domain.get(var, 'Unknown')
+        domains[name] = domains.get(name, 0) + size
+
+    return {'variables': nbytes, 'domains': domains, 'total': sum(nbytes.values())}
+
+
+class _MemoryCounters(ctypes.Structure):
+    """ PROCESS_MEMORY_COUNTERS of the Windows API. """
+
+    _fields_ = [('cb', ctypes.c_ulong),
+                ('PageFaultCount', ctypes.c_ulong),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t)]
+
+
+def _max_rss(children=False):
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def peak_rss():
+    """ Peak resident memory of this process so far, in bytes (None if unknown). """
+
+    if sys.platform == 'win32':
+        counters = _MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters),
+                                                        counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+
+    return _max_rss()
+
+
+def peak_rss_workers():
+    """
+    Peak resident memory of the largest finished worker process, in bytes.
+
+    None if unknown (on Windows) or if no worker process has finished.
+    """
+
+    if sys.platform == 'win32':
+        return None
+
+    return _max_rss(children=True) or None
+
+
+def _size(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if nbytes < 1024:
+            return f'{nbytes:.4g} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:.4g} GB'
+
+
+def format_report(report, top=10):
+    """
+    Report as text, largest items first.
+
+    Parameters
+    ----------
+    report: dict
+        Report of ModelRun.memory_report
+    top: int
+        Number of variables listed for each container
+    """
+
+    sections = [(f'{container} {scen}', summary)
+                for container in ('input', 'output')
+                for scen, summary in report[container].items()]
+    sections += [(container, report[container]) for container in ('variables', 'lags')]
+
+    lines = []
+    for label, summary in sections:
+        lines.append(f'{label}: {_size(summary["total"])}')
+        if not summary['total']:
+            continue
+        domains = sorted(summary['domains'].items(), key=lambda item: -item[1])
+        lines.append('    by domain: ' + ', '.join(f'{name} {_size(size)}'
+                                                   for name, size in domains if size))
+        variables = sorted(summary['variables'].items(), key=lambda item: -item[1])[:top]
+        lines.append('    largest: ' + ', '.join(f'{var} {_size(size)}'
+                                                 for var, size in variables if size))
+
+    for key in ('peak_rss', 'peak_rss_workers'):
+        if report.get(key) is not None:
+            lines.append(f'{key}: {_size(report[key])}')
+
+    return '\n'.join(lines)
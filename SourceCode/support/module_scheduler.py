@@ -0,0 +1,778 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+module_scheduler.py
+=========================================
+Run the FTT modules of a year concurrently where they do not interact.
+
+Each module writes the variables of its own domain (the Domain column of
+VariableListing), any variable it assigns to by name, and any variable it
+may change in place. It reads the variables it names anywhere in its
+source, or in the SourceCode modules it imports. A module that uses the
+variables by a key that is not a string constant (e.g.
+`for var in time_lag.keys(): data[var]`) may use any variable, unless
+the loop or the if statements around it limit the key, as in
+`if domain[var] == 'FTT-P'`, `if var.startswith('Z')` or
+`for var in ['MEWS', 'MEWK']`. Two modules depend on each other if one
+reads or writes a variable the other writes. Dependent modules keep their
+order in the modules list. Independent modules run on a thread pool and
+share the variables dictionary, as each only writes its own variables.
+
+The variables a module may change in place (e.g. data['MEWS'][:, :, 0] = ...,
+through an alias such as shares = data['MEWS'], as the out argument of a
+numpy function, or by passing the array to a function that is not a numpy
+function) are found the same way, so cross sections only copy those
+variables, see CrossSection. SourceCode functions taking a dictionary of
+variables are followed; a dictionary handed to any other code may have
+all its variables read and changed.
+
+Functions included:
+    - module_access
+        Variables read and written by an FTT module
+    - module_mutations
+        Variables an FTT module may change in place
+    - dependency_graph
+        Modules each module has to wait for
+    - run_modules
+        Solve the modules of a year in dependency order on a thread pool
+
+"""
+
+# Standard library imports
+import ast
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+import importlib.util
+import inspect
+
+# Third party imports
+import numpy as np
+
+
+# Names of the dictionaries of variables in the solve functions of the modules
+VARIABLE_DICTS = ('data', 'time_lag', 'iter_lag')
+
+# Name of the dictionary with the domain of each variable
+DOMAIN_DICT = 'domain'
+
+# Array attributes and methods returning a view of the array
+_VIEW_ATTRIBUTES = {'T', 'real', 'imag', 'flat', 'reshape', 'view', 'transpose', 'squeeze',
+                    'swapaxes', 'ravel', 'diagonal'}
+# Array methods changing the array in place
+_MUTATING_METHODS = {'fill', 'sort', 'resize', 'put', 'itemset', 'setfield', 'partition',
+                     'byteswap', 'setflags'}
+# Functions of the modules below returning a view of their first argument
+_VIEW_FUNCTIONS = {'reshape', 'transpose', 'squeeze', 'asarray', 'asanyarray', 'ravel',
+                   'atleast_1d', 'atleast_2d', 'atleast_3d', 'moveaxis', 'swapaxes',
+                   'rollaxis', 'expand_dims', 'diagonal'}
+# Functions of the modules below changing an argument in place
+_MUTATING_FUNCTIONS = {'copyto', 'put', 'place', 'putmask', 'put_along_axis', 'fill_diagonal',
+                       'shuffle', 'at'}
+# Modules whose other functions do not change their arguments
+_PURE_MODULES = {'np', 'numpy', 'math', 'copy'}
+# Methods of a dictionary of variables that only use its keys (get is
+# followed as a key, see _string_key)
+_KEY_METHODS = {'keys', 'get', '__contains__'}
+# Nodes with a scope of their own
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+# Built-in and support functions that do not change their arguments
+_PURE_FUNCTIONS = {'len', 'sum', 'min', 'max', 'abs', 'round', 'float', 'int', 'bool', 'str',
+                   'repr', 'format', 'print', 'range', 'any', 'all', 'isinstance',
+                   'divide', 'snapshot'}
+
+
+@lru_cache(maxsize=None)
+def _parse(module_name):
+    """ Syntax tree of a module, and the SourceCode modules it imports """
+
+    spec = importlib.util.find_spec(module_name)
+    with open(spec.origin, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+
+    # Link every node to its parent
+    for parent in ast.walk(tree):
+        for child in ast.iter_child_nodes(parent):
+            child.parent = parent
+    tree.parent = None
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            imported = [node.module] if node.module else []
+        elif isinstance(node, ast.Import):
+            imported = [alias.name for alias in node.names]
+        else:
+            continue
+        imports += [name for name in imported
+                    if name.startswith('SourceCode') and importlib.util.find_spec(name)]
+
+    return tree, imports
+
+
+def _module_trees(module_name, seen=None):
+    """ Syntax trees of a module and of the SourceCode modules it imports """
+
+    seen = set() if seen is None else seen
+    if module_name in seen:
+        return []
+    seen.add(module_name)
+
+    tree, imports = _parse(module_name)
+    trees = [tree]
+    for name in imports:
+        trees += _module_trees(name, seen)
+
+    return trees
+
+
+def _string_key(node):
+    """ The string constant subscripting a node, if any """
+
+    if isinstance(node, ast.Subscript):
+        key = node.slice
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+          and node.func.attr == 'get' and node.args):
+        key = node.args[0]
+    else:
+        return None
+
+    if isinstance(key, ast.Constant) and isinstance(key.value, str):
+        return key.value
+    return None
+
+
+def _variable_dict(node, names=VARIABLE_DICTS):
+    """ The name of the dictionary of variables a subscript or get call takes a key of, if any """
+
+    if isinstance(node, ast.Subscript):
+        value = node.value
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+          and node.func.attr == 'get' and node.args):
+        value = node.func.value
+    else:
+        return None
+
+    return value.id if isinstance(value, ast.Name) and value.id in names else None
+
+
+def _key(node):
+    """ Key expression of a subscript or get call """
+
+    return node.slice if isinstance(node, ast.Subscript) else node.args[0]
+
+
+def _is_dynamic(node):
+    """ Whether a node takes a variable of a dictionary of variables by a non-constant key """
+
+    return _variable_dict(node) is not None and _string_key(node) is None
+
+
+def _functions(trees):
+    """ Function definitions of the syntax trees, by name """
+
+    return {node.name: node for tree in trees for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+
+
+def _parameter(function, call, argument):
+    """ Name of the parameter of a function an argument of a call is passed to, if known """
+
+    if any(argument is value for value in call.args):
+        position = next(i for i, value in enumerate(call.args) if value is argument)
+        parameters = function.args.posonlyargs + function.args.args
+        return parameters[position].arg if position < len(parameters) else None
+
+    for keyword in call.keywords:
+        if keyword.value is argument:
+            return keyword.arg
+    return None
+
+
+def _any_escapes(trees):
+    """ Whether a dictionary of variables escapes the analysis anywhere in the trees """
+
+    functions = _functions(trees)
+    return any(isinstance(node, ast.Name) and node.id in VARIABLE_DICTS
+               and isinstance(node.ctx, ast.Load) and _escapes(node, functions)
+               for tree in trees for node in ast.walk(tree))
+
+
+def _escapes(node, functions, seen=frozenset()):
+    """
+    Whether a dictionary of variables escapes the analysis at a node.
+
+    The dictionary escapes when its values are taken other than by key
+    (e.g. data.items()), when it gets another name, or when it is passed
+    to a function other than a built-in function that leaves it unchanged
+    and a SourceCode function. A SourceCode function taking it under
+    another name (e.g. rldc(data, time_lag, iter_lag, ...) with the
+    parameter data_dt) is followed: the dictionary escapes if the function
+    takes the parameter by a key that is not a string constant, or lets
+    it escape in turn.
+    """
+
+    parent = node.parent
+
+    # data['MEWS'], data[var], var in data, for var in data, return data
+    if isinstance(parent, ast.Subscript) and parent.value is node:
+        return False
+    if isinstance(parent, (ast.Compare, ast.Return, ast.Expr)):
+        return False
+    if isinstance(parent, ast.Tuple) and isinstance(parent.parent, ast.Return):
+        return False
+    if isinstance(parent, (ast.For, ast.AsyncFor, ast.comprehension)) and parent.iter is node:
+        return False
+    if isinstance(parent, ast.Attribute):
+        return parent.attr not in _KEY_METHODS
+
+    if isinstance(parent, ast.keyword):
+        call, argument = parent.parent, parent.value
+    elif isinstance(parent, ast.Call) and parent.func is not node:
+        call, argument = parent, node
+    else:
+        return True
+
+    if not isinstance(call.func, ast.Name):
+        return True
+    if call.func.id in _PURE_FUNCTIONS:
+        return False
+    function = functions.get(call.func.id)
+    if function is None:
+        return True
+
+    parameter = _parameter(function, call, argument)
+    if parameter is None:
+        return True
+    if parameter in VARIABLE_DICTS or (function, parameter) in seen:
+        # Analysed with the rest of the source
+        return False
+
+    seen = seen | {(function, parameter)}
+    for other in ast.walk(function):
+        if (isinstance(other, ast.Name) and other.id == parameter
+                and _scope(other) is function):
+            if not isinstance(other.ctx, ast.Load):
+                return True
+            keyed = other.parent
+            if isinstance(keyed, ast.Attribute) and keyed.attr == 'get':
+                keyed = keyed.parent
+            if (isinstance(keyed, (ast.Subscript, ast.Call)) and _variable_dict(keyed, parameter)
+                    and _string_key(keyed) is None):
+                return True
+            if _escapes(other, functions, seen):
+                return True
+    return False
+
+
+@lru_cache(maxsize=None)
+def _out_position(function_path):
+    """ Position of the out argument of a numpy function (e.g. 'linalg.solve'), if any """
+
+    function = np
+    for name in function_path.split('.'):
+        function = getattr(function, name, None)
+    if isinstance(function, np.ufunc):
+        return function.nin
+
+    try:
+        parameters = list(inspect.signature(function).parameters.values())
+    except (TypeError, ValueError):
+        # Unknown signature: any argument after the first may be written to
+        return 1
+    for position, parameter in enumerate(parameters):
+        if parameter.kind not in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            return None
+        if parameter.name == 'out':
+            return position
+    return None
+
+
+def _writes_argument(call, argument):
+    """ Whether a positional argument of a numpy call is its out argument """
+
+    func = call.func
+    path = []
+    while isinstance(func, ast.Attribute):
+        path.insert(0, func.attr)
+        func = func.value
+    if not (isinstance(func, ast.Name) and func.id in ('np', 'numpy')) or not path:
+        return False
+
+    positions = [i for i, value in enumerate(call.args) if value is argument]
+    out = _out_position('.'.join(path))
+    return bool(positions) and out is not None and positions[0] >= out
+
+
+def _constant_strings(node):
+    """ The string constants of a string or of a list, tuple or set of strings, if any """
+
+    values = node.elts if isinstance(node, (ast.List, ast.Tuple, ast.Set)) else [node]
+    if all(isinstance(value, ast.Constant) and isinstance(value.value, str) for value in values):
+        return tuple(value.value for value in values)
+    return None
+
+
+def _key_conditions(test, key):
+    """ Conditions an if statement's test puts on the variable named key """
+
+    if isinstance(test, ast.BoolOp) and isinstance(test.op, ast.And):
+        return [condition for value in test.values for condition in _key_conditions(value, key)]
+
+    # domain[var] == 'FTT-P' or var in ('MEWS', 'MEWK')
+    if isinstance(test, ast.Compare) and len(test.ops) == 1:
+        left, right = test.left, test.comparators[0]
+        if isinstance(test.ops[0], ast.Eq):
+            for lookup, value in ((left, right), (right, left)):
+                if (isinstance(lookup, ast.Subscript) and isinstance(lookup.value, ast.Name)
+                        and lookup.value.id == DOMAIN_DICT and isinstance(lookup.slice, ast.Name)
+                        and lookup.slice.id == key and isinstance(value, ast.Constant)
+                        and isinstance(value.value, str)):
+                    return [('domain', value.value)]
+        if (isinstance(test.ops[0], ast.In) and isinstance(left, ast.Name) and left.id == key
+                and isinstance(right, (ast.List, ast.Tuple, ast.Set))
+                and _constant_strings(right) is not None):
+            return [('names', _constant_strings(right))]
+
+    # var.startswith('Z') or var.startswith(('R', 'Z'))
+    if (isinstance(test, ast.Call) and isinstance(test.func, ast.Attribute)
+            and test.func.attr == 'startswith' and isinstance(test.func.value, ast.Name)
+            and test.func.value.id == key and len(test.args) == 1 and not test.keywords
+            and _constant_strings(test.args[0]) is not None):
+        return [('prefix', _constant_strings(test.args[0]))]
+
+    return []
+
+
+def _key_guard(node):
+    """
+    Conditions on the variables a non-constant key may stand for.
+
+    The key of data[var] (or data.get(var)) is limited by the if statements
+    around it (see _key_conditions) and by a for loop over string
+    constants binding it, up to that loop. A key that is assigned anywhere
+    else in its function is not limited.
+
+    Returns
+    ----------
+    guard: tuple of tuples (str, str or tuple of str)
+        Kind ('domain', 'prefix' or 'names') and value of each condition;
+        no conditions for a key that may stand for any variable
+    """
+
+    key = _key(node)
+    if not isinstance(key, ast.Name):
+        return ()
+
+    conditions = []
+    loop = None
+    child, parent = node, node.parent
+    while parent is not None and not isinstance(parent, _SCOPES):
+        if isinstance(parent, ast.If) and any(child is statement for statement in parent.body):
+            conditions += _key_conditions(parent.test, key.id)
+        elif (isinstance(parent, (ast.For, ast.AsyncFor)) and isinstance(parent.target, ast.Name)
+              and parent.target.id == key.id):
+            loop = parent
+            names = _constant_strings(parent.iter)
+            if isinstance(parent.iter, (ast.List, ast.Tuple, ast.Set)) and names is not None:
+                conditions.append(('names', names))
+            break
+        child, parent = parent, parent.parent
+
+    # The conditions only hold for the loop variable (or a variable that is
+    # not assigned to in the function)
+    for other in ast.walk(parent if parent is not None else child):
+        if (isinstance(other, ast.Name) and other.id == key.id
+                and not isinstance(other.ctx, ast.Load)
+                and (loop is None or other is not loop.target)):
+            return ()
+
+    return tuple(sorted(set(conditions)))
+
+
+def _guard_variables(guard, domain):
+    """ Variables meeting the conditions of a guard, see _key_guard """
+
+    def meets(var, condition):
+        kind, value = condition
+        if kind == 'domain':
+            return domain[var] == value
+        if kind == 'prefix':
+            return var.startswith(value)
+        return var in value
+
+    return {var for var in domain if all(meets(var, condition) for condition in guard)}
+
+
+def _variables(keys, domain):
+    """ Variables of the keys found in a module: names, and guards of non-constant keys """
+
+    variables = set()
+    for key in keys:
+        if isinstance(key, tuple):
+            variables |= _guard_variables(key, domain)
+        elif key in domain:
+            variables.add(key)
+
+    return variables
+
+
+@lru_cache(maxsize=None)
+def _source_names(module_name):
+    """
+    String constants in a module and the SourceCode modules it imports.
+
+    Returns the names that appear anywhere, the names used as the key
+    of an assignment target (e.g. data['MEWS'][:, :, 0] = ...), and the
+    guards (see _key_guard) of the keys that are not string constants
+    (e.g. data[var]). Assigned keys that are not string constants are
+    added to the assigned names as their guards. A dictionary of variables
+    escaping the analysis (see _escapes) may have any variable read and
+    assigned.
+    """
+
+    names = set()
+    assigned = set()
+    dynamic = set()
+    trees = _module_trees(module_name)
+    if _any_escapes(trees):
+        assigned.add(())
+        dynamic.add(())
+
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                names.add(node.value)
+
+            elif _is_dynamic(node):
+                dynamic.add(_key_guard(node))
+
+            elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    # Walk down data['X'][:, :, 0] to the subscript with the name
+                    while isinstance(target, ast.Subscript):
+                        key = _string_key(target)
+                        if key is not None:
+                            assigned.add(key)
+                        elif _is_dynamic(target):
+                            assigned.add(_key_guard(target))
+                        target = target.value
+
+    return frozenset(names), frozenset(assigned), frozenset(dynamic)
+
+
+def _call_kind(call, out=True):
+    """ Whether a call returns a view of its first argument ('view'), may
+    change its arguments ('mutate') or does neither ('pure'). With out
+    False, writing to the out argument does not count as a change. """
+
+    for keyword in call.keywords:
+        if (keyword.arg == 'out' and out) or (keyword.arg == 'copy'
+                                             and isinstance(keyword.value, ast.Constant)
+                                             and keyword.value.value is False):
+            return 'mutate'
+
+    func = call.func
+    if isinstance(func, ast.Name):
+        return 'pure' if func.id in _PURE_FUNCTIONS else 'mutate'
+
+    if isinstance(func, ast.Attribute):
+        base = func.value
+        while isinstance(base, ast.Attribute):
+            base = base.value
+        if isinstance(base, ast.Name) and base.id in _PURE_MODULES:
+            if func.attr in _MUTATING_FUNCTIONS:
+                return 'mutate'
+            return 'view' if func.attr in _VIEW_FUNCTIONS else 'pure'
+
+    return 'mutate'
+
+
+def _use(node):
+    """
+    How an expression holding (a view of) a variable is used.
+
+    Returns 'mutate' if the variable may be changed in place through it,
+    the names it is assigned to if it gets an alias, or None if it is only
+    read. Uses that cannot be followed (e.g. storing the array in a list or
+    passing it to a function that is not a numpy function) count as changes.
+    """
+
+    while True:
+        parent = node.parent
+
+        if isinstance(parent, ast.Subscript):
+            if parent.value is not node:
+                # Used as an index
+                return None
+            if not isinstance(parent.ctx, ast.Load):
+                return 'mutate'
+            node = parent
+
+        elif isinstance(parent, ast.Attribute):
+            if not isinstance(parent.ctx, ast.Load) or parent.attr in _MUTATING_METHODS:
+                return 'mutate'
+            if parent.attr not in _VIEW_ATTRIBUTES:
+                # e.g. .shape, .sum() or .copy()
+                return None
+            call = parent.parent
+            node = call if isinstance(call, ast.Call) and call.func is parent else parent
+
+        elif isinstance(parent, ast.Call):
+            # An argument other than out is not written by out=
+            kind = _call_kind(parent, out=False)
+            if parent.func is node:
+                return None
+            if _writes_argument(parent, node):
+                return 'mutate'
+            if kind == 'view' and parent.args and parent.args[0] is node:
+                node = parent
+            else:
+                return None if kind != 'mutate' else 'mutate'
+
+        elif isinstance(parent, ast.keyword):
+            return None if _call_kind(parent.parent) != 'mutate' else 'mutate'
+
+        elif isinstance(parent, ast.Starred):
+            node = parent
+
+        elif isinstance(parent, ast.AugAssign):
+            return 'mutate' if parent.target is node else None
+
+        elif isinstance(parent, (ast.Assign, ast.AnnAssign, ast.NamedExpr)):
+            if parent.value is not node:
+                return None
+            targets = parent.targets if isinstance(parent, ast.Assign) else [parent.target]
+            if all(isinstance(target, ast.Name) for target in targets):
+                return [target.id for target in targets]
+            return 'mutate'
+
+        elif isinstance(parent, (ast.IfExp, ast.BoolOp)):
+            if isinstance(parent, ast.IfExp) and parent.test is node:
+                return None
+            node = parent
+
+        elif isinstance(parent, (ast.BinOp, ast.UnaryOp, ast.Compare, ast.JoinedStr,
+                                 ast.FormattedValue, ast.Expr, ast.If, ast.While, ast.Assert)):
+            return None
+
+        elif (isinstance(parent, ast.Tuple) and isinstance(parent.parent, ast.Subscript)
+              and parent.parent.slice is parent):
+            # Used as an index
+            return None
+
+        else:
+            return 'mutate'
+
+
+def _scope(node):
+    """ Function (or module) a node belongs to """
+
+    while not isinstance(node, _SCOPES + (ast.Module,)):
+        node = node.parent
+    return node
+
+
+@lru_cache(maxsize=None)
+def _mutated_names(module_name):
+    """ Keys of the variables a module and its imported modules may change in place """
+
+    mutated = set()
+    trees = _module_trees(module_name)
+    if _any_escapes(trees):
+        # Code the analysis cannot follow may change any variable
+        mutated.add(())
+
+    for tree in trees:
+
+        # Expressions taking a variable by key, e.g. data['MEWS'] or data[var]
+        uses = []
+        for node in ast.walk(tree):
+            key = _string_key(node)
+            if key is not None:
+                uses.append((node, {key}))
+            elif _is_dynamic(node):
+                uses.append((node, {_key_guard(node)}))
+        # Names read, and names changed by an augmented assignment (x += 1
+        # changes the array x aliases)
+        loads = [node for node in ast.walk(tree)
+                 if isinstance(node, ast.Name) and (isinstance(node.ctx, ast.Load)
+                                                    or isinstance(node.parent, ast.AugAssign))]
+
+        # Follow local names aliasing the variables until no alias is added
+        aliases = {}
+        changed = True
+        while changed:
+            changed = False
+            for node, keys in uses:
+                if isinstance(node, ast.Subscript) and not isinstance(node.ctx, ast.Load):
+                    # data['MEWS'] = ... replaces the variable, += changes it
+                    if isinstance(node.parent, ast.AugAssign):
+                        mutated.update(keys)
+                    continue
+
+                use = _use(node)
+                if use == 'mutate':
+                    mutated.update(keys)
+                elif use:
+                    scope = _scope(node)
+                    for name in use:
+                        known = aliases.setdefault((scope, name), set())
+                        if not keys <= known:
+                            known |= keys
+                            changed = True
+
+            uses = [(node, aliases[(_scope(node), node.id)]) for node in loads
+                    if (_scope(node), node.id) in aliases] + \
+                   [use for use in uses if not isinstance(use[0], ast.Name)]
+
+    return frozenset(mutated)
+
+
+def module_access(module_name, domain_name, domain):
+    """
+    Variables read and written by an FTT module.
+
+    Parameters
+    ----------
+    module_name: str
+        Python module with the solve function (e.g. SourceCode.Power.ftt_p_main)
+    domain_name: str
+        Domain of the module in VariableListing (e.g. FTT-P)
+    domain: dict of str
+        Domain of each variable
+
+    Returns
+    ----------
+    reads: set of str
+        Variables named in the module, or that a key that is not a string
+        constant may stand for
+    writes: set of str
+        Variables in the module's domain, assigned to by the module, or
+        that the module may change in place
+    """
+
+    names, assigned, dynamic = _source_names(module_name)
+
+    reads = _variables(names, domain) | _variables(dynamic, domain)
+    writes = {var for var in domain if domain[var] == domain_name}
+    writes |= _variables(assigned, domain) | module_mutations(module_name, domain)
+
+    return reads, writes
+
+
+def module_mutations(module_name, domain):
+    """
+    Variables an FTT module may change in place.
+
+    A variable may be changed in place if the module (or a SourceCode
+    module it imports) assigns to part of it, applies an augmented
+    assignment to it, or hands it (or a view or alias of it) to code that
+    is not known to leave it unchanged. Replacing a variable, as in
+    data['MEWS'] = ..., does not change the array it held.
+
+    Parameters
+    ----------
+    module_name: str
+        Python module with the solve function (e.g. SourceCode.Power.ftt_p_main)
+    domain: dict of str
+        Domain of each variable
+
+    Returns
+    ----------
+    mutated: set of str
+        Variables the module may change in place (for a key that is not a
+        string constant, all variables it may stand for, see _key_guard)
+    """
+
+    return _variables(_mutated_names(module_name), domain)
+
+
+def dependency_graph(modules, domain):
+    """
+    Modules each module has to wait for.
+
+    A module waits for every earlier module in the list that writes a
+    variable it reads or writes, or that reads a variable it writes.
+
+    Parameters
+    ----------
+    modules: list of tuples (str, str)
+        Domain name and Python module of each enabled module, in solve order
+    domain: dict of str
+        Domain of each variable
+
+    Returns
+    ----------
+    graph: dict of sets
+        Earlier modules (by domain name) each module depends on
+    writes: dict of sets
+        Variables written by each module
+    """
+
+    access = {name: module_access(module, name, domain) for name, module in modules}
+
+    graph = {}
+    for i, (name, _) in enumerate(modules):
+        reads, writes = access[name]
+        graph[name] = set()
+        for earlier, _ in modules[:i]:
+            earlier_reads, earlier_writes = access[earlier]
+            if earlier_writes & (reads | writes) or earlier_reads & writes:
+                graph[name].add(earlier)
+
+    writes = {name: access[name][1] for name in access}
+
+    return graph, writes
+
+
+def run_modules(solvers, graph, writes, variables, max_workers=None):
+    """
+    Solve the modules of a year in dependency order on a thread pool.
+
+    Parameters
+    ----------
+    solvers: dict of callables
+        Function solving each module, taking and returning the variables
+        (in solve order)
+    graph: dict of sets
+        Modules each module has to wait for, see dependency_graph
+    writes: dict of sets
+        Variables written by each module, see dependency_graph
+    variables: dictionary of numpy arrays
+        Variables shared by all modules
+    max_workers: int, optional
+        Number of threads (None lets the pool decide)
+
+    Returns
+    ----------
+    variables: dictionary of numpy arrays
+        Variables with the outputs of all modules
+    """
+
+    done = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = list(solvers)
+        while pending or running:
+
+            # Start every module whose dependencies are solved
+            for name in [name for name in pending if graph[name] <= done]:
+                running[executor.submit(solvers[name], variables)] = name
+                pending.remove(name)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                result = future.result()
+
+                # Merge outputs of modules that return a new dictionary
+                if result is not variables:
+                    for var in writes[name]:
+                        if var in result:
+                            variables[var] = dict.get(result, var)
+
+                done.add(name)
+
+    return variables
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+profiling.py
+=========================================
+Wall time and call counts of the modules and kernels of a model run.
+
+Timers are nested: each timer is recorded under the stack of timers
+running when it starts, e.g. ('S0', '2020', 'FTT-P', 'get_lcoe'). The
+scenario and year timers are started by ModelRun, the module timers by
+ModelRun.module_solver, and the kernels are wrapped with the timed
+decorator. Profiling is off by default; a disabled timer costs one check
+of a flag.
+
+Functions included:
+    - enable
+        Start recording timers
+    - disable
+        Stop recording timers
+    - timer
+        Context manager timing a block of code
+    - timed
+        Decorator timing every call of a function
+    - current_stack
+        Stack of timers running in this thread
+    - collect
+        Records of the timers, cleared afterwards
+    - merge
+        Add records (e.g. from a worker process)
+    - records_to_json
+        Write the records as JSON
+    - records_to_folded
+        Write the records as folded stacks for flame graphs
+
+"""
+
+# Standard library imports
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+
+# Recording state: flag, records by stack ([calls, seconds]) and the timer
+# stack of each thread
+_enabled = False
+_records = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable():
+    """ Start recording timers. """
+
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """ Stop recording timers. """
+
+    global _enabled
+    _enabled = False
+
+
+def current_stack():
+    """ Stack of timers running in this thread, as a tuple of names. """
+
+    return tuple(getattr(_local, 'stack', ()))
+
+
+@contextmanager
+def timer(name, stack=None):
+    """
+    Context manager timing a block of code.
+
+    Parameters
+    ----------
+    name: str
+        Name of the timer
+    stack: tuple of str, optional
+        Stack the timer runs under, for blocks that run on another thread
+        than the one that started the enclosing timers (see current_stack)
+    """
+
+    if not _enabled:
+        yield
+        return
+
+    outer = getattr(_local, 'stack', ())
+    key = (stack if stack is not None else outer) + (str(name),)
+    _local.stack = key
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.stack = outer
+        with _lock:
+            record = _records.setdefault(key, [0, 0.0])
+            record[0] += 1
+            record[1] += elapsed
+
+
+def timed(name=None):
+    """ Decorator timing every call of a function (named after the function by default). """
+
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with timer(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def collect():
+    """
+    Records of the timers, cleared afterwards.
+
+    Returns
+    ----------
+    records: dict of lists
+        Number of calls and total seconds of each stack of timers
+    """
+
+    with _lock:
+        records = {key: list(value) for key, value in _records.items()}
+        _records.clear()
+
+    return records
+
+
+def merge(records):
+    """ Add records (e.g. collected on a worker process). """
+
+    with _lock:
+        for key, (calls, seconds) in records.items():
+            record = _records.setdefault(key, [0, 0.0])
+            record[0] += calls
+            record[1] += seconds
+
+
+def _self_seconds(records):
+    """ Seconds of each stack not spent in the timers nested in it. """
+
+    self_seconds = {key: seconds for key, (calls, seconds) in records.items()}
+    for key, (calls, seconds) in records.items():
+        if key[:-1] in self_seconds:
+            self_seconds[key[:-1]] -= seconds
+
+    return {key: max(seconds, 0.0) for key, seconds in self_seconds.items()}
+
+
+def records_to_json(records, path):
+    """
+    Write the records as JSON.
+
+    Each entry has the stack of timer names, the number of calls, the
+    total seconds and the seconds not spent in nested timers.
+    """
+
+    self_seconds = _self_seconds(records)
+    entries = [{'stack': list(key), 'calls': calls, 'seconds': seconds,
+                'self_seconds': self_seconds[key]}
+               for key, (calls, seconds) in sorted(records.items())]
+
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=1)
+
+
+def records_to_folded(records, path):
+    """
+    Write the records as folded stacks for flame graphs.
+
+    One line per stack, 'S0;2020;FTT-P;get_lcoe <microseconds>', with the
+    time not spent in nested timers. The format is read by flamegraph.pl
+    and speedscope.
+    """
+
+    with open(path, 'w') as f:
+        for key, seconds in sorted(_self_seconds(records).items()):
+            f.write(f"{';'.join(key)} {round(seconds * 1e6)}\n")
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+result_cache.py
+=========================================
+Cache of solved scenarios, keyed on everything the solution depends on.
+
+The key of a scenario is a hash of its input arrays, the run settings that
+change the solution, the variable layout, the classification titles, the
+last historical year of each variable, and the source code of the model. A scenario with a stored result for its key is not solved again.
+Results are stored as uncompressed .npz files in Cache/Results. When the
+results take more than the size limit of the run, the least recently used
+are removed. The cache can be pruned or cleared from the command line:
+    python -m SourceCode.support.result_cache [--max-size GB | --clear]
+
+Functions included:
+    - source_fingerprint
+        Hash of the source code of the model
+    - input_hashes
+        Hash of each input array of a scenario
+    - result_key
+        Key of the result of a scenario
+    - load_result
+        Load a stored result
+    - store_result
+        Store the result of a scenario
+    - prune_results
+        Remove the least recently used results above a total size
+    - clear_results
+        Remove all stored results
+
+"""
+
+# Standard library imports
+import argparse
+from functools import lru_cache
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+
+# Third party imports
+import numpy as np
+
+
+# Folder with the stored results
+RESULTS_DIR = os.path.join('Cache', 'Results')
+
+
+@lru_cache(maxsize=None)
+def source_fingerprint():
+    """ Hash of the source code of the model (all .py files in SourceCode). """
+
+    source_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+    fingerprint = hashlib.sha1()
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith('.py'):
+                path = os.path.join(root, file)
+                fingerprint.update(os.path.relpath(path, source_dir).encode())
+                with open(path, 'rb') as f:
+                    fingerprint.update(f.read())
+
+    return fingerprint.hexdigest()
+
+
+def _array_hash(value):
+    value = np.ascontiguousarray(value)
+    array_hash = hashlib.sha1(f'{value.dtype.str}{value.shape}'.encode())
+    array_hash.update(memoryview(value).cast('B'))
+    return array_hash.hexdigest()
+
+
+def input_hashes(inputs, base=None, base_hashes=None):
+    """
+    Hash of each input array of a scenario.
+
+    Parameters
+    ----------
+    inputs: dictionary of numpy arrays
+        Inputs of the scenario
+    base: dictionary of numpy arrays, optional
+        Inputs of the baseline. Arrays that are views of the baseline's
+        arrays (e.g. the variables a scenario overlay does not override)
+        reuse the baseline's hash.
+    base_hashes: dictionary of str, optional
+        Hash of each baseline input, see input_hashes
+
+    Returns
+    ----------
+    hashes: dictionary of str
+        Hash of each variable
+    """
+
+    hashes = {}
+    for var in inputs:
+        value = inputs[var]
+        if (base_hashes is not None and var in base_hashes
+                and value.shape == base[var].shape
+                and np.may_share_memory(value, base[var])):
+            hashes[var] = base_hashes[var]
+        else:
+            hashes[var] = _array_hash(value)
+
+    return hashes
+
+
+def result_key(hashes, settings):
+    """
+    Key of the result of a scenario.
+
+    Parameters
+    ----------
+    hashes: dictionary of str
+        Hash of each input array of the scenario
+    settings: dict
+        Run settings that change the solution (must be JSON serialisable)
+    """
+
+    key = json.dumps({'inputs': hashes,
+                      'settings': settings,
+                      'source': source_fingerprint()}, sort_keys=True)
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def load_result(key):
+    """ Load a stored result, or None if there is none for the key. """
+
+    path = os.path.join(RESULTS_DIR, f'{key}.npz')
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with np.load(path) as result:
+            output = {var: result[var] for var in result.files}
+        # Mark the result as used, for prune_results
+        os.utime(path)
+        return output
+    except (OSError, ValueError) as e:
+        warnings.warn(f'Could not read stored result {key}: {e}')
+        return None
+
+
+def store_result(key, output):
+    """ Store the result of a scenario. """
+
+    path = os.path.join(RESULTS_DIR, f'{key}.npz')
+    tmp_path = None
+    try:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        # Temporary file unique to this writer, so concurrent runs do not clash
+        fd, tmp_path = tempfile.mkstemp(dir=RESULTS_DIR, prefix=f'{key}.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **output)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        warnings.warn(f'Could not store result {key}: {e}')
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _stored_results():
+    """ Path, size and last use of each stored result, least recently used first. """
+
+    if not os.path.isdir(RESULTS_DIR):
+        return []
+
+    results = []
+    for file in os.listdir(RESULTS_DIR):
+        if file.endswith('.npz'):
+            path = os.path.join(RESULTS_DIR, file)
+            stat = os.stat(path)
+            results.append((stat.st_mtime, stat.st_size, path))
+
+    return sorted(results)
+
+
+def prune_results(max_bytes):
+    """
+    Remove the least recently used results above a total size.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Largest total size of the stored results, in bytes
+
+    Returns
+    ----------
+    removed: int
+        Number of results removed
+    """
+
+    results = _stored_results()
+    total = sum(size for _, size, _ in results)
+
+    removed = 0
+    for _, size, path in results:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # For example a result another run is reading
+            continue
+        total -= size
+        removed += 1
+
+    return removed
+
+
+def clear_results():
+    """ Remove all stored results, returning the number removed. """
+
+    return prune_results(0)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Prune or clear the stored results')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--max-size', type=float, help='largest total size kept, in GB')
+    group.add_argument('--clear', action='store_true', help='remove all stored results')
+    args = parser.parse_args()
+
+    if args.clear:
+        removed = clear_results()
+    else:
+        removed = prune_results(int(args.max_size * 1024**3))
+    print(f'Removed {removed} stored results')
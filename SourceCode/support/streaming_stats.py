@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+streaming_stats.py
+=========================================
+Summary statistics of arrays that arrive one at a time.
+
+Used to summarise many model runs (e.g. Monte Carlo draws) without keeping
+the output of every run. The mean and standard deviation are exact
+(Welford's algorithm). Percentiles are estimated with the P-square
+algorithm (Jain and Chlamtac, 1985), which keeps five markers per element
+and percentile; they are exact for the first five runs.
+
+Classes included:
+    - P2Quantile
+        Streaming estimate of a percentile of every element of an array
+    - RunningSummary
+        Mean, standard deviation and percentiles of every element
+
+"""
+
+# Third party imports
+import numpy as np
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a percentile of every element of an array.
+
+    Attributes
+    -----------
+    p: float
+        Quantile to estimate (between 0 and 1)
+    count: int
+        Number of arrays added
+    """
+
+    def __init__(self, p, shape):
+        """ Instantiate P2Quantile for arrays of the given shape. """
+
+        self.p = p
+        self.count = 0
+        self._first = []
+        self._q = np.zeros((5,) + tuple(shape))
+        self._n = np.zeros((5,) + tuple(shape))
+        self._desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self._increment = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, x):
+        """ Add an array to the estimate. """
+
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+
+        # The markers start from the first five values
+        if self.count <= 5:
+            self._first.append(x)
+            if self.count == 5:
+                self._q = np.sort(np.stack(self._first), axis=0)
+                self._n = np.broadcast_to(np.arange(5.0).reshape((5,) + (1,) * x.ndim),
+                                          self._q.shape).copy()
+                self._first = []
+            return
+
+        q, n = self._q, self._n
+
+        # Extend the extreme markers and find the cell of each new value
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        cell = (x >= q[1]).astype(int) + (x >= q[2]) + (x >= q[3])
+        for i in range(1, 5):
+            n[i] += cell < i
+        self._desired = self._desired + self._increment
+
+        # Adjust the three middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            move = (((d >= 1) & (n[i + 1] - n[i] > 1))
+                    | ((d <= -1) & (n[i - 1] - n[i] < -1)))
+            if not move.any():
+                continue
+            step = np.sign(d)
+
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            neighbour_q = np.where(step > 0, q[i + 1], q[i - 1])
+            neighbour_n = np.where(step > 0, n[i + 1], n[i - 1])
+            linear = q[i] + step * (neighbour_q - q[i]) / (neighbour_n - n[i])
+            new = np.where((q[i - 1] < parabolic) & (parabolic < q[i + 1]), parabolic, linear)
+
+            q[i] = np.where(move, new, q[i])
+            n[i] = np.where(move, n[i] + step, n[i])
+
+    def result(self):
+        """ Current estimate of the percentile. """
+
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            return np.quantile(np.stack(self._first), self.p, axis=0)
+        if self.count == 5:
+            # The markers are still the five values, sorted
+            return np.quantile(self._q, self.p, axis=0)
+
+        return self._q[2].copy()
+
+
+class RunningSummary:
+    """
+    Mean, standard deviation and percentiles of every element of an array.
+
+    Attributes
+    -----------
+    count: int
+        Number of arrays added
+    percentiles: tuple of float
+        Percentiles estimated (between 0 and 100)
+    """
+
+    def __init__(self, shape, percentiles=(5, 50, 95)):
+        """ Instantiate RunningSummary for arrays of the given shape. """
+
+        self.count = 0
+        self.percentiles = tuple(percentiles)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self._quantiles = {p: P2Quantile(p / 100, shape) for p in self.percentiles}
+
+    def add(self, x):
+        """ Add an array to the summary. """
+
+        self.count += 1
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        for quantile in self._quantiles.values():
+            quantile.add(x)
+
+    def result(self):
+        """
+        Summary of the arrays added so far.
+
+        Returns
+        ----------
+        summary: dict of numpy arrays
+            'mean', 'std' (sample standard deviation) and 'p<percentile>'
+        """
+
+        std = np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.zeros_like(self._mean)
+        summary = {'mean': self._mean.copy(), 'std': std}
+        for p, quantile in self._quantiles.items():
+            summary[f'p{p:g}'] = quantile.result()
+
+        return summary
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+synthetic_inputs.py
+=========================================
+Synthetic model inputs with the dimensions of VariableListing.
+
+Every variable gets an array with the shape given by its classifications,
+filled with positive random values. Variables the modules rely on for
+their structure get values in a plausible range: the columns of the cost
+matrices by their title (lifetimes, lead times, discount rates, standard
+deviations, ...), the cost-supply curves of FTT-P are increasing, the
+last years of historical data are the history ends of VariableListing,
+shares sum to one over the technologies, regulations and exogenous
+capacity additions are switched off, gamma values are zero and scalars
+(e.g. the number of iterations noit) are one. The values are not
+calibrated; they are for timing and testing the model at any size, not
+for results.
+
+The size of any classification can be changed (e.g. more regions for
+sub-national resolution, or more technologies): new entries repeat the
+existing titles with a number. write_run_folder writes a folder the
+model can be run from, with the resized titles workbook, VariableListing,
+settings.ini and an Inputs/<scenario>/<module> tree of csv files in the
+layouts load_data reads. Run from the command line as
+    python -m SourceCode.support.synthetic_inputs <folder> --size RTI=142 --size T2TI=48
+
+Functions included:
+    - synthetic_inputs
+        Synthetic input arrays of all variables of the enabled modules
+    - resize_titles
+        Classification titles with some classifications resized
+    - csv_frames
+        Input csv files of a variable, in the layout load_data reads
+    - write_run_folder
+        Write a folder with synthetic inputs the model can be run from
+
+"""
+
+# Standard library imports
+import argparse
+import configparser
+import os
+import shutil
+
+# Third party imports
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Local library imports
+from SourceCode.support.dimensions_functions import dims_path, load_dims, module_variables
+from SourceCode.support.titles_functions import dir_root, gamma_codes, load_titles, titles_path
+
+
+# Range of the cost matrix columns, by a keyword of the column title
+# (checked in this order, case insensitive)
+COST_COLUMN_RANGES = [
+    ('std', (0.05, 0.2)),
+    (' sd', (0.05, 0.2)),
+    ('lifetime', (15, 30)),
+    ('lead', (1, 3)),
+    ('discount', (0.05, 0.1)),
+    ('learning', (-0.3, -0.1)),
+    (' lr', (-0.3, -0.1)),
+    ('efficiency', (0.3, 0.9)),
+    ('load factor', (0.2, 0.9)),
+    ('capacity factor', (0.2, 0.9)),
+    ('turnover', (0.03, 0.1)),
+    ('0 or 1', (0, 1)),
+    ('type', (0, 3)),
+    ('gam', (0, 0)),
+]
+
+# Variables holding the last year of historical data, and the variable with
+# that year as its history end
+YEAR_VARIABLES = {'TDA1': 'TEWS', 'TDA2': 'TEWS'}
+
+# Policy variables and their value when switched off: regulations (-1 is
+# no regulation) and exogenous capacity additions
+POLICY_VARIABLES = {'MEWR': -1.0, 'HREG': -1.0, 'TREG': -1.0, 'ZREG': -1.0,
+                    'IRG1': -1.0, 'IRG2': -1.0, 'IRG3': -1.0, 'IRG4': -1.0, 'IRG5': -1.0,
+                    'MWKA': -1.0, 'HWSA': 0.0, 'TWSA': 0.0, 'ZWSA': 0.0}
+
+# Share variables of each module, which sum to one over the technologies
+SHARE_VARIABLES = ('MEWS', 'HEWS', 'TEWS', 'ZEWS', 'IWS1', 'IWS2', 'IWS3', 'IWS4', 'IWS5')
+
+
+def _cost_supply_curves(shape, rng):
+    """ Cost-supply curves (MCSC): type, minimum, maximum, number of points, curve. """
+
+    curves = np.empty(shape)
+    points = shape[2] - 4
+    curves[:, :, 0] = rng.integers(0, 4, (1, shape[1], 1))
+    curves[:, :, 1] = rng.uniform(1, 10, (1, shape[1], 1))
+    curves[:, :, 2] = curves[:, :, 1] * rng.uniform(2, 10, (1, shape[1], 1))
+    curves[:, :, 3] = points
+    curves[:, :, 4:] = np.sort(rng.uniform(0.5, 1.5, shape[:2] + (points,) + shape[3:]), axis=2)
+
+    return curves
+
+
+def _cost_column(title, rng, shape):
+    name = f' {title}'.lower()
+    for keyword, (low, high) in COST_COLUMN_RANGES:
+        if keyword in name:
+            values = rng.uniform(low, high, shape)
+            return np.round(values) if keyword in ('lifetime', 'lead', '0 or 1', 'type') else values
+
+    return rng.uniform(10, 100, shape)
+
+
+def synthetic_inputs(titles, dims, timeline, histend=None, ftt_modules=None, domain=None,
+                     seed=0):
+    """
+    Synthetic input arrays of all variables of the enabled modules.
+
+    Parameters
+    ----------
+    titles: dictionary of lists
+        Classification titles (the sizes of the arrays)
+    dims: dict of VariableMeta
+        Variable classifications, with the array shapes for the timeline
+    timeline: list of int
+        Years of the TIME classification
+    histend: dict of int, optional
+        Last year of historical data of each variable (by default the
+        middle of the timeline, for the variables holding that year)
+    ftt_modules: str, optional
+        Enabled modules (as in settings.ini); by default all variables
+    domain: dict of str, optional
+        Domain of each variable, needed with ftt_modules
+    seed: int
+        Seed of the random values
+
+    Returns
+    ----------
+    inputs: dictionary of numpy arrays
+        Array of each variable, with a TIME dimension of len(timeline)
+        where the variable has one
+    """
+
+    rng = np.random.default_rng(seed)
+    if ftt_modules is None:
+        variables = list(dims)
+    else:
+        variables = sorted(module_variables(domain, ftt_modules))
+    gammas = set(gamma_codes().values())
+
+    inputs = {}
+    for var in variables:
+        meta = dims[var]
+        shape = meta.shape
+        if shape is None:
+            continue
+
+        if var in gammas:
+            value = np.zeros(shape)
+        elif var in POLICY_VARIABLES:
+            value = np.full(shape, POLICY_VARIABLES[var])
+        elif var in YEAR_VARIABLES:
+            year = (histend or {}).get(YEAR_VARIABLES[var]) or timeline[len(timeline) // 2]
+            value = np.full(shape, float(year))
+        elif var == 'MCSC':
+            value = _cost_supply_curves(shape, rng)
+        elif np.prod(shape) == 1:
+            value = np.ones(shape)
+        elif meta[2].startswith('C') and meta[2] in titles and meta[3] != 'TIME':
+            # Cost matrix: columns by their title, the same in every region
+            value = np.empty(shape)
+            for c, title in enumerate(titles[meta[2]]):
+                value[:, :, c, :] = _cost_column(title, rng, (1, shape[1], 1))
+        else:
+            value = rng.uniform(0.5, 1.5, shape)
+
+        if var in SHARE_VARIABLES:
+            value /= value.sum(axis=1, keepdims=True)
+
+        inputs[var] = value
+
+    return inputs
+
+
+def resize_titles(titles, sizes):
+    """
+    Classification titles with some classifications resized.
+
+    A classification is cut to its first entries, or extended by repeating
+    its titles with a number (e.g. region BE gives BE2, BE3, ...; full
+    name "1 Nuclear" gives "1 Nuclear 2", ...).
+
+    Parameters
+    ----------
+    titles: dictionary of lists
+        Classification titles (full names, and short names under
+        <classification>_short)
+    sizes: dict of int
+        Number of entries of each resized classification
+
+    Returns
+    ----------
+    resized: dictionary of lists
+        Titles with the resized classifications
+    """
+
+    resized = dict(titles)
+    for code, size in sizes.items():
+        for key in (code, f'{code}_short'):
+            names = list(titles[key])
+            resized[key] = tuple(names[i] if i < len(names)
+                                 else f'{names[i % len(names)]}'
+                                      f'{"" if key.endswith("_short") else " "}'
+                                      f'{i // len(names) + 1}'
+                                 for i in range(size))
+
+    return resized
+
+
+def _write_titles(path, titles, sizes):
+    """ Copy of the titles workbook, with the resized classifications. """
+
+    workbook = load_workbook(titles_path)
+    for code in sizes:
+        sheet = workbook[code]
+        header = [cell.value for cell in sheet[1]]
+        sheet.delete_rows(2, sheet.max_row)
+        for row, (full, short) in enumerate(zip(titles[code], titles[f'{code}_short']), 2):
+            sheet.cell(row, header.index('Full name') + 1, full)
+            sheet.cell(row, header.index('Short name') + 1, short)
+    workbook.save(path)
+
+
+def _years(var, array, timeline, forstart):
+    """ Columns from the forecast start of a variable, as load_data reads them. """
+
+    years = list(range(int(forstart[var]), timeline[-1] + 1))
+    index = np.clip(np.searchsorted(timeline, years), 0, len(timeline) - 1)
+    return years, array[..., index]
+
+
+def csv_frames(var, array, meta, titles, timeline, forstart):
+    """
+    Input csv files of a variable, in the layout load_data reads.
+
+    Variables with regions and a second dimension, and either a third
+    dimension or time, have a file for each region (e.g. MEWG_BE.csv) with
+    a row for each entry of the second dimension. All other variables have
+    a single file. Variables load_data cannot read from csv files (with
+    both a third dimension and time, or time without a forecast start)
+    give no files.
+
+    Parameters
+    ----------
+    var: str
+        Variable name
+    array: numpy array
+        4D array of the variable
+    meta: VariableMeta
+        Classifications of the variable
+    titles: dictionary of lists
+        Classification titles
+    timeline: list of int
+        Years of the TIME dimension of the array
+    forstart: dict of int
+        First forecast year of each variable (the first year column of the
+        files of time series)
+
+    Returns
+    ----------
+    frames: dict of DataFrames
+        Contents of each csv file, by file name
+    """
+
+    def names(dim):
+        return [str(name) for name in titles[meta[dim]]]
+
+    time = meta[3] == 'TIME'
+    shape = array.shape
+    if time and (shape[2] > 1 or forstart.get(var) is None):
+        return {}
+
+    if time:
+        years, array = _years(var, array, timeline, forstart)
+
+    # A file for each region
+    if meta[0] == 'RTI' and shape[1] > 1 and (shape[2] > 1 or time):
+        columns = years if time else names(2)
+        values = array[:, :, 0, :] if time else array[:, :, :, 0]
+        return {f'{var}_{region}.csv': pd.DataFrame(values[r], index=names(1), columns=columns)
+                for r, region in enumerate(titles['RTI_short'])}
+
+    # A single file
+    if meta[0] == 'RTI' or shape[0] > 1:
+        index = names(0)
+        if time:
+            frame = pd.DataFrame(array[:, 0, 0, :], index=index, columns=years)
+        elif shape[1] > 1:
+            frame = pd.DataFrame(array[:, :, 0, 0], index=index, columns=names(1))
+        else:
+            frame = pd.DataFrame(array[:, 0, 0, 0], index=index, columns=[var])
+    elif time:
+        frame = pd.DataFrame(array[0, :, 0, :], index=names(1), columns=years)
+    elif shape[2] > 1:
+        frame = pd.DataFrame(array[0, :, :, 0], index=names(1), columns=names(2))
+    elif shape[1] == 1:
+        frame = pd.DataFrame(array[0, :, :, 0], index=names(1), columns=[var])
+    else:
+        # A second dimension only is not read by load_data
+        return {}
+
+    return {f'{var}.csv': frame}
+
+
+def write_run_folder(folder, sizes=None, ftt_modules='FTT-P', start=2010, end=2050,
+                     scenario='S0', seed=0):
+    """
+    Write a folder with synthetic inputs the model can be run from.
+
+    The folder gets the titles workbook with the resized classifications
+    and VariableListing (in Utilities/titles), settings.ini for the modules
+    and years, and the csv files of all input variables of the modules in
+    Inputs/<scenario>/<domain>. Run the model with the folder as working
+    directory.
+
+    Parameters
+    ----------
+    folder: str
+        Folder written (created if needed)
+    sizes: dict of int, optional
+        Number of entries of each resized classification, e.g.
+        {'RTI': 142, 'T2TI': 48}
+    ftt_modules: str
+        Enabled modules (as in settings.ini)
+    start, end: int
+        First and last year of the timeline
+    scenario: str
+        Scenario of the inputs
+    seed: int
+        Seed of the random values
+
+    Returns
+    ----------
+    files: int
+        Number of csv files written
+    """
+
+    sizes = sizes or {}
+    timeline = list(range(start, end + 1))
+    titles_dir = os.path.join(folder, 'Utilities', 'titles')
+    os.makedirs(titles_dir, exist_ok=True)
+
+    # Titles and dimensions of the resized classifications
+    titles = resize_titles(load_titles(), sizes)
+    _write_titles(os.path.join(titles_dir, os.path.basename(titles_path)), titles, sizes)
+    shutil.copy(os.path.join(dir_root, dims_path), titles_dir)
+    dims, histend, domain, forstart = load_dims(titles, timeline)
+
+    # Settings of the repository, for these modules and years
+    config = configparser.ConfigParser()
+    config.read(os.path.join(dir_root, 'settings.ini'))
+    config['settings'].update({'enable_modules': ftt_modules, 'scenarios': scenario,
+                               'model_start': str(start), 'model_end': str(end),
+                               'simulation_start': str(start), 'simulation_end': str(end)})
+    with open(os.path.join(folder, 'settings.ini'), 'w') as f:
+        config.write(f)
+
+    inputs = synthetic_inputs(titles, dims, timeline, histend, ftt_modules, domain, seed)
+    files = 0
+    for var, array in inputs.items():
+        directory = os.path.join(folder, 'Inputs', scenario, domain[var])
+        os.makedirs(directory, exist_ok=True)
+        for file, frame in csv_frames(var, array, dims[var], titles, timeline, forstart).items():
+            frame.to_csv(os.path.join(directory, file))
+            files += 1
+
+    return files
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Write a folder with synthetic inputs')
+    parser.add_argument('folder', help='folder written')
+    parser.add_argument('--size', action='append', default=[],
+                        help='classification and number of entries, e.g. RTI=142')
+    parser.add_argument('--modules', default='FTT-P', help='enabled modules, comma separated')
+    parser.add_argument('--start', type=int, default=2010)
+    parser.add_argument('--end', type=int, default=2050)
+    parser.add_argument('--scenario', default='S0')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = {code: int(size) for code, size in (item.split('=') for item in args.size)}
+    files = write_run_folder(args.folder, sizes, args.modules, args.start, args.end,
+                             args.scenario, args.seed)
+    print(f'{files} csv files written to {args.folder}')
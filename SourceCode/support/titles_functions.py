@@ -5,37 +5,118 @@ titles_functions.py
 =========================================
 Functions to load classification titles.
 
+The classification titles workbook is compiled once into a pickle in
+Cache/titles, which is rebuilt when the workbook's modification time or
+size changes. Within a process the compiled titles are kept in memory.
+Like VariableListing and the inputs, the workbook of the run folder (the
+working directory) is used where it has one, e.g. the resized titles of a
+folder of synthetic inputs.
+
 Functions included in the file:
     - load_titles
         Load model classifications and titles
+    - load_title_sheets
+        Load the sheets of the classification titles workbook as DataFrames
+    - title_index
+        Map from title to position in a classification
+    - gamma_codes
+        Gamma variable of each FTT module
+    - workbook_path
+        Classification titles workbook of the run folder
+    - compile_titles
+        Read the classification titles workbook
 """
 
 # Standard library imports
+from functools import lru_cache
 import os
+import pickle
+import tempfile
+import warnings
 
 
 # Third party imports
-from openpyxl import load_workbook
 from pathlib import Path
+import pandas as pd
+
+
+# Ensure we're using consistent relative paths
+dir_file = os.path.dirname(os.path.realpath(__file__))
+dir_root = Path(dir_file).parents[1]
+
+# Declare file name
+titles_file = 'classification_titles.xlsx'
+titles_path = os.path.join(dir_root, 'Utilities', 'titles', titles_file)
+cache_path = os.path.join(dir_root, 'Cache', 'titles', titles_file[:-5] + '.pickle')
 
 
 def load_titles():
-    # Ensure we're using consistent relative paths
-    dir_file = os.path.dirname(os.path.realpath(__file__))
-    dir_root = Path(dir_file).parents[1] 
-   
-    
     """ Load model classifications and titles. """
 
-    # Declare file name
-    titles_file = 'classification_titles.xlsx'
+    titles_dict = _compiled_titles()['titles']
+
+    # Return a copy, as callers add classifications (e.g. TIME)
+    return dict(titles_dict)
+
+
+def load_title_sheets(index_col=None):
+    """
+    Load the sheets of the classification titles workbook as DataFrames.
+
+    Equivalent to pd.read_excel(titles_path, sheet_name=None,
+    index_col=index_col), without reading the workbook.
+    """
+
+    sheets = _compiled_titles()['sheets']
+    if index_col is None:
+        return {sheet: df.copy() for sheet, df in sheets.items()}
+
+    return {sheet: df.set_index(df.columns[index_col]) for sheet, df in sheets.items()}
+
+
+def title_index(titles, classification):
+    """
+    Map from title to position in a classification, e.g. titles['C2TI'].
+
+    The map is built once per classification. It is shared between callers,
+    so it must not be changed.
+    """
+
+    return _index_map(tuple(titles[classification]))
+
+
+@lru_cache(maxsize=None)
+def _index_map(names):
+    return {category: index for index, category in enumerate(names)}
+
+
+def gamma_codes():
+    """ Gamma variable of each FTT module (e.g. MGAM for FTT-P), from the Models sheet. """
+
+    models = _compiled_titles()['sheets']['Models']
+
+    return dict(zip(models['Short name'], models['Gamma_Value']))
+
+
+def compile_titles():
+    """
+    Read the classification titles workbook.
+
+    Returns
+    ----------
+    compiled: dict
+        Titles dictionary ('titles') and DataFrames of all sheets ('sheets')
+    """
+
+    path = workbook_path()
 
     # Check that classification titles workbook exists
-    titles_path = os.path.join(dir_root, 'Utilities', 'titles', titles_file)
-    if not os.path.isfile(titles_path):
+    if not os.path.isfile(path):
         print('Classification titles file not found.')
 
-    titles_wb = load_workbook(titles_path)
+    # openpyxl is only needed when the compiled titles are out of date
+    from openpyxl import load_workbook
+    titles_wb = load_workbook(path)
     sheet_names = titles_wb.sheetnames
     sheet_names.remove('Cover')
 
@@ -51,5 +132,58 @@ def load_titles():
             if column_values[0] == 'Short name': # First row
                 titles_dict[f'{sheet}_short'] = column_values[1:]
 
-    # Return titles dictionary
-    return titles_dict
+    sheets = pd.read_excel(path, sheet_name=None)
+
+    return {'titles': titles_dict, 'sheets': sheets}
+
+
+def workbook_path():
+    """ Classification titles workbook of the run folder, else of the repository. """
+
+    local = os.path.join('Utilities', 'titles', titles_file)
+    return local if os.path.isfile(local) else titles_path
+
+
+def _workbook_state():
+    path = os.path.abspath(workbook_path())
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+_compiled = {}
+
+
+def _compiled_titles():
+    """ Compiled titles, from memory, the cache or the workbook. """
+
+    state = _workbook_state()
+    if _compiled.get('state') == state:
+        return _compiled
+
+    compiled = None
+    if os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                compiled = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            compiled = None
+        if compiled is not None and compiled.get('state') != state:
+            compiled = None
+
+    if compiled is None:
+        compiled = compile_titles()
+        compiled['state'] = state
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # A temporary file of its own, as other runs may update the cache too
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(compiled, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            warnings.warn(f'Could not update the titles cache: {e}')
+
+    _compiled.clear()
+    _compiled.update(compiled)
+
+    return _compiled
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+sweep.py
+=========================================
+Sweep of model runs over a manifest of run definitions.
+
+Each run of the manifest is settings.ini with its own settings, e.g. other
+enabled modules, scenarios or end year. Titles, dimensions and inputs are
+loaded once, for all modules and scenarios of the manifest up to its last
+end year, and the runs are solved on a process pool. The inputs are
+written once to .npy files that every worker process memory-maps
+read-only, so the workers share the pages of one copy of the inputs
+(with any start method, e.g. spawn on Windows) instead of each receiving
+a pickled copy. Each run solves on read-only views of the shared input
+arrays, restricted to the variables, scenarios and years it would have
+loaded itself, so the inputs are not read or copied again for every run.
+The results of a run are written to its output folder (by default
+Output/Sweep/<name>), as batch_run does.
+
+The manifest is a json file with a list of runs, each a dictionary of
+settings with a unique name, and optionally settings common to all runs:
+    {"settings": {"scenarios": "S0"},
+     "runs": [{"name": "power", "enable_modules": "FTT-P", "simulation_end": 2040},
+              {"name": "power_heat", "enable_modules": ["FTT-P", "FTT-H"]}]}
+All runs start in the same year. Run from the command line as
+    python -m SourceCode.sweep <manifest> [--workers 8]
+
+Functions included:
+    - read_manifest
+        Settings of each run of a manifest
+    - load_shared_run
+        Load the inputs of all runs of a sweep
+    - share_inputs
+        Write the inputs of a sweep to files the workers memory-map
+    - map_inputs
+        Read-only memory maps of the inputs written by share_inputs
+    - select_inputs
+        Read-only views of the inputs used by one run
+    - prepare_run
+        Model run of one run definition on the shared inputs
+    - run_sweep
+        Solve the runs of a manifest on a process pool
+
+"""
+
+# Standard library imports
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import copy
+import json
+import os
+import tempfile
+import time
+import warnings
+
+# Third party imports
+import numpy as np
+from tqdm import tqdm
+
+# Local library imports
+from SourceCode.model_class import FTT_MODULES, ModelRun, read_settings
+from SourceCode.batch_run import save_results
+import SourceCode.support.dimensions_functions as dims_f
+from SourceCode.support.cross_section import read_only_view
+from SourceCode.support.input_cache import CACHE_DIR
+from SourceCode.support.input_functions import ScenarioOverlay, list_csv_files
+
+
+def _names(value):
+    """ Comma-separated setting as a list of names """
+
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value if name.strip()]
+
+
+def read_manifest(path, settings='settings.ini', output='Output/Sweep'):
+    """
+    Settings of each run of a manifest.
+
+    Parameters
+    ----------
+    path: str
+        Manifest (json) of the sweep
+    settings: str
+        Settings file the runs start from (only read)
+    output: str
+        Folder of the run output folders not given in the manifest
+
+    Returns
+    ----------
+    configs: dict of configparser.ConfigParser
+        Settings of each run, by name
+    """
+
+    with open(path) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'runs': manifest}
+
+    configs = {}
+    for definition in manifest['runs']:
+        overrides = dict(manifest.get('settings', {}), **definition)
+        if 'name' not in overrides:
+            raise ValueError(f'Run {definition} of {path} has no name')
+        name = overrides['name']
+        if name in configs:
+            raise ValueError(f'Run name {name} appears more than once in {path}')
+
+        # Lists of modules or scenarios are written as in settings.ini
+        overrides = {key: ', '.join(map(str, value)) if isinstance(value, list) else value
+                     for key, value in overrides.items()}
+        if 'simulation_end' in overrides and 'model_end' not in overrides:
+            overrides['model_end'] = overrides['simulation_end']
+        overrides.setdefault('output_dir', os.path.join(output, str(name)))
+
+        configs[name] = read_settings(settings, overrides)
+
+    return configs
+
+
+def load_shared_run(configs, settings='settings.ini'):
+    """
+    Load the inputs of all runs of a sweep.
+
+    Parameters
+    ----------
+    configs: dict of configparser.ConfigParser
+        Settings of each run, see read_manifest
+    settings: str
+        Settings file the runs start from (only read)
+
+    Returns
+    ----------
+    shared: ModelRun
+        Model run with the modules and scenarios of all runs, up to the
+        last end year
+    """
+
+    runs = [dict(config['settings']) for config in configs.values()]
+
+    starts = {int(run['simulation_start']) for run in runs}
+    if len(starts) > 1:
+        raise ValueError(f'The runs of a sweep start in the same year, not in {sorted(starts)}')
+
+    modules = {name for run in runs for name in _names(run['enable_modules'])}
+    scenarios = {name for run in runs for name in _names(run['scenarios'])}
+    end = max(int(run['simulation_end']) for run in runs)
+
+    shared = ModelRun(read_settings(settings, {
+        'name': 'Sweep',
+        'simulation_start': starts.pop(),
+        'simulation_end': end,
+        'model_end': max(end, max(int(run['model_end']) for run in runs)),
+        'enable_modules': ', '.join([name for name in FTT_MODULES if name in modules]
+                                    + sorted(modules - set(FTT_MODULES))),
+        'scenarios': ', '.join(['S0'] + sorted(scenarios - {'S0'}))}))
+
+    # Variables of other domains with a csv file in a module folder (load_data
+    # loads them for the runs enabling the module)
+    shared.folder_variables = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for module in _names(shared.ftt_modules) + ['General']:
+            shared.folder_variables[module] = {
+                file[:-4].split('_')[0]
+                for scen in shared.input
+                for file in list_csv_files(os.path.join('Inputs', scen, module), shared.dims)}
+
+    return shared
+
+
+def share_inputs(inputs, folder):
+    """
+    Write the inputs of a sweep to files the workers memory-map.
+
+    Parameters
+    ----------
+    inputs: dictionary of dicts
+        Inputs of each scenario (S0 a dict, the others ScenarioOverlays)
+    folder: str
+        Folder the .npy files are written to
+
+    Returns
+    ----------
+    files: dictionary of dicts
+        File of each array by scenario (of the overrides of the
+        ScenarioOverlays), see map_inputs
+    """
+
+    files = {}
+    for scen, scen_inputs in inputs.items():
+        arrays = scen_inputs.overrides if isinstance(scen_inputs, ScenarioOverlay) else scen_inputs
+        os.makedirs(os.path.join(folder, scen), exist_ok=True)
+
+        files[scen] = {}
+        for var, value in arrays.items():
+            files[scen][var] = os.path.join(folder, scen, f'{var}.npy')
+            np.save(files[scen][var], value)
+
+    return files
+
+
+def map_inputs(files):
+    """
+    Read-only memory maps of the inputs written by share_inputs.
+
+    Parameters
+    ----------
+    files: dictionary of dicts
+        File of each array by scenario, see share_inputs
+
+    Returns
+    ----------
+    inputs: dictionary of dicts
+        Inputs of each scenario (S0 a dict, the others ScenarioOverlays
+        on it)
+    """
+
+    def load(scen):
+        return {var: np.load(path, mmap_mode='r').view(np.ndarray)
+                for var, path in files[scen].items()}
+
+    inputs = {'S0': load('S0')}
+    for scen in files:
+        if scen != 'S0':
+            inputs[scen] = ScenarioOverlay(inputs['S0'])
+            inputs[scen].overrides = load(scen)
+
+    return inputs
+
+
+def select_inputs(inputs, variables, scenarios, n_years, dims):
+    """
+    Read-only views of the inputs used by one run.
+
+    Parameters
+    ----------
+    inputs: dictionary of dicts
+        Shared inputs of each scenario (S0 a dict, the others ScenarioOverlays)
+    variables: set of str
+        Variables of the run
+    scenarios: list of str
+        Scenarios of the run (S0 first)
+    n_years: int
+        Number of years of the run's timeline
+    dims: dict of VariableMeta
+        Variable classifications by dimension
+
+    Returns
+    ----------
+    selected: dictionary of dicts
+        Inputs of each scenario of the run, sharing the memory of the inputs
+    """
+
+    def view(var, value):
+        if dims[var].has_time:
+            value = value[:, :, :, :n_years]
+        return read_only_view(value)
+
+    base = {var: view(var, value) for var, value in inputs['S0'].items() if var in variables}
+
+    selected = {}
+    for scen in scenarios:
+        if scen == 'S0':
+            selected[scen] = base
+            continue
+        selected[scen] = ScenarioOverlay(base)
+        selected[scen].overrides = {var: view(var, value)
+                                    for var, value in inputs[scen].overrides.items()
+                                    if var in variables}
+
+    return selected
+
+
+def prepare_run(shared, config):
+    """
+    Model run of one run definition on the shared inputs.
+
+    The run gets the variables, scenarios and years its own ModelRun would
+    have loaded, as read-only views of the shared inputs. Its scenarios
+    are solved one after another (the sweep runs in parallel instead).
+
+    Parameters
+    ----------
+    shared: ModelRun
+        Model run with the inputs of all runs, see load_shared_run
+    config: configparser.ConfigParser
+        Settings of the run
+
+    Returns
+    ----------
+    run: ModelRun
+        Model run ready to solve
+    """
+
+    run = copy.copy(shared)
+    run.configure(config)
+    run.parallel_scenarios = False
+
+    # Classifications and dimensions of the run's timeline
+    run.titles = dict(shared.titles, TIME=run.timeline)
+    run.dims, run.histend, run.domain, run.forstart = \
+        dims_f.load_dims(run.titles, run.timeline)
+
+    modules = _names(run.ftt_modules)
+    variables = set(dims_f.module_variables(run.domain, run.ftt_modules))
+    for module in modules + ['General']:
+        variables |= shared.folder_variables.get(module, set())
+    scenarios = ['S0'] + [scen for scen in _names(run.scenarios) if scen != 'S0']
+    run.input = select_inputs(shared.input, variables, scenarios, len(run.timeline), run.dims)
+
+    run.variables = {}
+    run.lags = {}
+    run.output = {}
+    run.residuals = {}
+    run.iterations = 0
+    run.profile_records = {}
+    run.peak_memory = {}
+
+    return run
+
+
+# Shared model run of the worker process, set once by _init_worker
+_worker_run = None
+
+
+def _init_worker(shared, files):
+    global _worker_run
+    _worker_run = shared
+    _worker_run.input = map_inputs(files)
+
+
+def _solve_run(config):
+    """ Solve one run on a worker process and save its results """
+
+    begin = time.perf_counter()
+    run = prepare_run(_worker_run, config)
+    run.run()
+    save_results(run)
+
+    return time.perf_counter() - begin
+
+
+def run_sweep(configs, settings='settings.ini', max_workers=None):
+    """
+    Solve the runs of a manifest on a process pool.
+
+    The inputs are loaded once and written to a temporary folder in the
+    cache, which each worker process memory-maps when it starts (see
+    share_inputs), and each worker solves runs on views of them. A run that
+    fails does not stop the others.
+
+    Parameters
+    ----------
+    configs: dict of configparser.ConfigParser
+        Settings of each run, see read_manifest
+    settings: str
+        Settings file the runs start from (only read)
+    max_workers: int, optional
+        Number of worker processes (None uses max_workers of the settings)
+
+    Returns
+    ----------
+    summary: dict of dicts
+        Output folder and wall time (or error) of each run
+    """
+
+    shared = load_shared_run(configs, settings)
+    max_workers = min(max_workers or shared.max_workers or os.cpu_count(), len(configs))
+
+    summary = {name: {'output_dir': config.get('settings', 'output_dir')}
+               for name, config in configs.items()}
+
+    # The workers get the run without its inputs and map the files instead,
+    # and the parent drops its copy of the inputs
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='Sweep_', dir=CACHE_DIR,
+                                     ignore_cleanup_errors=True) as folder:
+        files = share_inputs(shared.input, folder)
+        template = copy.copy(shared)
+        template.input = {}
+        del shared
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(template, files)) as executor:
+            futures = {executor.submit(_solve_run, config): name
+                       for name, config in configs.items()}
+
+            with tqdm(total=len(futures)) as pbar:
+                pbar.set_description(f'Sweep of {len(futures)} runs')
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        summary[name]['seconds'] = future.result()
+                    except Exception as e:
+                        summary[name]['error'] = repr(e)
+                        print(f'Run {name} failed: {e!r}')
+                    pbar.update(1)
+
+    return summary
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Solve the runs of a manifest')
+    parser.add_argument('manifest', help='json file with the settings of each run')
+    parser.add_argument('--settings', default='settings.ini', help='settings file (only read)')
+    parser.add_argument('--output', default=os.path.join('Output', 'Sweep'),
+                        help='folder of the run output folders')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    configs = read_manifest(args.manifest, args.settings, args.output)
+    summary = run_sweep(configs, args.settings, args.workers)
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, 'Sweep.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
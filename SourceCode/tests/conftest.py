@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+conftest.py
+=========================================
+Fixtures of the behaviour tests.
+
+The tests run the model on a folder of synthetic inputs (see
+support/synthetic_inputs.py) for the power, transport and heat modules
+over a short timeline. Run them from the root of the repository with
+    python -m pytest SourceCode/tests
+
+Functions included:
+    - run_folder
+        Folder with synthetic inputs the model is run from
+    - model
+        Model run of the synthetic inputs with a baseline and a policy scenario
+    - policy_year
+        First year the policy scenario differs from the baseline
+    - in_run_folder
+        Run a test from the folder of synthetic inputs
+
+"""
+
+# Standard library imports
+import contextlib
+import io
+import os
+import warnings
+
+# Third party imports
+import pytest
+
+# Local library imports
+from SourceCode.model_class import ModelRun, read_settings
+from SourceCode.support.input_functions import overlay_inputs
+from SourceCode.support.synthetic_inputs import write_run_folder
+
+
+MODULES = 'FTT-P, FTT-Tr, FTT-H'
+START, END = 2010, 2022
+
+# First year the policy scenario differs from the baseline
+POLICY_YEAR = 2019
+
+
+@pytest.fixture(scope='session')
+def run_folder(tmp_path_factory):
+    """ Folder with synthetic inputs the model is run from. """
+
+    folder = tmp_path_factory.mktemp('synthetic')
+    write_run_folder(str(folder), ftt_modules=MODULES, start=START, end=END)
+
+    return folder
+
+
+@pytest.fixture(scope='session')
+def model(run_folder):
+    """
+    Model run of the synthetic inputs.
+
+    The baseline S0 is read from the folder. The policy scenario S1 is an
+    overlay on S0 that halves the power subsidies (MEWT) from POLICY_YEAR.
+    """
+
+    cwd = os.getcwd()
+    os.chdir(run_folder)
+    try:
+        with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+            warnings.simplefilter('ignore')
+            model = ModelRun(read_settings('settings.ini'))
+    finally:
+        os.chdir(cwd)
+
+    policy = overlay_inputs(model.input['S0'])
+    y = list(model.timeline).index(POLICY_YEAR)
+    policy.own('MEWT')[:, :, :, y:] *= 0.5
+    model.input['S1'] = policy
+
+    return model
+
+
+@pytest.fixture(scope='session')
+def policy_year():
+    """ First year the policy scenario differs from the baseline. """
+
+    return POLICY_YEAR
+
+
+@pytest.fixture
+def in_run_folder(run_folder, monkeypatch):
+    """ Run a test from the folder of synthetic inputs. """
+
+    monkeypatch.chdir(run_folder)
+    return run_folder
+
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_batch_run.py
+=========================================
+Headless runs take their settings from the command line, not the file.
+
+Functions included:
+    - arguments
+        Command line arguments with only the given ones set
+    - test_settings_overrides
+        Arguments become settings of the [settings] section
+    - test_invalid_setting
+        Settings not of the form KEY=VALUE are refused
+    - test_batch_run
+        A run from the command line writes its results and leaves settings.ini
+
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+# Third party imports
+import pytest
+
+# Local library imports
+from SourceCode.batch_run import settings_overrides
+from SourceCode.model_class import read_settings
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def arguments(**values):
+    """ Command line arguments with only the given ones set. """
+
+    args = dict(set=[], modules=None, scenarios=None, start=None, end=None,
+                output=None, name=None)
+    args.update(values)
+
+    return argparse.Namespace(**args)
+
+
+def test_settings_overrides(in_run_folder):
+    overrides = settings_overrides(arguments(modules=['FTT-P', 'FTT-H'], scenarios=['S0'],
+                                             end=2030, output='Output/run_1',
+                                             set=['max_iter = 3', 'tolerance=1e-4']))
+
+    assert overrides == {'enable_modules': 'FTT-P, FTT-H', 'scenarios': 'S0',
+                         'simulation_end': '2030', 'model_end': '2030',
+                         'output_dir': 'Output/run_1', 'max_iter': '3', 'tolerance': '1e-4'}
+
+    config = read_settings(overrides=overrides)
+    assert config.get('settings', 'enable_modules') == 'FTT-P, FTT-H'
+    assert read_settings().get('settings', 'enable_modules') != 'FTT-P, FTT-H'
+
+
+def test_invalid_setting():
+    with pytest.raises(ValueError, match='KEY=VALUE'):
+        settings_overrides(arguments(set=['max_iter']))
+
+
+def test_batch_run(run_folder, tmp_path):
+    with open(run_folder / 'settings.ini') as f:
+        settings = f.read()
+    output = tmp_path / 'run_1'
+
+    subprocess.run([sys.executable, '-m', 'SourceCode.batch_run', '--modules', 'FTT-Tr',
+                    '--scenarios', 'S0', '--end', '2022', '--output', str(output)],
+                   cwd=run_folder, env=dict(os.environ, PYTHONPATH=ROOT), check=True,
+                   capture_output=True)
+
+    with open(output / 'Results.pickle', 'rb') as f:
+        results = pickle.load(f)
+    with open(output / 'Scenarios.json') as f:
+        scenarios = json.load(f)
+    assert list(results) == ['S0'] and results['S0']['TEWS'].any()
+    assert scenarios['S0']['years'][-1] == '2022'
+    with open(run_folder / 'settings.ini') as f:
+        assert f.read() == settings
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_checkpoints.py
+=========================================
+Interrupted runs resume from their checkpoints with the same output.
+
+Functions included:
+    - checkpointed_run
+        Run of the baseline alone with checkpoints in a temporary folder
+    - solve
+        Solve a run, returning the years solved
+    - test_run_info
+        The record of a run changes with its settings and inputs
+    - test_saved_variables
+        Checkpoints hold the variables the modules write
+    - test_resume
+        A resumed run only solves the years after the last checkpoint
+    - test_other_run
+        Checkpoints of a run with other settings or inputs are not used
+
+"""
+
+# Standard library imports
+import contextlib
+import copy
+import io
+import os
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.model_class import ModelRun
+from SourceCode.support import checkpoints
+from SourceCode.support.input_functions import overlay_inputs
+
+
+# The synthetic inputs give negative shares in some regions
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+@pytest.fixture
+def checkpointed_run(model, tmp_path):
+    """ Run of the baseline alone with checkpoints in a temporary folder. """
+
+    run = copy.copy(model)
+    run.input = {'S0': model.input['S0']}
+    run.checkpoints = True
+    run.checkpoint_dir = str(tmp_path)
+    run.fork_scenarios = False
+    run.result_cache = False
+    run.profile = False
+
+    return run
+
+
+def solve(run, monkeypatch, resume=False):
+    """ Solve a run, returning the years solved. """
+
+    years = []
+    solve_year = ModelRun.solve_year
+
+    def counted(self, year, *args, **kwargs):
+        years.append(year)
+        return solve_year(self, year, *args, **kwargs)
+
+    with monkeypatch.context() as patch, contextlib.redirect_stdout(io.StringIO()), \
+            np.errstate(all='ignore'):
+        patch.setattr(ModelRun, 'solve_year', counted)
+        run.solve_all(resume=resume)
+
+    return years
+
+
+def test_run_info():
+    hashes = {'MEWT': 'a', 'BCET': 'b'}
+    info = checkpoints.run_info([2010, 2011], 'FTT-P', 5, 1e-6, hashes)
+
+    assert checkpoints.run_info([2010, 2011], 'FTT-P', 5, 1e-6, dict(hashes)) == info
+    assert checkpoints.run_info([2010, 2011], 'FTT-P', 4, 1e-6, hashes) != info
+    assert checkpoints.run_info([2010, 2011], 'FTT-P', 5, 1e-3, hashes) != info
+    assert checkpoints.run_info([2010, 2011], 'FTT-P', 5, 1e-6, dict(hashes, BCET='c')) != info
+
+
+def test_saved_variables(tmp_path):
+    variables = {'MEWS': np.ones((2, 3)), 'MEWT': np.zeros((2, 3))}
+    checkpoints.save_checkpoint(str(tmp_path), 2010, variables, {'MEWS'})
+
+    saved = checkpoints.load_checkpoint(str(tmp_path), 2010)
+    assert set(saved) == {'MEWS'}
+    np.testing.assert_array_equal(saved['MEWS'], variables['MEWS'])
+
+
+def test_resume(checkpointed_run, in_run_folder, monkeypatch):
+    timeline = list(checkpointed_run.timeline)
+    assert solve(checkpointed_run, monkeypatch) == timeline
+    expected = checkpointed_run.output['S0']
+
+    # Only the variables the modules write are saved
+    directory = os.path.join(checkpointed_run.checkpoint_dir, 'S0')
+    written = set().union(*checkpointed_run.module_schedule()[1].values())
+    saved = checkpoints.load_checkpoint(directory, timeline[-1])
+    variables = set(checkpointed_run.variables)
+    assert set(saved) == {var for var in variables
+                          if var in written or var not in checkpointed_run.input['S0']}
+    assert 'MEWS' in saved and len(saved) < len(variables)
+
+    # Interrupted after the fourth year
+    for year in timeline[4:]:
+        os.remove(os.path.join(directory, f'{year}.npz'))
+    resumed = copy.copy(checkpointed_run)
+    assert solve(resumed, monkeypatch, resume=True) == timeline[4:]
+
+    assert set(resumed.output['S0']) == set(expected)
+    for var, value in expected.items():
+        np.testing.assert_array_equal(resumed.output['S0'][var], value)
+
+
+@pytest.mark.parametrize('change', ['max_iter', 'tolerance', 'inputs'])
+def test_other_run(checkpointed_run, in_run_folder, monkeypatch, change):
+    timeline = list(checkpointed_run.timeline)
+    solve(checkpointed_run, monkeypatch)
+
+    other = copy.copy(checkpointed_run)
+    if change == 'max_iter':
+        other.max_iter += 1
+    elif change == 'tolerance':
+        other.tolerance *= 2
+    else:
+        other.input = {'S0': overlay_inputs(checkpointed_run.input['S0'])}
+        other.input['S0'].own('MEWT')[0, 0, 0, -1] += 1.0
+
+    with pytest.warns(UserWarning, match='another'):
+        assert solve(other, monkeypatch, resume=True) == timeline
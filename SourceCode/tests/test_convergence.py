@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_convergence.py
+=========================================
+Residuals of the iterations within a year, and when the iterations stop.
+
+Functions included:
+    - test_residual_norms
+        Largest change relative to the largest previous value
+    - test_residual_norms_special_values
+        Zeros, NaNs and variables without a residual
+    - test_copy_into
+        Copies reuse the arrays of the buffer
+    - not_converged
+        Warnings of years that did not converge
+    - test_iterations_stop
+        The iterations stop once the residuals are within the tolerance
+
+"""
+
+# Standard library imports
+import contextlib
+import copy
+import io
+import warnings
+
+# Third party imports
+import numpy as np
+
+# Local library imports
+from SourceCode.support.convergence import copy_into, residual_norms
+from SourceCode.support.cross_section import CrossSection
+
+
+def test_residual_norms():
+    previous = {'MEWS': np.array([[1.0, -4.0], [2.0, 0.0]]), 'MEWK': np.array([10.0, 20.0])}
+    variables = {'MEWS': np.array([[1.5, -4.0], [2.0, 0.1]]), 'MEWK': np.array([10.0, 20.0])}
+    residuals = residual_norms(variables, previous)
+
+    assert residuals['MEWS'] == np.max(np.abs(variables['MEWS'] - previous['MEWS'])) / 4.0
+    assert residuals['MEWK'] == 0.0
+
+
+def test_residual_norms_special_values():
+    previous = {'zero': np.zeros(3), 'new': np.zeros(3), 'nan': np.ones(3),
+                'shape': np.ones(3), 'text': np.array(['a']), 'scalar': 1.0}
+    variables = {'zero': np.zeros(3), 'new': np.array([0.0, 1.0, 0.0]),
+                 'nan': np.array([1.0, np.nan, 1.0]), 'shape': np.ones(4),
+                 'text': np.array(['b']), 'scalar': 2.0, 'added': np.ones(3)}
+    residuals = residual_norms(variables, previous)
+
+    assert residuals['zero'] == 0.0
+    assert residuals['new'] == np.inf
+    assert np.isnan(residuals['nan'])
+    assert set(residuals) == {'zero', 'new', 'nan'}
+
+
+def test_copy_into():
+    variables = CrossSection({'MEWS': np.ones((2, 3))}, writable=set())
+    variables['MEWK'] = np.arange(3.0)
+    variables['name'] = ['S0']
+    buffer = copy_into(None, variables)
+    arrays = {var: buffer[var] for var in ('MEWS', 'MEWK')}
+
+    variables['MEWK'] = np.arange(3.0) + 1
+    buffer = copy_into(buffer, variables)
+
+    assert all(buffer[var] is array for var, array in arrays.items())
+    np.testing.assert_array_equal(buffer['MEWK'], [1.0, 2.0, 3.0])
+    assert buffer['MEWS'].flags.writeable
+    assert buffer['name'] == ['S0'] and buffer['name'] is not variables['name']
+
+
+def not_converged(model, max_iter, tolerance):
+    """ Warnings of the years of the baseline that did not converge. """
+
+    run = copy.copy(model)
+    run.max_iter = max_iter
+    run.tolerance = tolerance
+
+    with warnings.catch_warnings(record=True) as records, np.errstate(all='ignore'), \
+            contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('always')
+        run.solve_batch({'S0': model.input['S0']}, model.timeline[:3], outputs=['MEWS'])
+
+    return [str(record.message) for record in records if 'not converged' in str(record.message)]
+
+
+def test_iterations_stop(model, in_run_folder):
+    assert not_converged(model, 1, 0.0) == []
+    assert not_converged(model, 3, np.inf) == []
+
+    messages = not_converged(model, 2, -1.0)
+    assert len(messages) == 3
+    assert all('not converged after 2 iterations' in message for message in messages)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_cross_section.py
+=========================================
+Cross sections hand out read-only views and copy only what modules change.
+
+Functions included:
+    - data
+        Inputs of a scenario with and without a time dimension
+    - test_read_only_views
+        Variables that are not writable cannot be changed in place
+    - test_writable_copied
+        Writable variables are copied once, on first use
+    - test_assigned_variables
+        Variables assigned by key are owned by the cross section
+    - test_copy_is_plain
+        Copies of a cross section are independent dictionaries
+    - test_snapshot
+        Snapshots copy writable arrays only
+    - test_module_mutations
+        Variables changed in place are found through aliases and calls
+    - test_module_mutations_dynamic
+        A module changing variables by a computed key may change all
+    - test_module_mutations_out
+        Arrays passed as the out argument of numpy functions are changed
+    - test_module_mutations_helpers
+        Helper functions are followed through their parameters
+    - test_module_mutations_escaped
+        Variables handed to code that is not followed may all change
+
+"""
+
+# Standard library imports
+import copy
+import pickle
+import textwrap
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support.cross_section import CrossSection, cross_section, snapshot
+from SourceCode.support.module_scheduler import module_mutations
+
+
+DIMS = {'MEWS': ('RTI', 'T2TI', 'NA', 'TIME'), 'BCET': ('RTI', 'T2TI', 'C2TI', 'NA'),
+        'MEWT': ('RTI', 'T2TI', 'NA', 'TIME')}
+
+
+@pytest.fixture
+def data():
+    """ Inputs of a scenario with and without a time dimension. """
+
+    return {'S0': {'MEWS': np.arange(24.0).reshape(2, 3, 1, 4),
+                   'BCET': np.ones((2, 3, 5, 1)),
+                   'MEWT': np.zeros((2, 3, 1, 4))}}
+
+
+def test_read_only_views(data):
+    cs = cross_section(data, DIMS, 2011, 1, 'S0', copy_on_write=True, writable={'MEWS'})
+
+    with pytest.raises(ValueError):
+        cs['BCET'][0, 0, 0] = 2.0
+    with pytest.raises(ValueError):
+        cs['MEWT'] += 1.0
+    assert np.shares_memory(cs['BCET'], data['S0']['BCET'])
+    np.testing.assert_array_equal(cs['MEWT'], data['S0']['MEWT'][:, :, :, 1])
+    assert not data['S0']['MEWT'].any()
+
+
+def test_writable_copied(data):
+    cs = cross_section(data, DIMS, 2011, 1, 'S0', copy_on_write=True, writable={'MEWS'})
+
+    assert np.shares_memory(cs.view('MEWS'), data['S0']['MEWS'])
+    mews = cs['MEWS']
+    mews[:] = -1.0
+
+    assert cs['MEWS'] is mews
+    assert not np.shares_memory(mews, data['S0']['MEWS'])
+    assert data['S0']['MEWS'][0, 0, 0, 1] == 1.0
+
+
+def test_assigned_variables(data):
+    cs = cross_section(data, DIMS, 2011, 1, 'S0', copy_on_write=True, writable=set())
+    value = np.full((2, 3, 1), 3.0)
+    cs['MEWT'] = value
+
+    assert cs['MEWT'] is value
+    cs['MEWT'][:] = 4.0
+    assert not data['S0']['MEWT'].any()
+
+
+def test_copy_is_plain(data):
+    cs = CrossSection({'MEWS': data['S0']['MEWS'][:, :, :, 0]}, writable=set())
+
+    for other in (copy.deepcopy(cs), pickle.loads(pickle.dumps(cs))):
+        assert type(other) is dict
+        other['MEWS'][:] = 5.0
+        assert data['S0']['MEWS'][0, 0, 0, 0] == 0.0
+
+
+def test_snapshot(data):
+    cs = cross_section(data, DIMS, 2011, 1, 'S0', copy_on_write=True, writable={'MEWS'})
+
+    assert snapshot(cs['BCET']) is cs['BCET']
+    mews = snapshot(cs['MEWS'])
+    cs['MEWS'][:] = 7.0
+    assert mews[0, 0, 0] == 1.0
+    assert snapshot({'a': [1]}) == {'a': [1]}
+
+
+def test_module_mutations(tmp_path, monkeypatch):
+    source = '''
+        import numpy as np
+
+        def solve(data, time_lag):
+            shares = data['MEWS']
+            shares[0] = 1.0
+            np.copyto(data['MEWG'], 0.0)
+            view = data['MEWK'].reshape(-1)
+            view += 1.0
+            np.multiply(data['MEWT'], 2.0, out=data['MEWD'])
+            total = np.sum(data['BCET']) + time_lag['MEWS'].mean()
+            copied = np.copy(data['METC'])
+            copied[0] = total
+            data['MEWL'] = copied
+            return data
+        '''
+    (tmp_path / 'mutating_module.py').write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    domain = dict.fromkeys(['MEWS', 'MEWG', 'MEWK', 'MEWT', 'MEWD', 'BCET', 'METC', 'MEWL'],
+                           'FTT-P')
+
+    assert module_mutations('mutating_module', domain) == {'MEWS', 'MEWG', 'MEWK', 'MEWD'}
+
+
+def test_module_mutations_dynamic(tmp_path, monkeypatch):
+    source = '''
+        def solve(data, variables):
+            for var in variables:
+                data[var][:] = 0.0
+            return data
+        '''
+    (tmp_path / 'dynamic_module.py').write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    domain = {'MEWS': 'FTT-P', 'HEWS': 'FTT-H'}
+
+    assert module_mutations('dynamic_module', domain) == set(domain)
+
+
+def test_module_mutations_out(tmp_path, monkeypatch):
+    source = '''
+        import numpy as np
+
+        def solve(data, time_lag):
+            np.add(data['MEWT'], 1.0, data['MEWD'])
+            np.clip(data['BCET'], 0.0, 1.0, data['MEWK'])
+            np.sum(data['METC'], 0, None, out=data['MEWL'])
+            total = np.maximum(data['MEWS'], data['MEWG'])
+            return data
+        '''
+    (tmp_path / 'out_module.py').write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    domain = dict.fromkeys(['MEWS', 'MEWG', 'MEWK', 'MEWT', 'MEWD', 'BCET', 'METC', 'MEWL'],
+                           'FTT-P')
+
+    assert module_mutations('out_module', domain) == {'MEWD', 'MEWK', 'MEWL'}
+
+
+def test_module_mutations_helpers(tmp_path, monkeypatch):
+    source = '''
+        def scale(shares):
+            shares *= 2.0
+
+        def lagged(values):
+            return values['MEWK'] + values.get('MEWG')
+
+        def solve(data, time_lag, iter_lag):
+            scale(data['MEWS'])
+            data['MEWL'] = lagged(iter_lag) + lagged(values=time_lag)
+            return data
+        '''
+    (tmp_path / 'helper_module.py').write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    domain = dict.fromkeys(['MEWS', 'MEWG', 'MEWK', 'MEWL'], 'FTT-P')
+
+    assert module_mutations('helper_module', domain) == {'MEWS'}
+
+
+@pytest.mark.parametrize('name, statements', [
+    ('renamed_module', 'reset(data, ["MEWS"])'),
+    ('external_module', 'external.reset(data)'),
+    ('unknown_module', 'reset_all(data)'),
+    ('items_module', 'for var, value in data.items():\n        value[:] = 0.0'),
+    ('alias_module', 'variables = data\n    variables["MEWS"][:] = 0.0'),
+])
+def test_module_mutations_escaped(tmp_path, monkeypatch, name, statements):
+    source = f'''
+import external
+
+def reset(variables, names):
+    for var in names:
+        variables.get(var)[:] = 0.0
+
+def solve(data, time_lag):
+    {statements}
+    return data
+'''
+    (tmp_path / f'{name}.py').write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    domain = {'MEWS': 'FTT-P', 'HEWS': 'FTT-H'}
+
+    assert module_mutations(name, domain) == set(domain)
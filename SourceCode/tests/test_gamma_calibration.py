@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_gamma_calibration.py
+=========================================
+Gamma values are calibrated on the trend of the historical shares.
+
+Functions included:
+    - test_trend_targets
+        Targets continue the least squares line of the last historical years
+    - test_invalid_years
+        Calibrations outside the timeline are refused
+    - test_calibrate_gamma
+        Calibrated gamma values fit the trend at least as well as the inputs
+    - test_failed_candidates
+        Candidates that do not solve are never chosen
+
+"""
+
+# Standard library imports
+import copy
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.gamma_calibration import calibrate_gamma, trend_targets
+from SourceCode.support.titles_functions import gamma_codes
+
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+# Calibration of the first region of FTT-P over a short horizon
+SETTINGS = {'candidates': 4, 'iterations': 2, 'horizon': 3, 'trend_years': 4}
+
+
+def test_trend_targets():
+    timeline = list(range(2010, 2020))
+    years = np.arange(10.0)
+    shares = np.zeros((2, 3, 1, 10))
+    shares[0, 0, 0] = 0.1 + 0.05 * years
+    shares[1, 2, 0] = 0.5 - 0.1 * years
+    targets = trend_targets(shares, timeline, 2015, trend_years=4, horizon=3)
+
+    assert targets.shape == (2, 3, 3)
+    np.testing.assert_allclose(targets[0, 0], 0.1 + 0.05 * np.arange(6.0, 9.0))
+    np.testing.assert_array_equal(targets[1, 2], 0.0)
+    np.testing.assert_array_equal(targets[0, 1], 0.0)
+
+
+def test_invalid_years(model):
+    run = copy.copy(model)
+    run.histend = dict(model.histend, MEWG=model.timeline[-1] + 5)
+    with pytest.raises(ValueError, match='outside the timeline'):
+        calibrate_gamma(run, 'FTT-P', **SETTINGS)
+
+    too_long = len(model.timeline) - list(model.timeline).index(model.histend['MEWG'])
+    with pytest.raises(ValueError, match='ends after the last year'):
+        calibrate_gamma(model, 'FTT-P', **dict(SETTINGS, horizon=too_long))
+
+    with pytest.raises(ValueError, match='historical years'):
+        calibrate_gamma(model, 'FTT-P', **dict(SETTINGS, trend_years=1))
+
+
+def test_calibrate_gamma(model, in_run_folder):
+    region = model.titles['RTI'][0]
+    with np.errstate(all='ignore'):
+        start, start_errors = calibrate_gamma(model, 'FTT-P', [region],
+                                              **dict(SETTINGS, candidates=1, iterations=1))
+        gamma, errors = calibrate_gamma(model, 'FTT-P', [region], **SETTINGS)
+
+    y = list(model.timeline).index(model.histend['MEWG']) + 1
+    np.testing.assert_array_equal(start, model.input['S0'][gamma_codes()['FTT-P']][:, :, 0, y])
+    assert np.all(np.isfinite(errors)) and np.all(errors <= start_errors)
+    np.testing.assert_array_equal(gamma[1:], start[1:])
+
+
+def test_failed_candidates(model, in_run_folder):
+    run = copy.copy(model)
+
+    def solve_batch(variants, *args, **kwargs):
+        # Only the first candidate (the starting gamma values) solves
+        output = model.solve_batch(variants, *args, **kwargs)
+        for name in list(output)[1:]:
+            output[name]['MEWS'][:] = np.nan
+        return output
+
+    run.solve_batch = solve_batch
+    with np.errstate(all='ignore'):
+        start, start_errors = calibrate_gamma(model, 'FTT-P',
+                                              **dict(SETTINGS, candidates=1, iterations=1))
+        gamma, errors = calibrate_gamma(run, 'FTT-P', **dict(SETTINGS, iterations=1))
+
+    np.testing.assert_array_equal(gamma, start)
+    np.testing.assert_array_equal(errors, start_errors)
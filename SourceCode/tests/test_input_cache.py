@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_input_cache.py
+=========================================
+Cached input arrays are rebuilt when their csv files or the layout change.
+
+Functions included:
+    - layout
+        Titles, dimensions, timeline and forecast start of two variables
+    - cache_folder
+        Input folder with a csv file for each variable, from a temporary folder
+    - build
+        Cache the arrays of the folder
+    - test_layout_key
+        The key changes with the loader version, timeline and dimensions
+    - test_unchanged_files
+        Nothing is rebuilt when no csv file changed
+    - test_changed_file
+        Only the variable of a changed csv file is rebuilt
+    - test_added_and_removed_files
+        Adding or removing a csv file rebuilds its variable
+    - test_new_layout
+        Arrays built for another layout are all rebuilt
+    - test_load
+        Loaded arrays are copy-on-write mappings of the stored ones
+
+"""
+
+# Standard library imports
+import os
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support import input_cache
+from SourceCode.support.input_cache import InputCache, layout_key
+
+
+DIRECTORY = os.path.join('Inputs', 'S0', 'FTT-P')
+
+
+@pytest.fixture
+def layout():
+    """ Titles, dimensions, timeline and forecast start of two variables. """
+
+    titles = {'RTI_short': ['BE', 'DK'], 'RTI': ['Belgium', 'Denmark'],
+              'T2TI': ['Nuclear', 'Oil', 'Coal'], 'NA': ['NA'], 'TIME': ['2010', '2011']}
+    dims = {'MEWT': ('RTI', 'T2TI', 'NA', 'TIME'), 'BCET': ('RTI', 'T2TI', 'NA', 'NA')}
+    forstart = {'MEWT': 2011, 'BCET': None}
+
+    return titles, dims, [2010, 2011], forstart
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+    """ Input folder with a csv file for each variable, from a temporary folder. """
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(DIRECTORY)
+    files = {'MEWT': ['MEWT_BE.csv'], 'BCET': ['BCET_BE.csv']}
+    for var, names in files.items():
+        for name in names:
+            with open(os.path.join(DIRECTORY, name), 'w') as f:
+                f.write(f',2010\n{var},1.0\n')
+
+    return files
+
+
+def build(files, layout):
+    """ Cache the arrays of the folder, returning the variables rebuilt. """
+
+    cache = InputCache(DIRECTORY, layout)
+    stale = cache.stale_variables(files)
+    for var in stale:
+        cache.store(var, np.full((2, 3, 1, 2), len(var), dtype=float), np.ones((2, 3, 1, 2), bool))
+    cache.save_manifest(files)
+
+    return stale
+
+
+def test_layout_key(layout, monkeypatch):
+    titles, dims, timeline, forstart = layout
+    key = layout_key(titles, dims, timeline, forstart)
+
+    assert layout_key(titles, dict(dims), list(timeline), dict(forstart)) == key
+    assert layout_key(titles, dims, [2010, 2011, 2012], forstart) != key
+    assert layout_key(titles, dict(dims, BCET=('RTI', 'T2TI', 'NA', 'TIME')),
+                      timeline, forstart) != key
+    assert layout_key(titles, dims, timeline, dict(forstart, MEWT=2010)) != key
+
+    monkeypatch.setattr(input_cache, 'CACHE_VERSION', input_cache.CACHE_VERSION + 1)
+    assert layout_key(titles, dims, timeline, forstart) != key
+
+
+def test_unchanged_files(cache_folder):
+    assert sorted(build(cache_folder, 'layout')) == ['BCET', 'MEWT']
+    assert build(cache_folder, 'layout') == []
+
+    # A new modification time alone does not rebuild a variable
+    path = os.path.join(DIRECTORY, 'MEWT_BE.csv')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+    assert build(cache_folder, 'layout') == []
+
+
+def test_changed_file(cache_folder):
+    build(cache_folder, 'layout')
+    with open(os.path.join(DIRECTORY, 'MEWT_BE.csv'), 'a') as f:
+        f.write('MEWT,2.0\n')
+
+    assert build(cache_folder, 'layout') == ['MEWT']
+    assert build(cache_folder, 'layout') == []
+
+
+def test_added_and_removed_files(cache_folder):
+    build(cache_folder, 'layout')
+    with open(os.path.join(DIRECTORY, 'MEWT_DK.csv'), 'w') as f:
+        f.write(',2010\nMEWT,1.0\n')
+
+    assert build(dict(cache_folder, MEWT=['MEWT_BE.csv', 'MEWT_DK.csv']), 'layout') == ['MEWT']
+    assert build(cache_folder, 'layout') == ['MEWT']
+
+
+def test_new_layout(cache_folder):
+    build(cache_folder, 'layout')
+
+    assert sorted(build(cache_folder, 'other layout')) == ['BCET', 'MEWT']
+    assert build(cache_folder, 'other layout') == []
+
+
+def test_load(cache_folder):
+    build(cache_folder, 'layout')
+    array, mask = InputCache(DIRECTORY, 'layout').load('MEWT')
+
+    assert isinstance(array, np.ndarray) and mask.all()
+    np.testing.assert_array_equal(array, 4.0)
+    array[:] = 0.0
+    np.testing.assert_array_equal(InputCache(DIRECTORY, 'layout').load('MEWT')[0], 4.0)
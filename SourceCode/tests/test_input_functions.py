@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_input_functions.py
+=========================================
+Scenario overlays share the baseline without letting it change.
+
+Functions included:
+    - base
+        Baseline inputs
+    - test_shared_variables_read_only
+        Variables read from the baseline cannot be written
+    - test_own_copies
+        Owned variables are copies the baseline does not see
+    - test_overlay_of_overlay
+        An overlay on a scenario cannot change the scenario
+    - test_delete_reverts
+        Deleting an override reverts the variable to the baseline
+
+"""
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support.input_functions import ScenarioOverlay, overlay_inputs
+
+
+@pytest.fixture
+def base():
+    """ Baseline inputs. """
+
+    return {'MEWT': np.zeros((2, 3, 1, 4)), 'BCET': np.ones((2, 3, 5, 1))}
+
+
+def test_shared_variables_read_only(base):
+    overlay = overlay_inputs(base)
+
+    with pytest.raises(ValueError):
+        overlay['MEWT'][0, 0, 0, 0] = 1.0
+    with pytest.raises(ValueError):
+        overlay['BCET'] += 1.0
+    assert np.shares_memory(overlay['MEWT'], base['MEWT'])
+    assert not base['MEWT'].any()
+
+
+def test_own_copies(base):
+    overlay = overlay_inputs(base)
+    overlay.own('MEWT')[:, :, :, 2:] = 0.5
+
+    assert overlay.own('MEWT') is overlay['MEWT']
+    assert overlay['MEWT'][0, 0, 0, 3] == 0.5
+    assert not base['MEWT'].any()
+    assert set(overlay.overrides) == {'MEWT'}
+    assert set(overlay) == set(base) and len(overlay) == len(base)
+
+
+def test_overlay_of_overlay(base):
+    scenario = overlay_inputs(base)
+    scenario.own('MEWT')[:] = 1.0
+    variant = overlay_inputs(scenario)
+
+    assert isinstance(variant, ScenarioOverlay) and variant.base is base
+    with pytest.raises(ValueError):
+        variant['MEWT'][:] = 2.0
+
+    variant.own('MEWT')[:] = 2.0
+    variant.own('BCET')[:] = 3.0
+    np.testing.assert_array_equal(scenario['MEWT'], 1.0)
+    np.testing.assert_array_equal(variant['MEWT'], 2.0)
+    np.testing.assert_array_equal(base['BCET'], 1.0)
+    assert 'BCET' not in scenario.overrides
+
+
+def test_delete_reverts(base):
+    overlay = overlay_inputs(base)
+    overlay.own('MEWT')[:] = 1.0
+    del overlay['MEWT']
+
+    assert not overlay['MEWT'].any()
+    assert not overlay['MEWT'].flags.writeable
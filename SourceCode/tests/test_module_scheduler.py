@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_module_scheduler.py
+=========================================
+Modules that do not share variables are solved at the same time.
+
+Functions included:
+    - write_module
+        Importable module with the given source
+    - test_independent_modules
+        Power and transport do not depend on each other, heat waits for power
+    - test_independent_modules_overlap
+        Independent modules run at the same time
+    - test_guarded_keys
+        Keys limited by a domain, prefix or list only stand for those variables
+    - test_unguarded_keys
+        Keys that are not limited stand for every variable
+
+"""
+
+# Standard library imports
+import textwrap
+import threading
+
+# Third party imports
+import pytest
+
+# Local library imports
+from SourceCode.model_class import FTT_MODULES
+from SourceCode.support.module_scheduler import (dependency_graph, module_access,
+                                                 module_mutations, run_modules)
+
+
+DOMAIN = {'MEWS': 'FTT-P', 'MEWK': 'FTT-P', 'TEWS': 'FTT-Tr', 'ZEWS': 'FTT-Fr',
+          'RVKZ': 'FTT-Fr', 'RVKM': 'FTT-Tr', 'PRSC': 'General'}
+
+
+def write_module(folder, monkeypatch, name, source):
+    """ Importable module with the given source. """
+
+    (folder / f'{name}.py').write_text(textwrap.dedent(source))
+    monkeypatch.syspath_prepend(str(folder))
+    return name
+
+
+def test_independent_modules(model):
+    modules = [(name, FTT_MODULES.paths[name]) for name in ('FTT-P', 'FTT-Tr', 'FTT-H')]
+    graph, writes = dependency_graph(modules, model.domain)
+
+    assert graph == {'FTT-P': set(), 'FTT-Tr': set(), 'FTT-H': {'FTT-P'}}
+    reads, _ = module_access(FTT_MODULES.paths['FTT-Tr'], 'FTT-Tr', model.domain)
+    assert not reads & writes['FTT-P'] and not writes['FTT-Tr'] & writes['FTT-P']
+
+
+def test_independent_modules_overlap(model):
+    modules = [(name, FTT_MODULES.paths[name]) for name in ('FTT-P', 'FTT-Tr', 'FTT-H')]
+    graph, writes = dependency_graph(modules, model.domain)
+
+    # Power and transport only finish once both have started
+    barrier = threading.Barrier(2, timeout=10)
+    order = []
+
+    def solver(name):
+        def solve(variables):
+            if name != 'FTT-H':
+                barrier.wait()
+            order.append(name)
+            return variables
+        return solve
+
+    variables = {}
+    result = run_modules({name: solver(name) for name, _ in modules}, graph, writes, variables)
+
+    assert result is variables
+    assert sorted(order[:2]) == ['FTT-P', 'FTT-Tr'] and order[2] == 'FTT-H'
+
+
+def test_guarded_keys(tmp_path, monkeypatch):
+    source = '''
+        def solve(data, time_lag, iter_lag, titles, histend, year, domain):
+            data_dt = {}
+            for var in time_lag.keys():
+                if domain[var] == 'FTT-P':
+                    data_dt[var] = time_lag[var].copy()
+            for var in time_lag.keys():
+                if var.startswith("R") and domain[var] == 'FTT-Fr':
+                    data[var][:] = 0.0
+            for var in ['TEWS']:
+                data[var] += 1.0
+            return data
+        '''
+    name = write_module(tmp_path, monkeypatch, 'guarded_module', source)
+    reads, writes = module_access(name, 'FTT-Tr', DOMAIN)
+
+    assert reads == {'MEWS', 'MEWK', 'RVKZ', 'TEWS'}
+    assert writes == {'TEWS', 'RVKM', 'RVKZ'}
+    assert module_mutations(name, DOMAIN) == {'RVKZ', 'TEWS'}
+
+
+def test_unguarded_keys(tmp_path, monkeypatch):
+    source = '''
+        def solve(data, time_lag, iter_lag, titles, histend, year, domain):
+            for var in time_lag.keys():
+                if domain[var] == 'FTT-P':
+                    var = 'TEWS'
+                    data[var][:] = 0.0
+            for var in time_lag.keys():
+                if not var.startswith('M'):
+                    data[var] = time_lag[var]
+            return data
+        '''
+    name = write_module(tmp_path, monkeypatch, 'unguarded_module', source)
+    reads, writes = module_access(name, 'FTT-P', DOMAIN)
+
+    assert reads == set(DOMAIN) and writes == set(DOMAIN)
+    assert module_mutations(name, DOMAIN) == set(DOMAIN)
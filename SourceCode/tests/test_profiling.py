@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_profiling.py
+=========================================
+Timers record nested stacks of calls, and model runs export them.
+
+Functions included:
+    - recording
+        Record timers for one test, clearing the records before and after
+    - test_disabled
+        Timers record nothing unless profiling is enabled
+    - test_nested_timers
+        Timers are recorded under the timers running when they start
+    - test_other_thread
+        Timers on another thread run under the stack they are given
+    - test_merge_and_export
+        Merged records are exported with the time not spent in nested timers
+    - test_model_profile
+        A profiled run records the scenarios, years and modules
+
+"""
+
+# Standard library imports
+import contextlib
+import copy
+import io
+import json
+import os
+import threading
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support import profiling
+
+
+@pytest.fixture
+def recording():
+    """ Record timers for one test, clearing the records before and after. """
+
+    profiling.collect()
+    profiling.enable()
+    yield
+    profiling.disable()
+    profiling.collect()
+
+
+def test_disabled():
+    profiling.collect()
+    with profiling.timer('S0'):
+        pass
+
+    assert profiling.collect() == {}
+
+
+def test_nested_timers(recording):
+    @profiling.timed()
+    def kernel():
+        return 1
+
+    with profiling.timer('S0'), profiling.timer(2020):
+        assert profiling.current_stack() == ('S0', '2020')
+        kernel()
+        kernel()
+    records = profiling.collect()
+
+    assert set(records) == {('S0',), ('S0', '2020'), ('S0', '2020', 'kernel')}
+    assert records[('S0', '2020', 'kernel')][0] == 2
+    assert records[('S0',)][1] >= records[('S0', '2020')][1] >= 0.0
+    assert profiling.collect() == {}
+
+
+def test_other_thread(recording):
+    with profiling.timer('S0'):
+        stack = profiling.current_stack()
+
+        def solve():
+            with profiling.timer('FTT-P', stack):
+                pass
+            with profiling.timer('FTT-Tr'):
+                pass
+
+        thread = threading.Thread(target=solve)
+        thread.start()
+        thread.join()
+
+    assert set(profiling.collect()) == {('S0',), ('S0', 'FTT-P'), ('FTT-Tr',)}
+
+
+def test_merge_and_export(tmp_path):
+    profiling.collect()
+    profiling.merge({('S0',): [1, 3.0], ('S0', 'FTT-P'): [2, 1.0]})
+    profiling.merge({('S0', 'FTT-P'): [1, 0.5]})
+    records = profiling.collect()
+    assert records == {('S0',): [1, 3.0], ('S0', 'FTT-P'): [3, 1.5]}
+
+    profiling.records_to_json(records, tmp_path / 'Profile.json')
+    profiling.records_to_folded(records, tmp_path / 'Profile.folded')
+    entries = json.loads((tmp_path / 'Profile.json').read_text())
+
+    assert entries[0] == {'stack': ['S0'], 'calls': 1, 'seconds': 3.0, 'self_seconds': 1.5}
+    assert (tmp_path / 'Profile.folded').read_text() == 'S0 1500000\nS0;FTT-P 1500000\n'
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+def test_model_profile(model, in_run_folder, tmp_path):
+    run = copy.copy(model)
+    run.input = {'S0': model.input['S0']}
+    run.profile = True
+    run.output_dir = str(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        run.run()
+
+    year = str(model.timeline[-1])
+    for name in ('FTT-P', 'FTT-Tr', 'FTT-H'):
+        assert run.profile_records[('S0', year, name)][0] >= 1
+    assert os.path.isfile(tmp_path / 'Profile.json') and os.path.isfile(tmp_path / 'Profile.folded')
+    assert not profiling._enabled
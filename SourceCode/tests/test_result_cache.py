@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_result_cache.py
+=========================================
+Stored results are reused only for the same inputs, settings and titles.
+
+Functions included:
+    - baseline_run
+        Run of the baseline alone with the result cache in a temporary folder
+    - test_result_keys
+        Keys change with the historical years, titles and inputs
+    - test_cached_results
+        A stored result is loaded instead of solved, until the key changes
+
+"""
+
+# Standard library imports
+import copy
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.model_class import ModelRun
+from SourceCode.support import result_cache
+from SourceCode.support.input_functions import overlay_inputs
+
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+@pytest.fixture
+def baseline_run(model, tmp_path, monkeypatch):
+    """ Run of the baseline alone with the result cache in a temporary folder. """
+
+    monkeypatch.setattr(result_cache, 'RESULTS_DIR', str(tmp_path / 'Results'))
+    run = copy.copy(model)
+    run.input = {'S0': model.input['S0']}
+    run.result_cache = True
+    run.fork_scenarios = False
+    run.checkpoints = False
+    run.profile = False
+
+    return run
+
+
+def test_result_keys(baseline_run):
+    keys = baseline_run.result_keys()
+    assert copy.copy(baseline_run).result_keys() == keys
+
+    run = copy.copy(baseline_run)
+    run.histend = dict(run.histend, MEWG=run.histend['MEWG'] - 1)
+    assert run.result_keys()['S0'] != keys['S0']
+
+    run = copy.copy(baseline_run)
+    techs = run.titles['T2TI']
+    run.titles = dict(run.titles, T2TI=(techs[1], techs[0]) + tuple(techs[2:]))
+    assert run.result_keys()['S0'] != keys['S0']
+
+    run = copy.copy(baseline_run)
+    run.input = {'S0': overlay_inputs(baseline_run.input['S0'])}
+    run.input['S0'].own('MEWT')[0, 0, 0, -1] += 1.0
+    assert run.result_keys()['S0'] != keys['S0']
+
+
+def test_cached_results(baseline_run, in_run_folder, monkeypatch):
+    solved = []
+    solve_scenario = ModelRun.solve_scenario
+
+    def counted(self, scen, *args, **kwargs):
+        solved.append(scen)
+        return solve_scenario(self, scen, *args, **kwargs)
+
+    monkeypatch.setattr(ModelRun, 'solve_scenario', counted)
+    with np.errstate(all='ignore'):
+        first = copy.copy(baseline_run)
+        first.run()
+        second = copy.copy(baseline_run)
+        second.run()
+        assert solved == ['S0']
+
+        changed = copy.copy(baseline_run)
+        changed.histend = dict(changed.histend, MEWG=changed.histend['MEWG'] - 1)
+        changed.run()
+
+    assert solved == ['S0', 'S0']
+    assert set(second.output['S0']) == set(first.output['S0'])
+    for var, value in first.output['S0'].items():
+        np.testing.assert_array_equal(second.output['S0'][var], value)
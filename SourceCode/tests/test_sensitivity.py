@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_sensitivity.py
+=========================================
+Sensitivities solved from the start year match full perturbed runs.
+
+Functions included:
+    - full_sensitivity
+        Central differences of runs perturbed in every year
+    - test_simulation_start
+        The perturbations start in the first simulated year
+    - test_sensitivity_from_start
+        Sensitivities from the start year equal those of full runs
+
+"""
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.sensitivity import gamma_parameters, run_sensitivity, simulation_start
+from SourceCode.support.input_functions import overlay_inputs
+
+
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+def full_sensitivity(model, parameters, var, delta):
+    """ Central differences of runs perturbed in every year, solved one after another. """
+
+    variants = {}
+    for label, gamma_code, index in parameters:
+        for sign in (1, -1):
+            inputs = overlay_inputs(model.input['S0'])
+            inputs.own(gamma_code)[index] += sign * delta
+            variants[f'{label}{sign:+d}'] = inputs
+    output = model.solve_batch(variants, outputs=[var])
+
+    return np.stack([(output[f'{label}+1'][var] - output[f'{label}-1'][var]) / (2 * delta)
+                     for label, _, _ in parameters])
+
+
+def test_simulation_start(model):
+    assert simulation_start(model) == model.histend['MEWG'] + 1
+
+
+def test_sensitivity_from_start(model, in_run_folder):
+    parameters = gamma_parameters(model, 'FTT-P')[:2]
+    with np.errstate(all='ignore'):
+        parallel = run_sensitivity(model, parameters, ('MEWS',), delta=0.1)
+        serial = run_sensitivity(model, parameters, ('MEWS',), delta=0.1, parallel=False)
+        expected = full_sensitivity(model, parameters, 'MEWS', 0.1)
+
+    y = list(model.timeline).index(simulation_start(model))
+    assert np.any(expected[..., y:])
+    np.testing.assert_array_equal(parallel['MEWS'], serial['MEWS'])
+    np.testing.assert_allclose(parallel['MEWS'][..., y:], expected[..., y:], atol=1e-9)
+    np.testing.assert_array_equal(parallel['MEWS'][..., :y], 0.0)
+    np.testing.assert_array_equal(expected[..., :y], 0.0)
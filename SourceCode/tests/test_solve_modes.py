@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_solve_modes.py
+=========================================
+The ways of solving the scenarios of a run give the same output.
+
+The baseline S0 and the policy scenario S1 are solved one after another
+as the reference, and again with scenario forking, on a process pool,
+with the modules of each year solved concurrently, and as a batch of
+variants.
+
+Functions included:
+    - outputs_equal
+        Whether two outputs hold the same values
+    - solve
+        Output of the model run with some settings changed
+    - reference
+        Output of the scenarios solved one after another
+    - test_policy_changes_output
+        The policy scenario differs from the baseline after it starts
+    - test_fork_scenarios
+        Forked scenarios match the reference
+    - test_parallel_scenarios
+        Scenarios solved on worker processes match the reference
+    - test_parallel_modules
+        Modules solved concurrently match the reference
+    - test_solve_batch
+        Variants solved as a batch match the reference
+    - test_solve_batch_start
+        Variants started from a solved state match the reference
+    - test_progress_callback
+        A scenario solved with a progress function reports every year
+    - test_inputs_unchanged
+        Solving the model leaves the inputs as they were
+
+"""
+
+# Standard library imports
+import contextlib
+import copy
+import io
+
+# Third party imports
+import numpy as np
+import pytest
+
+
+# The synthetic inputs give negative shares in some regions
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+
+def outputs_equal(output, other):
+    """ Whether two outputs hold the same variables and values (NaNs included). """
+
+    return set(output) == set(other) and all(
+        np.array_equal(output[var], other[var], equal_nan=True) for var in output)
+
+
+def solve(model, **settings):
+    """ Output of the model run with some settings changed. """
+
+    run = copy.copy(model)
+    for attribute, value in settings.items():
+        setattr(run, attribute, value)
+
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        run.run()
+
+    return run
+
+
+@pytest.fixture(scope='module')
+def reference(model, run_folder):
+    """ Output of the scenarios solved one after another. """
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(run_folder)
+        return solve(model).output
+
+
+def test_policy_changes_output(model, reference, policy_year):
+    y = list(model.timeline).index(policy_year)
+
+    for var, value in reference['S0'].items():
+        if model.dims[var].has_time:
+            np.testing.assert_array_equal(value[..., :y], reference['S1'][var][..., :y])
+    assert not np.array_equal(reference['S0']['MEWS'], reference['S1']['MEWS'])
+    assert reference['S0']['TEWS'].any()
+
+
+def test_fork_scenarios(model, reference, policy_year, in_run_folder):
+    run = solve(model, fork_scenarios=True)
+
+    assert run.fork_years == {'S1': list(model.timeline).index(policy_year)}
+    for scen in reference:
+        assert outputs_equal(run.output[scen], reference[scen])
+
+
+def test_parallel_scenarios(model, reference, in_run_folder):
+    run = solve(model, parallel_scenarios=True, max_workers=2)
+
+    for scen in reference:
+        assert outputs_equal(run.output[scen], reference[scen])
+
+
+def test_parallel_modules(model, reference, in_run_folder):
+    # Power and transport are solved at the same time
+    graph, _ = model.module_schedule()
+    assert graph['FTT-P'] == set() and graph['FTT-Tr'] == set()
+
+    run = solve(model, parallel_modules=True, module_workers=2)
+
+    for scen in reference:
+        assert outputs_equal(run.output[scen], reference[scen])
+
+
+def test_solve_batch(model, reference, in_run_folder):
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        output = model.solve_batch({'S1': model.input['S1']}, outputs=['MEWS', 'HEWS'])
+
+    assert set(output['S1']) == {'MEWS', 'HEWS'}
+    for var in output['S1']:
+        np.testing.assert_array_equal(output['S1'][var], reference['S1'][var])
+
+
+def test_solve_batch_start(model, reference, policy_year, in_run_folder):
+    fork = list(model.timeline).index(policy_year)
+    baseline = solve(model, fork_scenarios=True)
+    state = baseline.baseline_states[fork]
+
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        output = model.solve_batch({'S1': model.input['S1']}, outputs=['MEWS', 'HEWS'],
+                                   start=(fork, state))
+
+    for var in output['S1']:
+        np.testing.assert_array_equal(output['S1'][var][..., fork - 1:],
+                                      reference['S1'][var][..., fork - 1:])
+
+
+def test_progress_callback(model, reference, in_run_folder):
+    run = copy.copy(model)
+    years = []
+    with contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        output = run.solve_scenario('S1', progress=years.append)
+
+    assert years == list(model.timeline)
+    assert outputs_equal(output, reference['S1'])
+
+
+def test_inputs_unchanged(model, reference, in_run_folder):
+    before = {var: np.copy(value) for var, value in model.input['S0'].items()}
+    solve(model)
+
+    for var, value in before.items():
+        np.testing.assert_array_equal(model.input['S0'][var], value)
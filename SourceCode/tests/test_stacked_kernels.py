@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_stacked_kernels.py
+=========================================
+Scenarios stacked along a leading axis give the FTT-P levelised costs and
+shares of each scenario on its own.
+
+The baseline S0 and the policy scenario S1 (which differ in the power
+subsidies) are solved one after another, and the kernels are given the
+year after the policy starts of both scenarios at once.
+
+Functions included:
+    - solved
+        Output of the scenarios solved one after another
+    - year_data
+        Variables of a scenario in a year of the solved output
+    - test_stacked_lcoe
+        Levelised costs of the stacked scenarios are those of each scenario on its own
+    - test_stacked_shares
+        Shares of the stacked scenarios are those of each scenario on its own
+
+"""
+
+# Standard library imports
+import contextlib
+import copy
+import io
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.Power.ftt_p_lcoe import get_lcoe
+from SourceCode.Power.ftt_p_shares import shares
+from SourceCode.support.cross_section import cross_section
+
+
+# The synthetic inputs give negative shares in some regions
+pytestmark = pytest.mark.filterwarnings('ignore::UserWarning')
+
+SCENARIOS = ('S0', 'S1')
+
+# Inputs and outputs of get_lcoe
+LCOE_INPUTS = ('BCET', 'MEWL', 'MEWT', 'MTFT', 'MSAL', 'MSSP', 'MLSP', 'MSSM', 'MLSM',
+               'MEFI', 'MGAM')
+LCOE_OUTPUTS = ('MEWC', 'MECW', 'MECC', 'METC', 'MTCD', 'MWIC', 'MWFC', 'MCOC', 'MCFC',
+                'MWMC', 'MMCD')
+
+
+@pytest.fixture(scope='module')
+def solved(model, run_folder):
+    """ Output of the scenarios solved one after another. """
+
+    run = copy.copy(model)
+    with pytest.MonkeyPatch.context() as monkeypatch, \
+            contextlib.redirect_stdout(io.StringIO()), np.errstate(all='ignore'):
+        monkeypatch.chdir(run_folder)
+        run.solve_all()
+
+    return run
+
+
+def year_data(run, scen, year):
+    """ Variables of a scenario in a year of the solved output. """
+
+    y = list(run.timeline).index(year)
+    return cross_section(run.output, run.dims, year, y, scen)
+
+
+def test_stacked_lcoe(solved, policy_year):
+    year = policy_year + 1
+    sections = [year_data(solved, scen, year) for scen in SCENARIOS]
+    stacked = {var: np.stack([section[var] for section in sections])
+               for var in LCOE_INPUTS + LCOE_OUTPUTS}
+
+    with np.errstate(all='ignore'):
+        serial = [get_lcoe({var: section[var] for var in LCOE_INPUTS + LCOE_OUTPUTS},
+                           solved.titles) for section in sections]
+        get_lcoe(stacked, solved.titles)
+
+    assert not np.array_equal(serial[0]['METC'], serial[1]['METC'])
+    for s, data in enumerate(serial):
+        for var in LCOE_OUTPUTS + ('MEWL',):
+            np.testing.assert_array_equal(stacked[var][s], data[var], err_msg=var)
+
+
+def test_stacked_shares(solved, policy_year):
+    year = policy_year + 1
+    rti, t2ti = len(solved.titles['RTI']), len(solved.titles['T2TI'])
+    arguments = []
+    for scen in SCENARIOS:
+        data = year_data(solved, scen, year)
+        lag = year_data(solved, scen, year - 1)
+        is_reg = np.where(data['MEWR'][:, :, 0] == 0.0, 1.0, 0.5)
+        arguments.append((lag['MEWDX'][:, 7, 0], lag['MEWS'], lag['METC'], lag['MTCD'],
+                          data['MWKA'], lag['MES1'], lag['MES2'], data['MEWA'], is_reg,
+                          lag['MEWK'], lag['MEWK'], data['MEWR'], lag['MEWL'], lag['MEWS'],
+                          data['MWLO']))
+
+    with np.errstate(all='ignore'):
+        serial = [shares(0.25, 1, 10, *args, rti, t2ti, 4) for args in arguments]
+        stacked = shares(0.25, 1, 10, *(np.stack(arrays) for arrays in zip(*arguments)),
+                         rti, t2ti, 4)
+
+    assert not np.array_equal(serial[0][0], serial[1][0])
+    for output, value in enumerate(stacked):
+        assert value.shape == (len(SCENARIOS), rti, t2ti, 1)
+        for s in range(len(SCENARIOS)):
+            np.testing.assert_array_equal(value[s], serial[s][output])
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_streaming_stats.py
+=========================================
+Streaming summaries match the statistics numpy computes from all draws.
+
+Functions included:
+    - summarise
+        Summary of a sequence of draws
+    - test_mean_std
+        Mean and standard deviation match numpy
+    - test_first_draws_exact
+        Percentiles are exact up to five draws
+    - test_percentiles
+        Percentiles of many draws are close to numpy's
+    - test_single_draw
+        One draw has no spread
+
+"""
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support.streaming_stats import P2Quantile, RunningSummary
+
+
+def summarise(draws, percentiles=(5, 50, 95)):
+    """ Summary of a sequence of draws. """
+
+    summary = RunningSummary(draws.shape[1:], percentiles)
+    for draw in draws:
+        summary.add(draw)
+
+    return summary.result()
+
+
+def test_mean_std():
+    rng = np.random.default_rng(0)
+    draws = 1e3 + rng.lognormal(size=(500, 3, 4))
+    summary = summarise(draws)
+
+    np.testing.assert_allclose(summary['mean'], draws.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(summary['std'], draws.std(axis=0, ddof=1), rtol=1e-9)
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 4, 5])
+def test_first_draws_exact(count):
+    draws = np.random.default_rng(count).normal(size=(count, 2, 3))
+    summary = summarise(draws, (5, 25, 50, 95))
+
+    for p in (5, 25, 50, 95):
+        np.testing.assert_allclose(summary[f'p{p}'], np.percentile(draws, p, axis=0))
+
+
+def test_percentiles():
+    rng = np.random.default_rng(1)
+    draws = rng.normal(size=(5000, 2, 3))
+    summary = summarise(draws)
+
+    for p in (5, 50, 95):
+        np.testing.assert_allclose(summary[f'p{p}'], np.percentile(draws, p, axis=0), atol=0.1)
+    assert np.all(summary['p5'] < summary['p50']) and np.all(summary['p50'] < summary['p95'])
+
+
+def test_single_draw():
+    summary = summarise(np.full((1, 2), 3.0))
+
+    np.testing.assert_array_equal(summary['std'], 0.0)
+    np.testing.assert_array_equal(summary['p95'], 3.0)
+    assert P2Quantile(0.5, (2,)).result() is None
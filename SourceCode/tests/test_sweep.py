@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+test_sweep.py
+=========================================
+Inputs shared with the workers of a sweep are read-only and unchanged.
+
+Functions included:
+    - inputs
+        Baseline and a scenario overlay on it
+    - test_share_and_map
+        Memory-mapped inputs hold the values of the shared ones
+    - test_select_inputs
+        Runs get read-only views of their variables and years
+
+"""
+
+# Third party imports
+import numpy as np
+import pytest
+
+# Local library imports
+from SourceCode.support.dimensions_functions import VariableMeta
+from SourceCode.support.input_functions import ScenarioOverlay, overlay_inputs
+from SourceCode.sweep import map_inputs, select_inputs, share_inputs
+
+
+@pytest.fixture
+def inputs():
+    """ Baseline and a scenario overlay on it. """
+
+    base = {'MEWT': np.arange(24.0).reshape(2, 3, 1, 4), 'BCET': np.ones((2, 3, 5, 1))}
+    policy = overlay_inputs(base)
+    policy.own('MEWT')[:, :, :, 2:] = -1.0
+
+    return {'S0': base, 'S1': policy}
+
+
+def test_share_and_map(inputs, tmp_path):
+    files = share_inputs(inputs, str(tmp_path))
+    mapped = map_inputs(files)
+
+    assert set(files['S1']) == {'MEWT'}
+    assert isinstance(mapped['S1'], ScenarioOverlay) and mapped['S1'].base is mapped['S0']
+    for scen in inputs:
+        for var in inputs['S0']:
+            np.testing.assert_array_equal(mapped[scen][var], inputs[scen][var])
+            with pytest.raises(ValueError):
+                mapped[scen][var][0, 0, 0, 0] = 5.0
+
+    # Variants of a mapped scenario own copies
+    variant = overlay_inputs(mapped['S1'])
+    variant.own('MEWT')[:] = 5.0
+    np.testing.assert_array_equal(mapped['S1']['MEWT'], inputs['S1']['MEWT'])
+
+
+def test_select_inputs(inputs):
+    dims = {'MEWT': VariableMeta(('RTI', 'T2TI', 'NA', 'TIME')),
+            'BCET': VariableMeta(('RTI', 'T2TI', 'C2TI', 'NA'))}
+    selected = select_inputs(inputs, {'MEWT'}, ['S0', 'S1'], 3, dims)
+
+    assert set(selected['S0']) == {'MEWT'} and set(selected['S1']) == {'MEWT'}
+    assert selected['S1']['MEWT'].shape == (2, 3, 1, 3)
+    np.testing.assert_array_equal(selected['S1']['MEWT'], inputs['S1']['MEWT'][..., :3])
+    assert np.shares_memory(selected['S0']['MEWT'], inputs['S0']['MEWT'])
+    with pytest.raises(ValueError):
+        selected['S1']['MEWT'][0, 0, 0, 0] = 5.0
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+=========================================
+warmup.py
+=========================================
+Compile the numba kernels of the FTT modules ahead of a model run.
+
+The kernels (shares_calc and dspch of FTT-P) are compiled with
+cache=True, so the machine code is stored on disk next to the source
+files (or in the numba cache folder) and loaded by later processes,
+including the process-pool workers of parallel scenario runs. The warm-up
+fills this cache: it solves the enabled modules on synthetic inputs with
+the dimensions of VariableListing (see synthetic_inputs), from the
+historical years into the simulation, in the same way as ModelRun does,
+so the kernels are compiled for the array types and layouts the model
+passes them. Run it once after installing or changing the kernels:
+    python -m SourceCode.warmup [modules]
+
+Functions included:
+    - warmup
+        Compile the kernels of the enabled modules by solving them
+
+"""
+
+# Standard library imports
+import argparse
+import configparser
+import contextlib
+import io
+import time
+import warnings
+
+# Third party imports
+import numpy as np
+
+# Local library imports
+from SourceCode.model_class import FTT_MODULES
+import SourceCode.support.dimensions_functions as dims_f
+import SourceCode.support.titles_functions as titles_f
+from SourceCode.support.cross_section import cross_section
+from SourceCode.support.module_scheduler import module_mutations
+from SourceCode.support.synthetic_inputs import synthetic_inputs
+
+
+def warmup(ftt_modules=None, start=2010, end=2025):
+    """
+    Compile the kernels of the enabled modules by solving them.
+
+    Parameters
+    ----------
+    ftt_modules: str, optional
+        Enabled modules (as in settings.ini); by default enable_modules
+        of settings.ini
+    start, end: int
+        First and last year solved (covering the last historical year of
+        the modules and a few simulation years)
+
+    Returns
+    ----------
+    seconds: dict of float
+        Wall time of the warm-up of each module
+    """
+
+    if ftt_modules is None:
+        config = configparser.ConfigParser()
+        config.read('settings.ini')
+        ftt_modules = config.get('settings', 'enable_modules', fallback=', '.join(FTT_MODULES))
+
+    timeline = list(range(start, end + 1))
+    titles = titles_f.load_titles()
+    dims, histend, domain, _ = dims_f.load_dims(titles, timeline)
+    inputs = {'S0': synthetic_inputs(titles, dims, timeline, histend, ftt_modules, domain)}
+
+    # The modules share their cross sections, so as in ModelRun.mutable_variables
+    # every variable an enabled module may change is writable for all of them
+    enabled = [name for name in FTT_MODULES if name in ftt_modules]
+    writable = set()
+    for name in enabled:
+        writable |= module_mutations(FTT_MODULES.paths[name], domain)
+
+    seconds = {}
+    for name in enabled:
+        module = FTT_MODULES[name]
+        begin = time.perf_counter()
+
+        # Solve year by year as ModelRun does; the results are not used
+        with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()), \
+                np.errstate(all='ignore'):
+            warnings.simplefilter('ignore')
+            time_lag = cross_section(inputs, dims, start, 0, 'S0', copy_on_write=True,
+                                     writable=writable)
+            for y, year in enumerate(timeline):
+                data = cross_section(inputs, dims, year, y, 'S0', copy_on_write=True,
+                                     writable=writable)
+                time_lag = module.solve(data, time_lag, time_lag, titles, histend, year, domain)
+
+        seconds[name] = time.perf_counter() - begin
+
+    return seconds
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Compile the numba kernels of the FTT modules')
+    parser.add_argument('modules', nargs='*', help='modules (default enable_modules of settings.ini)')
+    parser.add_argument('--start', type=int, default=2010)
+    parser.add_argument('--end', type=int, default=2025)
+    args = parser.parse_args()
+
+    seconds = warmup(', '.join(args.modules) or None, args.start, args.end)
+    for name, elapsed in seconds.items():
+        print(f'{name}: {elapsed:.2f} s')
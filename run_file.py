@@ -8,6 +8,8 @@ Run file for FTT Stand alone.
 
 Programme calls the FTT stand-alone model run class, and executes model run.
 Run this script from Spyder or VS Code directly, or call it from the command line (or terminal) to run FTT Stand Alone.
+To run with settings other than those of settings.ini (e.g. several runs at
+the same time), use `python -m SourceCode.batch_run`.
 
 Local library imports:
 
@@ -21,28 +23,40 @@ Local library imports:
 
 # Local library imports
 from SourceCode.model_class import ModelRun
-
-# Instantiate the run
-model = ModelRun()
-
-# Fetch ModelRun attributes, for examination
-# Titles of the model
-titles = model.titles
-# Dimensions of model variables
-dims = model.dims
-# Model inputs
-inputs = model.input
-# Metadata for inputs of the model
-histend = model.histend
-# Domains to which variables belong
-domain = model.domain
-tl = model.timeline
-scens = model.scenarios
-
-# Call the 'run' method of the ModelRun class to solve the model
-model.run()
-
-# Fetch ModelRun attributes, for examination
-# Output of the model
-output_all = model.output
-
+from SourceCode.support.memory_report import format_report
+
+# Print the memory used by the inputs, outputs and working variables after
+# the run (bytes by variable, domain and scenario, and the peak memory)
+report_memory = False
+
+# Guard the run so scenario worker processes can import this file safely
+if __name__ == '__main__':
+
+    # Instantiate the run
+    model = ModelRun()
+
+    # Fetch ModelRun attributes, for examination
+    # Titles of the model
+    titles = model.titles
+    # Dimensions of model variables
+    dims = model.dims
+    # Model inputs
+    inputs = model.input
+    # Metadata for inputs of the model
+    histend = model.histend
+    # Domains to which variables belong
+    domain = model.domain
+    tl = model.timeline
+    scens = model.scenarios
+
+    # Call the 'run' method of the ModelRun class to solve the model
+    # (with checkpoints on in settings.ini, model.resume() continues a
+    # failed run after the last year saved)
+    model.run()
+
+    # Fetch ModelRun attributes, for examination
+    # Output of the model
+    output_all = model.output
+
+    if report_memory:
+        print(format_report(model.memory_report()))